@@ -1,9 +1,14 @@
 # app/config.py
+from typing import Callable, Generic, TypeVar
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+T = TypeVar("T")
+
 class Settings(BaseSettings):
 
     openai_api_key: str
+    # point at benchmarks/fake_openai.py (or any compatible server) to run offline
+    openai_base_url: str = "https://api.openai.com/v1"
 
 
     supabase_url: str | None = None
@@ -24,6 +29,125 @@ class Settings(BaseSettings):
     auto_ext_thresh: float = 0.85
     auto_der_thresh: float = 0.75
     auto_max_suggestions: int = 5
+    suggest_block_size: int = 256  # query rows per matrix block in batch suggestion jobs
+
+    # embeddings: "openai" or "fake" (deterministic, offline)
+    embedding_backend: str = "openai"
+    embedding_dim: int = 1536
+    embedding_fake_latency_ms: float = 0.0
+    embedding_batch_size: int = 64
+    embedding_batch_max_tokens: int = 100_000
+    embedding_batch_window_ms: float = 10.0
+    embedding_max_concurrency: int = 4
+    # keyed by hash(backend, model, dim, normalized text); size 0 disables the
+    # in-process tier; the SQLite tier (path) keeps at most disk_max_entries rows
+    embedding_cache_size: int = 10_000
+    embedding_cache_ttl_s: float = 86_400.0
+    embedding_cache_path: str | None = None
+    embedding_cache_disk_max_entries: int = 1_000_000
+    # process-wide OpenAI budget, requests and tokens per minute; 0 = unlimited
+    embedding_rate_limit_rpm: int = 0
+    embedding_rate_limit_tpm: int = 0
+    # "sync" embeds inside the write request; "deferred" stores the row as pending
+    # and a background worker embeds it (sql/003_deferred_embedding.sql)
+    embedding_mode: str = "sync"
+    embedding_workers: int = 2
+    embedding_queue_batch: int = 64
+    embedding_queue_poll_s: float = 1.0
+    embedding_queue_lease_s: int = 120
+    embedding_max_attempts: int = 8
+    # pending rows in search: "skip" or "lexical" (full-text match appended to results)
+    search_pending: str = "lexical"
+    # hybrid search: candidates taken from each of the vector and lexical lists
+    # (at least k), fused with reciprocal rank fusion 1 / (hybrid_rrf_k + rank)
+    hybrid_candidates: int = 50
+    hybrid_rrf_k: int = 60
+    # graph-aware re-ranking of search results (SearchRequest.rerank overrides per request)
+    rerank_enabled: bool = False
+    rerank_candidates: int = 20        # candidates fetched before re-ranking down to k
+    rerank_budget_ms: float = 150.0    # over budget: return the unre-ranked order
+    rerank_outdated_penalty: float = 0.5
+    rerank_neighbor_weight: float = 0.1
+    rerank_max_hops: int = 8           # longest UPDATE chain followed to its head
+
+    # search: "supabase" (match_memories RPC) or "local" (in-process index, loaded at
+    # startup; only this process's writes reach it, so use it with a single worker)
+    search_backend: str = "supabase"
+    vector_index: str = "flat"  # "flat" (exact) or "hnsw" (needs hnswlib)
+    # flat index codes: "float32", "float16", "int8" or "binary"; the compact ones
+    # re-score the best k * vector_rescore_factor rows against float32 vectors
+    # memory-mapped from vector_store_path (a temp file when unset)
+    vector_precision: str = "float32"
+    vector_rescore_factor: int = 4
+    vector_store_path: str | None = None
+
+    # caps for graph expansion around a memory / search hits
+    graph_max_nodes: int = 500
+    graph_max_edges: int = 2000
+    # per-seed expansion cache, bounded by nodes + edges held; 0 disables.
+    # Invalidation only sees this process's writes, so it is off by default and
+    # entries expire after subgraph_cache_ttl_s (bounds staleness with several workers)
+    subgraph_cache_max_cost: int = 0
+    subgraph_cache_ttl_s: float = 30.0
+    # POST /graph/expand: seeds expanded at once (one Neo4j session each)
+    expand_concurrency: int = 4
+
+    # POST /memories/bulk pipeline
+    bulk_batch_size: int = 100
+    bulk_queue_size: int = 4
+
+    # "sync": endpoints write Postgres and Neo4j themselves; "outbox": Postgres is
+    # authoritative and graph writes are queued in graph_outbox (sql/002) for a worker
+    graph_write_mode: str = "sync"
+    outbox_batch_size: int = 100
+    outbox_poll_interval_s: float = 1.0
+    outbox_lease_s: int = 60
+    outbox_max_attempts: int = 10
+
+    # GET /events change feed: replay buffer for Last-Event-ID resume, per-client queue
+    events_buffer_size: int = 1000
+    events_queue_size: int = 256
+    events_heartbeat_s: float = 15.0
+
+    # instrumentation: stdlib logging level for app.* loggers (DEBUG adds
+    # per-call summaries), and a Server-Timing header on every response
+    log_level: str = "INFO"
+    server_timing: bool = True
+
+
+class Lazy(Generic[T]):
+    """
+    Module-level singleton built by `factory` on first attribute access, so that
+    importing a module doesn't validate settings, open files or create clients.
+    Attribute reads and writes go to the built object.
+    """
+
+    __slots__ = ("_factory", "_obj")
+
+    def __init__(self, factory: Callable[[], T]):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_obj", None)
+
+    def resolve(self) -> T:
+        if self._obj is None:
+            object.__setattr__(self, "_obj", self._factory())
+        return self._obj
+
+    @property
+    def resolved(self) -> bool:
+        return self._obj is not None
+
+    def reset(self):
+        """Forget the built object; the next access builds a new one."""
+        object.__setattr__(self, "_obj", None)
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resolve(), name, value)
+
 
-settings = Settings()
+# read from the environment (and .env) on first use, not at import
+settings: Settings = Lazy(Settings)
 
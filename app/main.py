@@ -1,13 +1,83 @@
+import asyncio
+import json
+import logging
+import time
 import uuid
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from app.schemas import *
-from app.services.embeddings import get_embedding
-from app.services.db import insert_memory, mark_memory_outdated, search_memories, get_memory_by_id
+from app.services.embeddings import get_embedding, close_embeddings, cache_stats, warm_embeddings
+from app.config import settings
+from app.services.db import canonical_id, get_supabase, insert_memory, mark_memory_outdated, search_memories, get_memory_by_id, get_memories_by_ids, load_vector_index, mark_memories_merged, write_memory_with_outbox, outbox_counts, embedding_queue_counts, lexical_search_memories, reciprocal_rank_fusion
 from app.services.graph import *
-from app.services.suggest import suggest_links_for
+from app.services.suggest import suggest_links_for, start_suggestion_job, get_suggestion_job
+from app.services.ingest import bulk_ingest, iter_ndjson, iter_request
+from app.services.events import broadcaster, format_sse, publish
+from app.services.outbox import worker as outbox_worker, reconcile
+from app.services.embed_queue import worker as embedding_worker
+from app.services.rerank import fetch_rerank_context, rerank
+from app.services.metrics import end_request, observe_request, registry, server_timing, start_request
 
-app = FastAPI(title="Memory Platform", version="0.1.0")
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s %(message)s")
+logger = logging.getLogger(__name__)
+
+# set by lifespan: duration of each warmup step and time until ready (ms)
+startup = {}
+
+
+async def _warm(name, coro, timings, required=False):
+    start = time.perf_counter()
+    try:
+        await coro
+    except Exception as e:
+        if required:
+            raise
+        logger.error("warmup %s failed: %r", name, e)
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000.0, 1)
+
+
+async def _bootstrap_schema():
+    res = await bootstrap_schema()
+    for name, err in res["errors"].items():
+        logger.warning("schema %s failed: %s", name, err)
+
+
+async def _load_index():
+    n = await load_vector_index()
+    logger.info("loaded %d memories into the local %s index", n, settings.vector_index)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing connects at import; settings are validated here, and the clients
+    # and the index are warmed up concurrently before the first request.
+    start = time.perf_counter()
+    logging.getLogger("app").setLevel(settings.log_level.upper())
+    timings = {}
+    steps = [
+        _warm("neo4j", _bootstrap_schema(), timings),
+        _warm("embeddings", warm_embeddings(), timings),
+    ]
+    if settings.supabase_url:
+        steps.append(_warm("supabase", get_supabase(), timings))
+    if settings.search_backend == "local":
+        steps.append(_warm("index", _load_index(), timings, required=True))
+    await asyncio.gather(*steps)
+    if settings.graph_write_mode == "outbox":
+        outbox_worker.start()
+    if settings.embedding_mode == "deferred":
+        embedding_worker.start()
+    startup.update(warmup_ms=timings, ready_ms=round((time.perf_counter() - start) * 1000.0, 1))
+    logger.info("ready in %.0f ms (warmup %s)", startup["ready_ms"], timings)
+    yield
+    await asyncio.gather(outbox_worker.stop(), embedding_worker.stop())
+    await close_embeddings()
+    await close_driver()
+
+app = FastAPI(title="Memory Platform", version="0.1.0", lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -22,89 +92,256 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],        
     allow_headers=["*"],        
+    # response headers the browser may read: pagination cursors and timings
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Request latency by route, and a Server-Timing header with the spans of external calls."""
+    token = start_request()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        timings = end_request(token)
+        route = request.scope.get("route")
+        observe_request(request.method, route.path if route else "unmatched", status, elapsed)
+    if settings.server_timing:
+        response.headers["Server-Timing"] = server_timing(timings, elapsed)
+    return response
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text format: external call and request latency histograms, call counters."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+async def embed_for_write(text: str) -> list[float] | None:
+    """None in deferred mode: the row is stored pending and embedded in the background."""
+    if settings.embedding_mode == "deferred":
+        return None
+    return await get_embedding(text)
+
+def _written(mem_id, embedding) -> dict:
+    if embedding is None:
+        embedding_worker.notify()
+        return {"id": str(mem_id), "dim": None, "embedding_status": "pending"}
+    return {"id": str(mem_id), "dim": len(embedding)}
+
 @app.post("/memories")
 async def create_memory(payload: MemoryCreate):
     if not payload.content.strip():
         raise HTTPException(status_code=400, detail="content cannot be empty")
 
     # 1. embed
-    embedding = await get_embedding(payload.content)
+    embedding = await embed_for_write(payload.content)
 
     mem_id = uuid.uuid4()
 
-    # 2. store in Postgres
-    insert_memory(
-        id_=mem_id,
-        content=payload.content,
-        embedding=embedding,
-        metadata=payload.metadata,
+    if settings.graph_write_mode == "outbox":
+        # 2. Postgres row + queued graph write in one transaction; the worker creates the node
+        await write_memory_with_outbox(
+            mem_id, payload.content, embedding, payload.metadata,
+            op="create_node", payload={"id": str(mem_id), "content": payload.content},
+        )
+        outbox_worker.notify()
+        publish("memory.created", id=str(mem_id), content=payload.content, metadata=payload.metadata)
+        return _written(mem_id, embedding)
+
+    # 2. store in Postgres and 3. create in Neo4j (independent, run concurrently)
+    await asyncio.gather(
+        insert_memory(
+            id_=mem_id,
+            content=payload.content,
+            embedding=embedding,
+            metadata=payload.metadata,
+        ),
+        create_memory_node(str(mem_id), payload.content),
     )
 
-    # 3. create in Neo4j
-    create_memory_node(str(mem_id), payload.content)
+    publish("memory.created", id=str(mem_id), content=payload.content, metadata=payload.metadata)
 
     # 4. return
-    return {"id": str(mem_id), "dim": len(embedding)}
+    return _written(mem_id, embedding)
+
+@app.post("/memories/bulk")
+async def bulk_create_memories(request: Request):
+    """
+    JSON body: BulkIngestRequest.
+    Content-Type application/x-ndjson: one item ({"key", "content", "metadata"}) or
+    relationship ({"from_key", "to_key", "type"}) per line, consumed as it streams in.
+    """
+    if "ndjson" in request.headers.get("content-type", ""):
+        records = iter_ndjson(request.stream())
+    else:
+        try:
+            body = BulkIngestRequest(**(await request.json()))
+        except Exception as e:
+            raise HTTPException(400, f"invalid bulk request: {e}")
+        records = iter_request(body.items, body.relationships)
+    res = await bulk_ingest(records)
+    for item in res["items"]:
+        if item["ok"]:
+            publish("memory.created", id=item["id"], key=item["key"])
+    for rel in res["relationships"]:
+        if rel["ok"]:
+            publish("memory.linked", **{"from": rel["from"], "to": rel["to"], "type": rel["type"]})
+    return res
 
 @app.post("/memories/{source_id}/extend")
-def extend_memory(source_id: str, body: RelationshipCreate):
+async def extend_memory(source_id: str, body: RelationshipCreate):
     # assume both nodes exist
-    create_relationship(source_id, body.target_id, "EXTEND")
+    await create_relationship(source_id, body.target_id, "EXTEND")
+    publish("memory.linked", **{"from": source_id, "to": body.target_id, "type": "EXTEND"})
     return {"ok": True, "type": "EXTEND", "from": source_id, "to": body.target_id}
 
 
 @app.post("/memories/{source_id}/update")
-def update_memory(source_id: str, body: RelationshipCreate):
-    # create the relation in Neo4j
-    create_relationship(source_id, body.target_id, "UPDATE")
-    # mark source as outdated in Supabase
-    mark_memory_outdated(source_id)
+async def update_memory(source_id: str, body: RelationshipCreate):
+    # create the relation in Neo4j and mark source as outdated in Supabase
+    await asyncio.gather(
+        create_relationship(source_id, body.target_id, "UPDATE"),
+        mark_memory_outdated(source_id),
+    )
+    publish("memory.linked", **{"from": source_id, "to": body.target_id, "type": "UPDATE"})
     return {"ok": True, "type": "UPDATE", "from": source_id, "to": body.target_id}
 
 
 @app.post("/memories/{source_id}/derive")
-def derive_memory(source_id: str, body: RelationshipCreate):
-    create_relationship(source_id, body.target_id, "DERIVE")
+async def derive_memory(source_id: str, body: RelationshipCreate):
+    await create_relationship(source_id, body.target_id, "DERIVE")
+    publish("memory.linked", **{"from": source_id, "to": body.target_id, "type": "DERIVE"})
     return {"ok": True, "type": "DERIVE", "from": source_id, "to": body.target_id}
 
 @app.get("/memories/{memory_id}")
-async def get_memory(memory_id: str, depth: int = 2):
-    # 1) fetch base memory from Supabase
-    mem = get_memory_by_id(memory_id)
+async def get_memory(memory_id: str, depth: int = 2, include_content: bool = True, include_embedding: bool = False):
+    # 1) fetch base memory from Supabase and 2) its subgraph, concurrently
+    mem, g = await asyncio.gather(
+        get_memory_by_id(memory_id, include_embedding=include_embedding),
+        expand_memory_subgraph([memory_id], depth=depth, include_content=include_content),
+    )
     if not mem:
         raise HTTPException(status_code=404, detail="Memory not found")
 
-    # 2) fetch small subgraph around it
-    g = expand_memory_subgraph([memory_id], depth=depth)
-
     return {
         "memory": mem,
         "graph": g,
     }
 
+@app.post("/memories/batch-get")
+async def batch_get_memories(payload: BatchGetRequest):
+    # rows are keyed by the canonical uuid; answer under the id the caller sent
+    requested = {id_: canonical_id(id_) for id_ in payload.ids}
+    ids = list(dict.fromkeys(c for c in requested.values() if c is not None))
+    g = None
+    if payload.with_graph and ids:
+        # rows in one IN query; the shared expansion runs alongside (unknown seeds match nothing)
+        rows, g = await asyncio.gather(
+            get_memories_by_ids(ids, fields=payload.fields),
+            expand_memory_subgraph(ids, depth=payload.depth, include_content=payload.graph_include_content),
+        )
+    else:
+        rows = await get_memories_by_ids(ids, fields=payload.fields)
+    items = [
+        {"id": id_, "ok": False, "error": "invalid id"} if canon is None
+        else {"id": id_, "ok": True, "memory": rows[canon]} if canon in rows
+        else {"id": id_, "ok": False, "error": "memory not found"}
+        for id_, canon in requested.items()
+    ]
+    out = {
+        "items": items,
+        "not_found": [i["id"] for i in items if i.get("error") == "memory not found"],
+        "invalid": [i["id"] for i in items if i.get("error") == "invalid id"],
+    }
+    if payload.with_graph:
+        out["graph"] = g or {"nodes": [], "edges": []}
+    return out
+
+async def _fill_head_rows(matches):
+    """Metadata (and created_at) from Postgres for chain heads rerank put in place of outdated rows."""
+    heads = [r for r in matches if r.get("collapsed") and r.get("metadata") is None]
+    if not heads:
+        return
+    try:
+        rows = await get_memories_by_ids([r["id"] for r in heads], fields=["metadata", "created_at"])
+    except Exception as e:
+        logger.warning("head rows not filled: %r", e)
+        return
+    for r in heads:
+        row = rows.get(r["id"])
+        if row is not None:
+            r["metadata"] = row.get("metadata")
+            r["created_at"] = row.get("created_at") or r.get("created_at")
+
 @app.post("/search")
 async def search_memories_endpoint(payload: SearchRequest):
-    # 1) embed the query
-    query_emb = await get_embedding(payload.query)
-
-    # 2) hit Supabase RPC
-    matches = search_memories(
-        query_embedding=query_emb,
-        k=payload.k,
-        similarity_threshold=payload.similarity_threshold,
-    )
+    use_rerank = settings.rerank_enabled if payload.rerank is None else payload.rerank
+    # re-ranking can promote rows from below the top k, so fetch a deeper candidate list
+    k = max(payload.k, settings.rerank_candidates) if use_rerank else payload.k
+
+    if payload.mode == "lexical":
+        # full-text index only: no embedding round trip
+        matches = await lexical_search_memories(payload.query, k=k, filters=payload.filters)
+    elif payload.mode == "hybrid":
+        n = max(k, settings.hybrid_candidates)
+
+        async def vector():
+            query_emb = await get_embedding(payload.query)
+            return await search_memories(
+                query_embedding=query_emb,
+                k=n,
+                similarity_threshold=payload.similarity_threshold,
+                filters=payload.filters,
+            )
+
+        # the lexical list is ready while the query is still being embedded
+        vec, lex = await asyncio.gather(
+            vector(),
+            lexical_search_memories(payload.query, k=n, filters=payload.filters),
+        )
+        matches = reciprocal_rank_fusion([vec, lex], k, settings.hybrid_rrf_k)
+    else:
+        # 1) embed the query
+        query_emb = await get_embedding(payload.query)
+
+        # 2) hit Supabase RPC
+        matches = await search_memories(
+            query_embedding=query_emb,
+            k=k,
+            similarity_threshold=payload.similarity_threshold,
+            filters=payload.filters,
+            query_text=payload.query,
+        )
+
+    reranked = False
+    if use_rerank and matches:
+        try:
+            context = await asyncio.wait_for(
+                fetch_rerank_context([row["id"] for row in matches], settings.rerank_max_hops),
+                settings.rerank_budget_ms / 1000.0,
+            )
+            matches = rerank(matches, context, payload.k,
+                             settings.rerank_outdated_penalty, settings.rerank_neighbor_weight)
+            reranked = True
+        except Exception as e:  # over budget or graph unavailable: keep the store's ranking
+            logger.warning("rerank skipped: %r", e)
+            matches = matches[:payload.k]
+        if reranked:
+            await _fill_head_rows(matches)
 
     # 3) expand each result in Neo4j
     graph = {}
     if payload.with_graph and matches:
         ids = [row["id"] for row in matches]
-        graph = expand_memory_subgraph(ids)
+        graph = await expand_memory_subgraph(ids, include_content=payload.graph_include_content)
 
     return {
         "query": payload.query,
         "results": matches,
+        "reranked": reranked,
         "graph": graph,
     }
 
@@ -112,77 +349,268 @@ async def search_memories_endpoint(payload: SearchRequest):
 async def supersede_memory(id: str, body: SupersedeRequest):
     new_id = str(uuid.uuid4())
 
+    if settings.graph_write_mode == "outbox":
+        emb = await embed_for_write(body.content)
+        ok = await write_memory_with_outbox(
+            new_id, body.content, emb, {"op": "UPDATE", "from": id},
+            op="supersede", payload={"old_id": id, "new_id": new_id, "content": body.content},
+            from_id=id, mark_outdated=True,
+        )
+        if not ok:
+            raise HTTPException(404, "old memory not found")
+        outbox_worker.notify()
+        if emb is None:
+            embedding_worker.notify()
+        publish("memory.superseded", old_id=id, new_id=new_id, content=body.content)
+        return {"ok": True, "new_id": new_id}
+
     # 1) Neo4j: atomically set old->outdated, create new node, and :UPDATE edge
-    g = supersede_version(old_id=id, new_id=new_id, content=body.content)
+    # 2) Embedding for the new content (independent of 1, run concurrently)
+    g, emb = await asyncio.gather(
+        supersede_version(old_id=id, new_id=new_id, content=body.content),
+        embed_for_write(body.content),
+    )
     if not g:
         raise HTTPException(404, "old memory not found")
-    new_version = g["new"]["version"] 
+    new_version = g["new"]["version"]
 
-    # 2) Embedding for the new content
-    emb = await get_embedding(body.content) 
-
-    # 3) Supabase: insert the new version row
-    insert_memory(
-        id_=new_id,
-        content=body.content,
-        embedding=emb,       
-        metadata={"op": "UPDATE", "from": id},
+    # 3) Supabase: insert the new version row and 4) mark old row outdated
+    await asyncio.gather(
+        insert_memory(
+            id_=new_id,
+            content=body.content,
+            embedding=emb,
+            metadata={"op": "UPDATE", "from": id},
+        ),
+        mark_memory_outdated(id),
     )
+    if emb is None:
+        embedding_worker.notify()
 
-    # 4) Supabase: mark old row outdated
-    mark_memory_outdated(id)
-
+    publish("memory.superseded", old_id=id, new_id=new_id, version=new_version, content=body.content)
     return {"ok": True, "new_id": new_id}
 
 @app.post("/memories/{id}/extend-to/{target_id}")
-def extend_memory_to(id: str, target_id: str):
+async def extend_memory_to(id: str, target_id: str):
     try:
-        return {"ok": True, **create_extend(id, target_id)}
+        res = await create_extend(id, target_id)
     except Exception as e:
         raise HTTPException(500, f"extend failed: {e}")
+    publish("memory.linked", **{"from": id, "to": target_id, "type": "EXTEND"})
+    return {"ok": True, **res}
 
 @app.post("/memories/{id}/derive-new")
 async def derive_memory_new(id: str, body: SupersedeRequest):
     new_id = str(uuid.uuid4())
+
+    if settings.graph_write_mode == "outbox":
+        emb = await embed_for_write(body.content)
+        ok = await write_memory_with_outbox(
+            new_id, body.content, emb, {"op": "DERIVE", "from": id},
+            op="derive", payload={"base_id": id, "derived_id": new_id, "content": body.content},
+            from_id=id,
+        )
+        if not ok:
+            raise HTTPException(404, "base memory not found")
+        outbox_worker.notify()
+        if emb is None:
+            embedding_worker.notify()
+        publish("memory.created", id=new_id, content=body.content, metadata={"op": "DERIVE", "from": id})
+        publish("memory.linked", **{"from": id, "to": new_id, "type": "DERIVE"})
+        return {"ok": True, "new_id": new_id, "graph": None}
     try:
-        graph_res = create_derive(id, new_id, body.content)
+        graph_res, emb = await asyncio.gather(
+            create_derive(id, new_id, body.content),
+            embed_for_write(body.content),
+        )
         # Also write new node to Supabase
-        emb = await get_embedding(body.content)
-        insert_memory(
+        await insert_memory(
             id_=new_id,
             content=body.content,
             embedding=emb,
             metadata={"op": "DERIVE", "from": id},
         )
-        return {"ok": True, "new_id": new_id, "graph": graph_res}
     except Exception as e:
         raise HTTPException(500, f"derive failed: {e}")
+    if emb is None:
+        embedding_worker.notify()
+    publish("memory.created", id=new_id, content=body.content, metadata={"op": "DERIVE", "from": id})
+    publish("memory.linked", **{"from": id, "to": new_id, "type": "DERIVE"})
+    return {"ok": True, "new_id": new_id, "graph": graph_res}
 
 @app.get("/memories/{id}/lineage")
-def get_lineage(id: str):
-    return fetch_lineage(id)
+async def get_lineage(id: str, response: Response, direction: LineageDirection = "descendants",
+                      max_hops: int = Query(8, ge=1, le=32), limit: int = Query(100, ge=1, le=1000),
+                      after: str | None = None):
+    page = await fetch_lineage(id, max_hops=max_hops, direction=direction, limit=limit, after=after)
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["items"]
+
+@app.get("/memories/{id}/head")
+async def get_head(id: str):
+    res = await fetch_head(id)
+    if res is None:
+        raise HTTPException(status_code=404, detail="Memory not found")
+    return res
+
+@app.post("/lineage/backfill")
+async def lineage_backfill():
+    return await backfill_version_pointers()
 
 @app.get("/timeline")
-def global_timeline(limit: int = 100, status: str | None = None):
-    return fetch_timeline(limit, status)
+async def global_timeline(response: Response, limit: int = Query(100, ge=1, le=1000),
+                          status: str | None = None, before: str | None = None):
+    page = await fetch_timeline(limit, status, before)
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["items"]
+
+@app.post("/timeline/backfill")
+async def timeline_backfill():
+    return await backfill_timeline_events()
 
 @app.post("/memories/{id}/suggest")
-def suggest_links(id: str):
-    return {"suggestions": suggest_links_for(id)}
+async def suggest_links(id: str):
+    return {"suggestions": await suggest_links_for(id)}
+
+@app.post("/suggestions/jobs")
+async def create_suggestion_job(body: SuggestionJobRequest | None = None):
+    body = body or SuggestionJobRequest()
+    return await start_suggestion_job(delta=body.delta, since=body.since)
+
+@app.get("/suggestions/jobs/{job_id}")
+def read_suggestion_job(job_id: str, offset: int = 0, limit: int = 50):
+    job = get_suggestion_job(job_id, offset=offset, limit=min(limit, 500))
+    if job is None:
+        raise HTTPException(404, "suggestion job not found")
+    return job
 
 @app.post("/graph/links")
-def apply_link(payload: dict):
+async def apply_link(payload: dict):
     t = payload.get("type")
     if t not in ("EXTEND", "DERIVE"):
         raise HTTPException(400, "type must be EXTEND or DERIVE")
-    create_link(payload["from"], payload["to"], t)
+    res = await create_link(payload["from"], payload["to"], t)
+    if not res["ok"]:
+        raise HTTPException(404, res["error"])
+    publish("memory.linked", **{"from": payload["from"], "to": payload["to"], "type": t})
     return {"ok": True}
 
+@app.post("/graph/links/batch")
+async def apply_links_batch(body: LinkBatchRequest):
+    results = await create_links_batch([{"from": l.from_id, "to": l.to_id, "type": l.type} for l in body.links])
+    for r in results:
+        if r["ok"]:
+            publish("memory.linked", **{"from": r["from"], "to": r["to"], "type": r["type"]})
+    return {
+        "created": sum(1 for r in results if r["ok"]),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "results": results,
+    }
+
+async def _reconcile_merged(results: list[dict]) -> dict:
+    # graph transaction committed; bring the Supabase rows in line
+    merged = [r["source_id"] for r in results if r["ok"]]
+    for r in results:
+        if r["ok"]:
+            publish("memory.merged", source_id=r["source_id"], target_id=r["target_id"])
+    try:
+        await mark_memories_merged(merged)
+        return {"postgres_reconciled": True}
+    except Exception as e:
+        return {"postgres_reconciled": False, "postgres_error": str(e)}
+
 @app.post("/memories/merge")
-def merge(payload: dict):
+async def merge(payload: dict):
     src = payload["source_id"]
     tgt = payload["target_id"]
     if src == tgt:
         raise HTTPException(400, "source and target must differ")
-    res = merge_duplicate_nodes(src, tgt)
-    return res
\ No newline at end of file
+    res = await merge_duplicate_nodes(src, tgt)
+    if res.get("ok"):
+        res.update(await _reconcile_merged([{"source_id": src, "target_id": tgt, "ok": True}]))
+    return res
+
+@app.post("/memories/merge/batch")
+async def merge_batch(body: MergeBatchRequest):
+    results = await merge_duplicate_nodes_batch([(p.source_id, p.target_id) for p in body.pairs])
+    return {
+        "merged": sum(1 for r in results if r["ok"]),
+        "results": results,
+        **(await _reconcile_merged(results)),
+    }
+
+@app.get("/health")
+async def health(response: Response):
+    neo4j = await verify_connection()
+    ok = neo4j["connected"] and not neo4j.get("missing")
+    if not ok:
+        response.status_code = 503
+    return {"ok": ok, "neo4j": neo4j, "startup": startup}
+
+@app.post("/graph/schema")
+async def graph_schema():
+    return await bootstrap_schema()
+
+@app.get("/graph/outbox")
+async def graph_outbox_stats():
+    return {"mode": settings.graph_write_mode, **outbox_worker.stats(), **(await outbox_counts())}
+
+@app.post("/graph/reconcile")
+async def graph_reconcile(repair: bool = False):
+    return await reconcile(repair=repair)
+
+@app.get("/events")
+async def change_feed(request: Request, last_event_id: int | None = None):
+    """
+    Server-Sent Events stream of memory.created / superseded / linked / merged.
+    Resumes after the Last-Event-ID header (or ?last_event_id=); a `reset`
+    event means the gap can't be replayed and the client should re-fetch.
+    """
+    header = request.headers.get("last-event-id")
+    if header is not None:
+        try:
+            last_event_id = int(header)
+        except ValueError:
+            raise HTTPException(400, "invalid Last-Event-ID")
+
+    async def stream():
+        async for event in broadcaster.subscribe(last_event_id, settings.events_heartbeat_s):
+            yield format_sse(event)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/events/stats")
+def change_feed_stats():
+    return broadcaster.stats()
+
+@app.post("/graph/expand")
+async def expand_seeds(payload: ExpandRequest):
+    """
+    NDJSON stream: one line per seed, in rank order, as soon as it's expanded
+    (seeds run concurrently, up to settings.expand_concurrency), then a "done" line.
+    """
+    async def stream():
+        async for msg in iter_seed_expansions(
+            payload.seeds, payload.depth, payload.include_content, payload.max_nodes, payload.max_edges,
+        ):
+            yield json.dumps(msg, default=str) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/graph/cache")
+def subgraph_cache_stats():
+    return subgraph_cache.stats()
+
+@app.get("/embeddings/queue")
+async def embedding_queue_stats():
+    return {"mode": settings.embedding_mode, **embedding_worker.stats(), **(await embedding_queue_counts())}
+
+@app.get("/embeddings/cache")
+def embedding_cache_stats():
+    return cache_stats()
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Any, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Literal, Optional
 from datetime import datetime
 
 class MemoryCreate(BaseModel):
@@ -10,12 +10,45 @@ class RelationshipCreate(BaseModel):
     target_id: str       
     metadata: dict | None = None
 
+class SearchFilters(BaseModel):
+    # applied inside the vector scan, so k results come back after filtering
+    exclude_ids: list[str] = []
+    status: Optional[str] = None                    # e.g. "active"
+    metadata: Optional[dict[str, Any]] = None       # containment match, like jsonb @>
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+    def is_empty(self) -> bool:
+        return not (self.exclude_ids or self.status or self.metadata
+                    or self.created_after or self.created_before)
+
 class SearchRequest(BaseModel):
     query: str
     k: int = 5
     similarity_threshold: float = 0.0
     with_graph: bool = True
+    graph_include_content: bool = True
+    filters: Optional[SearchFilters] = None
+    # "lexical" answers from the full-text index alone, without embedding the query
+    mode: Literal["vector", "hybrid", "lexical"] = "vector"
+    rerank: Optional[bool] = None    # graph-aware re-ranking; None = settings.rerank_enabled
     
+MemoryField = Literal["id", "content", "metadata", "status", "created_at", "embedding"]
+
+class BatchGetRequest(BaseModel):
+    ids: list[str] = Field(max_length=1000)
+    fields: Optional[list[MemoryField]] = None    # projection; None = everything but the embedding
+    with_graph: bool = False                      # one shared expansion around all found ids
+    depth: int = Field(2, ge=1, le=8)
+    graph_include_content: bool = True
+
+class ExpandRequest(BaseModel):
+    seeds: list[str] = Field(max_length=100)        # in rank order; streamed back in this order
+    depth: int = Field(2, ge=1, le=8)
+    include_content: bool = True
+    max_nodes: Optional[int] = Field(None, ge=1)    # per seed, at most settings.graph_max_nodes
+    max_edges: Optional[int] = Field(None, ge=1)
+
 class SupersedeRequest(BaseModel):
     content: str
 
@@ -29,8 +62,44 @@ class TimelineItem(BaseModel):
     from_id: Optional[str] = None
     to_id: Optional[str] = None
 
+LineageDirection = Literal["descendants", "ancestors", "both"]
+
 class LineageItem(BaseModel):
     op: str
     at: Optional[datetime] = None
     from_id: str
     to_id: str
+
+class BulkMemoryItem(BaseModel):
+    key: Optional[str] = None        # client-side key, used to reference the item in relationships
+    content: str
+    metadata: Optional[dict[str, Any]] = None
+
+class BulkRelationship(BaseModel):
+    from_key: str
+    to_key: str
+    type: Literal["EXTEND", "DERIVE"]
+
+class BulkIngestRequest(BaseModel):
+    items: list[BulkMemoryItem]
+    relationships: list[BulkRelationship] = []
+
+class SuggestionJobRequest(BaseModel):
+    delta: bool = False                  # only memories created since the last finished job
+    since: Optional[datetime] = None     # explicit watermark, overrides delta
+
+class MergePair(BaseModel):
+    source_id: str    # merged away
+    target_id: str    # kept
+
+class MergeBatchRequest(BaseModel):
+    pairs: list[MergePair]
+
+class LinkCreate(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+    from_id: str = Field(alias="from")
+    to_id: str = Field(alias="to")
+    type: Literal["EXTEND", "DERIVE"]
+
+class LinkBatchRequest(BaseModel):
+    links: list[LinkCreate]
@@ -1,56 +1,510 @@
+import asyncio
+import json
+import logging
 import uuid
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Optional, get_args
 from app.config import settings
-from supabase import create_client
+from app.schemas import MemoryField, SearchFilters
+from app.services.metrics import span, timed
 
+if TYPE_CHECKING:
+    from supabase import AsyncClient
 
-SUPA_KEY = (
-    settings.supabase_service_role_key
-    or settings.supabase_anon_key
-)
+logger = logging.getLogger(__name__)
 
-supabase = create_client(settings.supabase_url, SUPA_KEY)
 
-def insert_memory(id_, content, embedding, metadata=None):
+_supabase: Optional["AsyncClient"] = None
+_supabase_lock = asyncio.Lock()
+
+
+async def get_supabase() -> "AsyncClient":
+    """Async PostgREST client, created on first use (client creation is a coroutine)."""
+    global _supabase
+    if _supabase is None:
+        async with _supabase_lock:
+            if _supabase is None:
+                from supabase import acreate_client  # a large import; not needed offline
+
+                key = settings.supabase_service_role_key or settings.supabase_anon_key
+                _supabase = await acreate_client(settings.supabase_url, key)
+    return _supabase
+
+
+# row fields returned by the API; the embedding is opt-in (12+ KB of text per row)
+MEMORY_COLUMNS = "id, content, metadata, status, created_at"
+MEMORY_FIELDS = get_args(MemoryField)
+
+# ids per IN (...) filter: they travel in the PostgREST query string
+IN_CHUNK = 200
+# IN queries in flight at once for one lookup
+IN_CONCURRENCY = 4
+
+
+def encode_vector(embedding):
+    """
+    pgvector text literal with 6 significant digits: about half the bytes of a
+    JSON list of Python floats, and well below float32 noise for cosine scores.
+    """
+    if embedding is None or isinstance(embedding, str):
+        return embedding
+    return "[" + ",".join(f"{x:.6g}" for x in embedding) + "]"
+
+
+def get_local_index():
+    """The in-process vector index, when search_backend="local" and it has been loaded."""
+    if settings.search_backend != "local":
+        return None
+    from app.services.vector_index import get_index
+    return get_index()
+
+
+async def iter_memories(columns: str, page_size: int = 1000, status: str = None, created_after: str = None):
+    """Yield pages of memories rows, keyset-paginated by id (no OFFSET rescans)."""
+    supabase = await get_supabase()
+    last_id = None
+    while True:
+        q = supabase.table("memories").select(columns)
+        if last_id is not None:
+            q = q.gt("id", last_id)
+        if status is not None:
+            q = q.eq("status", status)
+        if created_after is not None:
+            q = q.gt("created_at", created_after)
+        with span("supabase", "iter_memories"):
+            res = await q.order("id").limit(page_size).execute()
+        rows = res.data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            break
+        last_id = rows[-1]["id"]
+
+
+async def load_vector_index(page_size: int = 1000) -> int:
+    """
+    Build the in-process vector index from the memories table
+    and install it for search_memories. Returns the number of indexed rows.
+    """
+    from app.services.vector_index import make_index, set_index
+
+    index = make_index(settings.vector_index, settings.embedding_dim, settings.vector_precision,
+                       settings.vector_rescore_factor, settings.vector_store_path)
+    if not settings.supabase_url:  # offline: start empty, fill from inserts
+        set_index(index)
+        return 0
+    async for rows in iter_memories("id, content, metadata, status, created_at, embedding", page_size):
+        for r in rows:
+            if r.get("embedding") is not None:
+                index.add(r["id"], r["embedding"], r.get("content"), r.get("metadata"),
+                          r.get("status") or "active", r.get("created_at"))
+    set_index(index)
+    return len(index)
+
+
+@timed("supabase")
+async def insert_memory(id_, content, embedding, metadata=None):
     data = {
         "id": str(id_),
         "content": content,
-        "embedding": embedding,
+        "embedding": encode_vector(embedding),
         "metadata": metadata,
     }
-    resp = supabase.table("memories").insert(data).execute()
-    #print("[SUPABASE INSERT]", resp)
+    supabase = await get_supabase()
+    resp = await supabase.table("memories").insert(data).execute()
+    index = get_local_index()
+    if index is not None and embedding is not None:  # pending rows join once embedded
+        index.add(str(id_), embedding, content, metadata)
     return resp
 
-def mark_memory_outdated(id_: str):
-    res = supabase.table("memories").update({"status": "outdated"}).eq("id", id_).execute()
-    print("[SUPABASE UPDATE status=outdated]", res)
-    return res
+@timed("supabase")
+async def insert_memories(rows: list[dict]):
+    """
+    Multi-row insert; rows carry id, content, embedding, metadata.
+    PostgREST runs it as one INSERT statement, so the batch succeeds or fails as a whole.
+    """
+    data = [
+        {
+            "id": str(r["id"]),
+            "content": r["content"],
+            "embedding": encode_vector(r["embedding"]),
+            "metadata": r.get("metadata"),
+        }
+        for r in rows
+    ]
+    supabase = await get_supabase()
+    resp = await supabase.table("memories").insert(data).execute()
+    index = get_local_index()
+    if index is not None:
+        for r in rows:
+            index.add(str(r["id"]), r["embedding"], r["content"], r.get("metadata"))
+    return resp
 
-def search_memories(query_embedding: list[float], k: int = 5, similarity_threshold: float = 0.0, exclude_id: str = None):
+@timed("supabase")
+async def insert_memories_with_outbox(rows: list[dict]):
     """
-    Calls the Postgres function match_memories(...)
+    insert_memories plus one create_node graph_outbox row per memory, in one
+    Postgres transaction (sql/005_bulk_outbox.sql).
     """
-    resp = supabase.rpc(
-        "match_memories",
+    data = [
+        {
+            "id": str(r["id"]),
+            "content": r["content"],
+            "embedding": encode_vector(r["embedding"]),
+            "metadata": r.get("metadata"),
+        }
+        for r in rows
+    ]
+    supabase = await get_supabase()
+    await supabase.rpc("insert_memories_with_outbox", {"p_rows": data}).execute()
+    index = get_local_index()
+    if index is not None:
+        for r in rows:
+            index.add(str(r["id"]), r["embedding"], r["content"], r.get("metadata"))
+
+@timed("supabase")
+async def delete_memories(ids: list[str]):
+    """Remove rows written by a batch whose graph write failed (bulk ingest compensation)."""
+    ids = [str(i) for i in ids]
+    supabase = await get_supabase()
+    for i in range(0, len(ids), IN_CHUNK):
+        await supabase.table("memories").delete().in_("id", ids[i:i + IN_CHUNK]).execute()
+    index = get_local_index()
+    if index is not None:
+        for id_ in ids:
+            index.remove(id_)
+
+@timed("supabase")
+async def write_memory_with_outbox(id_, content, embedding, metadata, op: str, payload: dict,
+                                   from_id: str = None, mark_outdated: bool = False) -> bool:
+    """
+    Insert a memory and the graph mutation mirroring it (graph_outbox row) in one
+    Postgres transaction. False (and nothing written) if from_id doesn't exist.
+    """
+    supabase = await get_supabase()
+    res = await supabase.rpc(
+        "write_memory_with_outbox",
+        {
+            "p_id": str(id_),
+            "p_content": content,
+            "p_embedding": encode_vector(embedding),
+            "p_metadata": metadata,
+            "p_op": op,
+            "p_payload": payload,
+            "p_from_id": from_id,
+            "p_mark_outdated": mark_outdated,
+        },
+    ).execute()
+    if not res.data:
+        return False
+    index = get_local_index()
+    if index is not None:
+        if embedding is not None:
+            index.add(str(id_), embedding, content, metadata)
+        if mark_outdated:
+            index.set_status(from_id, "outdated")
+    return True
+
+@timed("supabase")
+async def claim_outbox(batch_size: int, lease_s: int) -> list[dict]:
+    supabase = await get_supabase()
+    res = await supabase.rpc("claim_graph_outbox", {"batch_size": batch_size, "lease_seconds": lease_s}).execute()
+    return sorted(res.data or [], key=lambda r: r["id"])
+
+@timed("supabase")
+async def ack_outbox(ids: list[int]):
+    if not ids:
+        return None
+    supabase = await get_supabase()
+    return await supabase.table("graph_outbox").update({
+        "status": "applied",
+        "applied_at": datetime.now(timezone.utc).isoformat(),
+        "last_error": None,
+    }).in_("id", ids).execute()
+
+@timed("supabase")
+async def retry_outbox(id_: int, error: str, delay_s: float, dead: bool = False):
+    """Put a failed row back after delay_s, or park it as 'dead' when it's out of attempts."""
+    supabase = await get_supabase()
+    return await supabase.table("graph_outbox").update({
+        "status": "dead" if dead else "pending",
+        "available_at": (datetime.now(timezone.utc) + timedelta(seconds=delay_s)).isoformat(),
+        "last_error": error[:2000],
+    }).eq("id", id_).execute()
+
+@timed("supabase")
+async def outbox_counts() -> dict:
+    supabase = await get_supabase()
+
+    async def count(status):
+        res = await supabase.table("graph_outbox").select("id", count="exact").eq("status", status).limit(1).execute()
+        return res.count or 0
+
+    statuses = ("pending", "inflight", "dead")
+    counts = await asyncio.gather(*(count(s) for s in statuses))
+    oldest = await (
+        supabase.table("graph_outbox").select("created_at")
+        .in_("status", ["pending", "inflight"]).order("id").limit(1).execute()
+    )
+    return {
+        **dict(zip(statuses, counts)),
+        "oldest_pending_at": oldest.data[0]["created_at"] if oldest.data else None,
+    }
+
+@timed("supabase")
+async def claim_pending_embeddings(batch_size: int, lease_s: int) -> list[dict]:
+    supabase = await get_supabase()
+    res = await supabase.rpc("claim_pending_embeddings", {"batch_size": batch_size, "lease_seconds": lease_s}).execute()
+    return res.data or []
+
+@timed("supabase")
+async def set_embeddings(rows: list[dict], embeddings: list[list[float]]) -> int:
+    """Store embeddings for claimed pending rows (one UPDATE) and add them to the local index."""
+    supabase = await get_supabase()
+    res = await supabase.rpc(
+        "set_embeddings",
+        {"items": [{"id": r["id"], "embedding": encode_vector(e)} for r, e in zip(rows, embeddings)]},
+    ).execute()
+    index = get_local_index()
+    if index is not None:
+        for r, e in zip(rows, embeddings):
+            index.add(r["id"], e, r.get("content"), r.get("metadata"), r.get("status") or "active", r.get("created_at"))
+    return res.data or 0
+
+@timed("supabase")
+async def retry_embeddings(ids: list[str], error: str, delay_s: float, failed: bool = False):
+    """Make rows claimable again after delay_s, or mark them 'failed' when out of attempts."""
+    supabase = await get_supabase()
+    update = {
+        "embedding_available_at": (datetime.now(timezone.utc) + timedelta(seconds=delay_s)).isoformat(),
+        "embedding_error": error[:2000],
+    }
+    if failed:
+        update["embedding_status"] = "failed"
+    return await supabase.table("memories").update(update).in_("id", ids).execute()
+
+@timed("supabase")
+async def embedding_queue_counts() -> dict:
+    supabase = await get_supabase()
+
+    async def count(status):
+        res = await supabase.table("memories").select("id", count="exact").eq("embedding_status", status).limit(1).execute()
+        return res.count or 0
+
+    pending, failed = await asyncio.gather(count("pending"), count("failed"))
+    oldest = await (
+        supabase.table("memories").select("created_at")
+        .eq("embedding_status", "pending").order("created_at").limit(1).execute()
+    )
+    oldest_at = oldest.data[0]["created_at"] if oldest.data else None
+    lag = None
+    if oldest_at is not None:
+        from app.services.vector_index import as_datetime
+        lag = (datetime.now(timezone.utc) - as_datetime(oldest_at)).total_seconds()
+    return {"pending": pending, "failed": failed, "oldest_pending_at": oldest_at, "lag_s": lag}
+
+@timed("supabase")
+async def match_pending_memories(query_text: str, k: int, filters: Optional[SearchFilters] = None) -> list[dict]:
+    """Full-text matches among rows still waiting for an embedding (flagged pending, no similarity)."""
+    supabase = await get_supabase()
+    resp = await supabase.rpc(
+        "match_pending_memories",
         {
-            "query_embedding": query_embedding,
+            "query_text": query_text,
             "match_count": k,
-            "similarity_threshold": similarity_threshold,
+            "exclude_ids": (filters.exclude_ids or None) if filters else None,
+            "filter_status": filters.status if filters else None,
         },
     ).execute()
+    return [{**row, "similarity": None, "pending": True} for row in resp.data or []]
+
+@timed("supabase")
+async def mark_memory_outdated(id_: str):
+    supabase = await get_supabase()
+    res = await supabase.table("memories").update({"status": "outdated"}).eq("id", id_).execute()
+    logger.debug("marked outdated id=%s rows=%d", id_, len(res.data or []))
+    index = get_local_index()
+    if index is not None:
+        index.set_status(id_, "outdated")
+    return res
+
 
-    # supabase-py returns .data
-    data = resp.data or []
-    
-    # Filter out excluded ID if provided
+@timed("supabase")
+async def mark_memories_merged(ids: list[str]):
+    """Reconcile rows whose graph nodes were merged away: status='merged', out of the local index."""
+    if not ids:
+        return None
+    supabase = await get_supabase()
+    res = await supabase.table("memories").update({"status": "merged"}).in_("id", ids).execute()
+    index = get_local_index()
+    if index is not None:
+        for id_ in ids:
+            index.remove(id_)
+    return res
+
+async def search_memories(query_embedding: list[float], k: int = 5, similarity_threshold: float = 0.0,
+                          exclude_id: str = None, filters: Optional[SearchFilters] = None,
+                          query_text: str = None):
+    """
+    Calls the Postgres function match_memories(...), or the in-process
+    vector index when search_backend="local".
+    Filters (and exclude_id) are applied inside the scan via match_memories_filtered,
+    so up to k rows come back after filtering.
+    Rows still waiting for an embedding never match; with query_text and
+    search_pending="lexical" up to k of them are appended from a full-text match.
+    """
     if exclude_id:
-        data = [row for row in data if row.get("id") != exclude_id]
-    
-    print("[SUPABASE SEARCH]", data)
+        filters = (filters or SearchFilters()).model_copy()
+        filters.exclude_ids = [*filters.exclude_ids, exclude_id]
+    if filters is not None and filters.is_empty():
+        filters = None
+
+    index = get_local_index()
+    if index is not None:
+        data = index.search(query_embedding, k=k, similarity_threshold=similarity_threshold, filters=filters)
+    elif filters is None:
+        supabase = await get_supabase()
+        with span("supabase", "match_memories"):
+            resp = await supabase.rpc(
+                "match_memories",
+                {
+                    "query_embedding": encode_vector(query_embedding),
+                    "match_count": k,
+                    "similarity_threshold": similarity_threshold,
+                },
+            ).execute()
+
+        # supabase-py returns .data
+        data = resp.data or []
+    else:
+        supabase = await get_supabase()
+        with span("supabase", "match_memories_filtered"):
+            resp = await supabase.rpc(
+                "match_memories_filtered",
+                {
+                    "query_embedding": encode_vector(query_embedding),
+                    "match_count": k,
+                    "similarity_threshold": similarity_threshold,
+                    "exclude_ids": filters.exclude_ids or None,
+                    "filter_status": filters.status,
+                    "filter_metadata": filters.metadata,
+                    "created_after": filters.created_after.isoformat() if filters.created_after else None,
+                    "created_before": filters.created_before.isoformat() if filters.created_before else None,
+                },
+            ).execute()
+        data = resp.data or []
+
+    if query_text and settings.embedding_mode == "deferred" and settings.search_pending == "lexical":
+        data = list(data) + await match_pending_memories(query_text, k, filters)
+
+    logger.debug("search k=%d filtered=%s rows=%d", k, filters is not None, len(data))
     return data
 
-def get_memory_by_id(mem_id: str):
-    res = supabase.table("memories").select("*").eq("id", mem_id).limit(1).execute()
+async def lexical_search_memories(query_text: str, k: int = 5, filters: Optional[SearchFilters] = None):
+    """
+    Full-text top-k: BM25 over the local index when search_backend="local",
+    else the match_memories_lexical RPC (tsvector + GIN). No embedding needed.
+    Rows carry a "rank" score instead of "similarity".
+    """
+    if filters is not None and filters.is_empty():
+        filters = None
+    index = get_local_index()
+    if index is not None:
+        return index.lexical_search(query_text, k=k, filters=filters)
+    supabase = await get_supabase()
+    with span("supabase", "match_memories_lexical"):
+        resp = await supabase.rpc(
+            "match_memories_lexical",
+            {
+                "query_text": query_text,
+                "match_count": k,
+                "exclude_ids": (filters.exclude_ids or None) if filters else None,
+                "filter_status": filters.status if filters else None,
+                "filter_metadata": filters.metadata if filters else None,
+                "created_after": filters.created_after.isoformat() if filters and filters.created_after else None,
+                "created_before": filters.created_before.isoformat() if filters and filters.created_before else None,
+            },
+        ).execute()
+    return resp.data or []
+
+def reciprocal_rank_fusion(ranked_lists: list[list[dict]], k: int, rrf_k: int = 60) -> list[dict]:
+    """
+    Merge ranked result lists by RRF: score(d) = sum over lists of 1 / (rrf_k + rank).
+    Rows keep the fields of their first occurrence plus "similarity"/"rank" from
+    whichever list had them, and the fused "score".
+    """
+    fused: dict[str, dict] = {}
+    for results in ranked_lists:
+        for pos, row in enumerate(results, start=1):
+            out = fused.setdefault(row["id"], {**row, "similarity": None, "rank": None, "score": 0.0})
+            for key in ("similarity", "rank"):
+                if row.get(key) is not None:
+                    out[key] = row[key]
+            out["score"] += 1.0 / (rrf_k + pos)
+    return sorted(fused.values(), key=lambda r: r["score"], reverse=True)[:k]
+
+async def get_memory_embedding(mem_id: str):
+    """Just the embedding of one memory (from the local index when it's loaded)."""
+    index = get_local_index()
+    if index is not None:
+        return index.vector(mem_id)
+    supabase = await get_supabase()
+    with span("supabase", "get_memory_embedding"):
+        res = await supabase.table("memories").select("embedding").eq("id", mem_id).limit(1).execute()
     if res.data:
-        return res.data[0]
-    return None
\ No newline at end of file
+        return res.data[0]["embedding"]
+    return None
+
+def _decode_row(row: dict) -> dict:
+    # pgvector columns come back as their text literal
+    if isinstance(row.get("embedding"), str):
+        row["embedding"] = json.loads(row["embedding"])
+    return row
+
+@timed("supabase")
+async def get_memory_by_id(mem_id: str, include_embedding: bool = False):
+    supabase = await get_supabase()
+    columns = MEMORY_COLUMNS + (", embedding" if include_embedding else "")
+    res = await supabase.table("memories").select(columns).eq("id", mem_id).limit(1).execute()
+    if not res.data:
+        return None
+    return _decode_row(res.data[0])
+
+def canonical_id(value: str) -> Optional[str]:
+    """The lowercase hyphenated form rows are keyed by, or None when not a UUID."""
+    try:
+        return str(uuid.UUID(value))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+@timed("supabase")
+async def get_memories_by_ids(ids: list[str], fields: Optional[list[str]] = None) -> dict[str, dict]:
+    """
+    Rows for many ids in one IN query per IN_CHUNK ids (at most IN_CONCURRENCY
+    chunks in flight),
+    keyed by canonical id (see canonical_id). `fields` is a projection over
+    MEMORY_FIELDS (default: MEMORY_COLUMNS); the id is always included. Ids that
+    are missing or not UUIDs are simply absent.
+    """
+    if fields:
+        unknown = [f for f in fields if f not in MEMORY_FIELDS]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}")
+        columns = ", ".join(dict.fromkeys(["id", *fields]))
+    else:
+        columns = MEMORY_COLUMNS
+    # a malformed uuid would fail the whole IN filter
+    ids = [i for i in dict.fromkeys(map(canonical_id, ids)) if i is not None]
+    if not ids:
+        return {}
+
+    supabase = await get_supabase()
+    chunks = [ids[i:i + IN_CHUNK] for i in range(0, len(ids), IN_CHUNK)]
+    sem = asyncio.Semaphore(IN_CONCURRENCY)
+
+    async def fetch(chunk):
+        async with sem:
+            return await supabase.table("memories").select(columns).in_("id", chunk).execute()
+
+    results = await asyncio.gather(*(fetch(chunk) for chunk in chunks))
+    return {row["id"]: _decode_row(row) for res in results for row in res.data or []}
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from app.config import Lazy, settings
+from app.services.db import claim_pending_embeddings, retry_embeddings, set_embeddings
+from app.services.embeddings import get_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingWorker:
+    """
+    Fills embeddings for rows stored with embedding_status='pending'.
+
+    `workers` loops each lease a batch of pending rows, embed it (through the
+    shared batcher, cache and rate limiter) and write the vectors back in one
+    UPDATE. A row whose embedding fails becomes claimable again after an
+    exponential backoff without holding back the rest of its batch; rows that
+    fail `max_attempts` times are marked 'failed'.
+    """
+
+    def __init__(self, workers: int = 2, batch_size: int = 64, poll_interval_s: float = 1.0,
+                 lease_s: int = 120, max_attempts: int = 8, max_backoff_s: float = 600.0):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval_s = poll_interval_s
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.max_backoff_s = max_backoff_s
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self.embedded = 0
+        self.failed_batches = 0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        self._wake.set()
+
+    async def drain_once(self) -> int:
+        rows = await claim_pending_embeddings(self.batch_size, self.lease_s)
+        if not rows:
+            return 0
+        # per text, so one rejected input fails only its own row
+        results = await asyncio.gather(*(get_embeddings([r["content"]]) for r in rows), return_exceptions=True)
+        done = [(r, res[0]) for r, res in zip(rows, results) if not isinstance(res, BaseException)]
+        failed = [(r, res) for r, res in zip(rows, results) if isinstance(res, BaseException)]
+        try:
+            if done:
+                await set_embeddings([r for r, _ in done], [v for _, v in done])
+        except Exception as e:
+            failed += [(r, e) for r, _ in done]
+            done = []
+        if failed:
+            self.failed_batches += 1
+            self.last_error = repr(failed[0][1])
+            await self._retry(failed)
+        self.embedded += len(done)
+        return len(rows)
+
+    async def _retry(self, failed):
+        """Back off each row by its own attempt count; out of attempts means 'failed'."""
+        groups: Dict[tuple, list] = {}
+        for r, e in failed:
+            groups.setdefault((r["embedding_attempts"], repr(e)), []).append(r["id"])
+        await asyncio.gather(*(
+            retry_embeddings(
+                ids, error,
+                delay_s=min(self.max_backoff_s, 2.0 ** attempts),
+                failed=attempts >= self.max_attempts,
+            )
+            for (attempts, error), ids in groups.items()
+        ))
+
+    async def _run(self):
+        while True:
+            try:
+                n = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("embedding queue drain failed: %r", e)
+                self.last_error = repr(e)
+                n = 0
+            if n < self.batch_size:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval_s)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "embedded": self.embedded,
+            "failed_batches": self.failed_batches,
+            "last_error": self.last_error,
+        }
+
+
+worker = Lazy(lambda: EmbeddingWorker(
+    workers=settings.embedding_workers,
+    batch_size=settings.embedding_queue_batch,
+    poll_interval_s=settings.embedding_queue_poll_s,
+    lease_s=settings.embedding_queue_lease_s,
+    max_attempts=settings.embedding_max_attempts,
+))
@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(backend: str, model: str, dim: int, text: str) -> str:
+    return hashlib.sha256(f"{backend}\x00{model}\x00{dim}\x00{normalize_text(text)}".encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache: in-process LRU with TTL, optionally
+    backed by a SQLite file that survives restarts. Both tiers hold vectors as
+    float32 (array("f"), ~6 KB per 1536-d vector rather than ~50 KB as a list
+    of Python floats); get() hands back a list.
+    Keys come from cache_key(), so changing the backend, model or dimension
+    never serves stale vectors.
+
+    The SQLite tier is read in a worker thread, and writes are buffered and
+    committed in batches off the event loop. Expired rows are purged and the
+    file is capped at `disk_max_entries` rows (oldest first).
+    """
+
+    FLUSH_ROWS = 256
+    FLUSH_INTERVAL_S = 0.5
+    PURGE_INTERVAL_S = 60.0
+
+    def __init__(self, max_entries: int = 10_000, ttl_s: float = 86_400.0, path: str | None = None,
+                 disk_max_entries: int = 1_000_000):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.disk_max_entries = disk_max_entries
+        self._mem: OrderedDict[str, tuple[float, array]] = OrderedDict()
+        self._lock = threading.Lock()     # memory tier and counters
+        self._db_lock = threading.Lock()  # the sqlite connection
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.purged = 0
+
+        self._writes: list[tuple[str, float, bytes]] = []
+        self._flush_task: asyncio.Task | None = None
+        self._purged_at = 0.0
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, created_at REAL NOT NULL, vec BLOB NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)")
+            self._db.commit()
+
+    def _get_mem(self, key: str, now: float) -> array | None:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                created_at, vec = entry
+                if now - created_at <= self.ttl_s:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return vec
+                del self._mem[key]
+            return None
+
+    async def get(self, key: str) -> list[float] | None:
+        now = time.time()
+        vec = self._get_mem(key, now)
+        if vec is not None:
+            return vec.tolist()
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._read, key)
+            if row and now - row[0] <= self.ttl_s:
+                vec = array("f")
+                vec.frombytes(row[1])
+                with self._lock:
+                    self._remember(key, row[0], vec)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return vec.tolist()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, vec: list[float]):
+        now = time.time()
+        packed = array("f", vec)
+        with self._lock:
+            self._remember(key, now, packed)
+        if self._db is None:
+            return
+        self._writes.append((key, now, packed.tobytes()))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        deadline = time.monotonic() + self.FLUSH_INTERVAL_S
+        while len(self._writes) < self.FLUSH_ROWS and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await self.flush()
+
+    async def flush(self):
+        """Commit the buffered writes (and purge, at most every PURGE_INTERVAL_S)."""
+        while self._writes and self._db is not None:
+            rows, self._writes = self._writes, []
+            await asyncio.to_thread(self._write, rows)
+
+    def _read(self, key: str):
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT created_at, vec FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _write(self, rows):
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, created_at, vec) VALUES (?, ?, ?)", rows
+            )
+            now = time.time()
+            if now - self._purged_at >= self.PURGE_INTERVAL_S:
+                self._purged_at = now
+                expired = self._db.execute(
+                    "DELETE FROM embeddings WHERE created_at < ?", (now - self.ttl_s,)
+                ).rowcount
+                over = self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    " SELECT key FROM embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_max_entries,),
+                ).rowcount
+                self.purged += expired + over
+            self._db.commit()
+
+    def _remember(self, key, created_at, vec):
+        if self.max_entries <= 0:
+            return
+        self._mem[key] = (created_at, vec)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "persistent": self._db is not None,
+            "pending_writes": len(self._writes),
+            "disk_purged": self.purged,
+        }
+
+    async def aclose(self):
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
@@ -1,29 +1,380 @@
 import asyncio
+import hashlib
+import math
+import re
+import time
 import httpx
 from fastapi import HTTPException
-from app.config import settings
+from app.config import Lazy, settings
+from app.services.embedding_cache import EmbeddingCache, cache_key
+from app.services.metrics import span
 
-OPENAI_URL = "https://api.openai.com/v1/embeddings"
+_WORD_RE = re.compile(r"\w+")
 
-async def get_embedding(text: str) -> list[float]:
-    #print("[EMB] start call to OpenAI")
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        for attempt in range(3):
-            #print(f"[EMB] attempt {attempt+1}")
-            resp = await client.post(
-                OPENAI_URL,
-                headers={"Authorization": f"Bearer {settings.openai_api_key}"},
-                json={"input": text, "model": settings.embedding_model},
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English BPE; good enough for batch sizing
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """
+    Allows `rate` units per second with bursts up to `capacity`. Waiters are
+    served in arrival order; a request larger than the capacity waits for a
+    full bucket instead of forever.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited_s = 0.0
+
+    async def acquire(self, n: float = 1.0):
+        n = min(n, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                wait = (n - self._tokens) / self.rate
+                self.waited_s += wait
+                await asyncio.sleep(wait)
+
+
+class RateLimiter:
+    """Process-wide requests/minute and tokens/minute budget for the embeddings API (0 = unlimited)."""
+
+    def __init__(self, rpm: int = 0, tpm: int = 0, burst_s: float = 10.0):
+        # bursts of up to burst_s worth of budget, like the API's own rolling window
+        self.requests = TokenBucket(rpm / 60.0, max(1.0, rpm / 60.0 * burst_s)) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm / 60.0, max(1.0, tpm / 60.0 * burst_s)) if tpm > 0 else None
+
+    async def acquire(self, tokens: int):
+        if self.requests is not None:
+            await self.requests.acquire(1)
+        if self.tokens is not None:
+            await self.tokens.acquire(tokens)
+
+    def stats(self) -> dict:
+        return {
+            "rate_limit_wait_s": sum(b.waited_s for b in (self.requests, self.tokens) if b is not None),
+        }
+
+
+rate_limiter = Lazy(lambda: RateLimiter(settings.embedding_rate_limit_rpm, settings.embedding_rate_limit_tpm))
+
+
+class OpenAIEmbeddingBackend:
+    """
+    Calls the OpenAI embeddings API with a list of inputs.
+    One long-lived pooled client is shared by every request.
+    """
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self._client: httpx.AsyncClient | None = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=15.0,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
             )
-            #print("[EMB] status:", resp.status_code)
+        return self._client
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        client = self._get_client()
+        tokens = sum(estimate_tokens(t) for t in texts)
+        for attempt in range(3):
+            await rate_limiter.acquire(tokens)
+            with span("openai", "embeddings"):
+                resp = await client.post(
+                    f"{settings.openai_base_url.rstrip('/')}/embeddings",
+                    headers={"Authorization": f"Bearer {settings.openai_api_key}"},
+                    json={"input": texts, "model": settings.embedding_model},
+                )
             if resp.status_code == 429 and attempt < 2:
-                await asyncio.sleep(1.5 * (attempt + 1))
+                try:
+                    delay = float(resp.headers.get("retry-after", ""))
+                except ValueError:
+                    delay = 1.5 * (attempt + 1)
+                await asyncio.sleep(delay)
                 continue
             if resp.status_code == 429:
                 raise HTTPException(503, "OpenAI still rate limiting after retries")
             resp.raise_for_status()
-            data = resp.json()
-            #print("[EMB] got embedding len", len(data["data"][0]["embedding"]))
-            return data["data"][0]["embedding"]
+            data = resp.json()["data"]
+            # the API may return items out of order; "index" maps back to the input
+            data.sort(key=lambda d: d["index"])
+            return [d["embedding"] for d in data]
+
+        raise HTTPException(503, "OpenAI embedding failed unexpectedly")
+
+    async def warmup(self):
+        """Open one pooled connection (DNS, TLS) ahead of the first embedding request."""
+        await self._get_client().get(
+            f"{settings.openai_base_url.rstrip('/')}/models",
+            headers={"Authorization": f"Bearer {settings.openai_api_key}"},
+        )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def fake_embedding(text: str, dim: int) -> list[float]:
+    """
+    Deterministic bag-of-words embedding (feature hashing).
+    Texts sharing words get a positive cosine similarity, like a real model would.
+    """
+    vec = [0.0] * dim
+    for word in _WORD_RE.findall(text.lower()):
+        h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec))
+    if norm == 0.0:
+        vec[0] = norm = 1.0
+    return [v / norm for v in vec]
+
+
+class FakeEmbeddingBackend:
+    """
+    Local embedding backend for offline benchmarks and development.
+    `latency_s` simulates one network round trip per call, independent of batch size.
+    """
+
+    def __init__(self, dim: int, latency_s: float = 0.0):
+        self.dim = dim
+        self.latency_s = latency_s
+        self.calls = 0
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return [fake_embedding(t, self.dim) for t in texts]
+
+    async def warmup(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+def make_backend(name: str | None = None):
+    name = name or settings.embedding_backend
+    if name == "fake":
+        return FakeEmbeddingBackend(
+            settings.embedding_dim,
+            latency_s=settings.embedding_fake_latency_ms / 1000.0,
+        )
+    if name == "openai":
+        return OpenAIEmbeddingBackend(settings.embedding_max_concurrency)
+    raise ValueError(f"unknown embedding backend: {name}")
+
+
+def _input_error(e: Exception) -> bool:
+    """A 4xx other than 429 blames the inputs; outages and rate limits fail the whole batch."""
+    if not isinstance(e, httpx.HTTPStatusError):
+        return False
+    status = e.response.status_code
+    return 400 <= status < 500 and status != 429
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text requests into multi-input backend calls.
+
+    A batch is flushed when it reaches `max_batch_size` texts or `max_batch_tokens`
+    estimated tokens, or when `window_s` has passed since its first text arrived.
+    At most `max_concurrency` backend calls are in flight at once.
+    """
+
+    def __init__(
+        self,
+        backend,
+        max_batch_size: int = 64,
+        max_batch_tokens: int = 100_000,
+        window_s: float = 0.01,
+        max_concurrency: int = 4,
+    ):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.window_s = window_s
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._loop = asyncio.get_running_loop()
+        self._pending: list[tuple[str, int, asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> list[float]:
+        fut = self._loop.create_future()
+        tokens = estimate_tokens(text)
+        self._pending.append((text, tokens, fut))
+        self._pending_tokens += tokens
+
+        if len(self._pending) >= self.max_batch_size or self._pending_tokens >= self.max_batch_tokens:
+            self._flush()
+        elif self._timer is None:
+            self._timer = self._loop.call_later(self.window_s, self._flush)
+        return await fut
+
+    async def embed_many(self, texts: list[str]) -> list[list[float]]:
+        return list(await asyncio.gather(*(self.embed(t) for t in texts)))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending, self._pending, self._pending_tokens = self._pending, [], 0
+        batch, batch_tokens = [], 0
+        for item in pending:
+            _, tokens, fut = item
+            if fut.done():  # caller went away
+                continue
+            if batch and (len(batch) >= self.max_batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                self._spawn(batch)
+                batch, batch_tokens = [], 0
+            batch.append(item)
+            batch_tokens += tokens
+        if batch:
+            self._spawn(batch)
+
+    def _spawn(self, batch):
+        task = self._loop.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        async with self._sem:
+            await self._embed_batch(batch)
+
+    async def _embed_batch(self, batch):
+        """
+        Embed one batch; when the API rejects its inputs, bisect so that only
+        the offending text fails and the callers batched with it still succeed.
+        """
+        try:
+            vectors = await self.backend.embed([text for text, _, _ in batch])
+        except Exception as e:
+            if len(batch) > 1 and _input_error(e):
+                mid = len(batch) // 2
+                await self._embed_batch(batch[:mid])
+                await self._embed_batch(batch[mid:])
+                return
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, _, fut), vec in zip(batch, vectors):
+            if not fut.done():
+                fut.set_result(vec)
+
+    async def aclose(self):
+        if self._pending:
+            self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.backend.aclose()
+
+
+_batcher: EmbeddingBatcher | None = None
+
+
+def get_batcher() -> EmbeddingBatcher:
+    global _batcher
+    loop = asyncio.get_running_loop()
+    if _batcher is None or _batcher._loop is not loop:
+        _batcher = EmbeddingBatcher(
+            make_backend(),
+            max_batch_size=settings.embedding_batch_size,
+            max_batch_tokens=settings.embedding_batch_max_tokens,
+            window_s=settings.embedding_batch_window_ms / 1000.0,
+            max_concurrency=settings.embedding_max_concurrency,
+        )
+    return _batcher
+
+
+# opens the sqlite file (embedding_cache_path) on first use
+_cache = Lazy(lambda: EmbeddingCache(
+    max_entries=settings.embedding_cache_size,
+    ttl_s=settings.embedding_cache_ttl_s,
+    path=settings.embedding_cache_path,
+    disk_max_entries=settings.embedding_cache_disk_max_entries,
+))
+# identical texts embedded concurrently share one backend request
+_inflight: dict[str, asyncio.Future] = {}
+_coalesced = 0
+
+
+def cache_stats() -> dict:
+    return {**_cache.stats(), "coalesced": _coalesced, "inflight": len(_inflight), **rate_limiter.stats()}
+
+
+async def get_embedding(text: str) -> list[float]:
+    key = cache_key(settings.embedding_backend, settings.embedding_model, settings.embedding_dim, text)
+    vec = await _cache.get(key)
+    if vec is not None:
+        return vec
+
+    global _coalesced
+    fut = _inflight.get(key)
+    if fut is not None:
+        _coalesced += 1
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            if fut.cancelled():  # the request that owned the call went away
+                return await get_embedding(text)
+            raise
+
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
+    try:
+        vec = await get_batcher().embed(text)
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except Exception as e:
+        fut.set_exception(e)
+        fut.exception()  # mark retrieved when nobody else was waiting
+        raise
+    else:
+        _cache.put(key, vec)
+        fut.set_result(vec)
+        return vec
+    finally:
+        _inflight.pop(key, None)
+
+
+async def get_embeddings(texts: list[str]) -> list[list[float]]:
+    return list(await asyncio.gather(*(get_embedding(t) for t in texts)))
+
+
+async def warm_embeddings():
+    """Create the batcher and backend client, and load the embedding cache."""
+    _cache.resolve()
+    await get_batcher().backend.warmup()
+
 
-    raise HTTPException(503, "OpenAI embedding failed unexpectedly")
\ No newline at end of file
+async def close_embeddings():
+    global _batcher
+    if _batcher is not None:
+        await _batcher.aclose()
+        _batcher = None
+    if _cache.resolved:
+        await _cache.aclose()
+        _cache.reset()
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from app.config import Lazy, settings
+
+
+class Subscriber:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+
+class Broadcaster:
+    """
+    In-process fan-out of change events.
+
+    Every event gets an increasing sequence id and is kept in a bounded ring
+    buffer, so a reconnecting client can resume from its last event id. Each
+    subscriber has a bounded queue; publish never blocks a write. A subscriber
+    that falls a full queue behind is cut off with a `reset` event and has to
+    re-fetch a snapshot (e.g. /timeline) before resuming.
+
+    Ids start at the process start time in microseconds rather than at 1, so
+    they keep increasing across restarts: a Last-Event-ID from before a restart
+    is older than the buffer and gets a `reset` instead of a silent gap.
+    """
+
+    def __init__(self, buffer_size: int = 1000, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._subscribers: Set[Subscriber] = set()
+        self._seq = time.time_ns() // 1000
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    @property
+    def last_id(self) -> int:
+        return self._seq
+
+    def publish(self, type_: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        self._seq += 1
+        event = {
+            "id": self._seq,
+            "type": type_,
+            "at": datetime.now(timezone.utc).isoformat(),
+            "data": data,
+        }
+        self._buffer.append(event)
+        self.published += 1
+        for sub in list(self._subscribers):
+            if sub.overflowed:
+                continue
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._cut_off(sub)
+        return event
+
+    def _cut_off(self, sub: Subscriber):
+        sub.overflowed = True
+        self.dropped_subscribers += 1
+        # make room for the reset marker so the consumer sees why it stopped
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait({"id": self._seq, "type": "reset", "data": {"reason": "slow consumer"}})
+
+    def _replay(self, last_event_id: Optional[int]):
+        """Buffered events after last_event_id, or None if the gap is no longer buffered."""
+        if last_event_id is None or last_event_id == self._seq:
+            return []
+        if last_event_id > self._seq:  # an id this process never issued
+            return None
+        oldest = self._buffer[0]["id"] if self._buffer else self._seq + 1
+        if last_event_id < oldest - 1:
+            return None
+        return [e for e in self._buffer if e["id"] > last_event_id]
+
+    async def subscribe(self, last_event_id: Optional[int] = None, heartbeat_s: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Yields events in order, replaying from last_event_id first. Yields None
+        after `heartbeat_s` without events so the caller can send a keep-alive.
+        """
+        sub = Subscriber(self.queue_size)
+        # register before replaying: both run without an await in between, so
+        # nothing published in the meantime can be missed or duplicated
+        self._subscribers.add(sub)
+        try:
+            replay = self._replay(last_event_id)
+            if replay is None:
+                yield {"id": self._seq, "type": "reset", "data": {"reason": "history not available"}}
+            else:
+                for event in replay:
+                    yield event
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), heartbeat_s)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["type"] == "reset":
+                    return
+        finally:
+            self._subscribers.discard(sub)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "last_id": self._seq,
+            "buffered": len(self._buffer),
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+def format_sse(event: Optional[Dict[str, Any]]) -> str:
+    if event is None:
+        return ": ping\n\n"
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+broadcaster = Lazy(lambda: Broadcaster(settings.events_buffer_size, settings.events_queue_size))
+
+
+def publish(type_: str, **data) -> Dict[str, Any]:
+    return broadcaster.publish(type_, data)
@@ -1,42 +1,182 @@
-from neo4j import GraphDatabase
-from app.config import settings
+import asyncio
+import logging
+from app.config import Lazy, settings
+from app.services.subgraph_cache import SubgraphCache
+from app.services.metrics import timed
+from app.services.schema import check_schema, ensure_schema
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 
-driver = GraphDatabase.driver(
-    settings.neo4j_uri,
-    auth=(settings.neo4j_user, settings.neo4j_password)
-)
+logger = logging.getLogger(__name__)
 
 
-def verify_connection():
-    """Verify Neo4j database connectivity."""
+def _connect():
+    from neo4j import AsyncGraphDatabase  # a large import; only needed once a query runs
+
+    return AsyncGraphDatabase.driver(
+        settings.neo4j_uri,
+        auth=(settings.neo4j_user, settings.neo4j_password)
+    )
+
+
+# the driver (and its connection pool) is created on first use
+driver = Lazy(_connect)
+
+# per-seed expansions; every write below touches the nodes it changes
+subgraph_cache = Lazy(lambda: SubgraphCache(settings.subgraph_cache_max_cost, settings.subgraph_cache_ttl_s))
+
+
+async def close_driver():
+    if driver.resolved:
+        await driver.close()
+        driver.reset()
+
+
+@timed("neo4j")
+async def verify_connection() -> Dict[str, Any]:
+    """Verify Neo4j connectivity and that the constraints/indexes in schema.py exist."""
     try:
-        driver.verify_connectivity()
-        return True
+        await driver.verify_connectivity()
+        schema = await check_schema(driver)
     except Exception as e:
-        print(f"Failed to connect to Neo4j: {e}")
-        return (settings.neo4j_uri,settings.neo4j_user, settings.neo4j_password, str(e))
+        logger.warning("neo4j unreachable uri=%s error=%r", settings.neo4j_uri, e)
+        return {"connected": False, "uri": settings.neo4j_uri, "error": str(e)}
+    return {"connected": True, "uri": settings.neo4j_uri, **schema}
 
 
-def create_memory_node(mem_id: str, content: str, version: int = 1, status: str = "active"):
-    with driver.session() as session:
-        session.run(
-            """
-            MERGE (m:Memory {id: $id})
+@timed("neo4j")
+async def bootstrap_schema() -> Dict[str, Any]:
+    return await ensure_schema(driver)
+
+
+# ---------- event log (backs the global timeline) ----------
+# Node creates and relationship writes append an :Event in the same statement.
+# Every event carries one timestamp, `at` (edges use r.at too), and a
+# deterministic id, so replayed writes don't duplicate events.
+def _create_event(m: str) -> str:
+    return f"""
+    MERGE (ev_{m}:Event {{id: 'CREATE:' + {m}.id}})
+      ON CREATE SET ev_{m}.at = {m}.created_at, ev_{m}.op = 'CREATE', ev_{m}.memory_id = {m}.id
+    """
+
+
+def _edge_event(a: str, r: str, b: str) -> str:
+    return f"""
+    MERGE (ev_{r}:Event {{id: type({r}) + ':' + {a}.id + ':' + {b}.id}})
+      ON CREATE SET ev_{r}.at = {r}.at, ev_{r}.op = type({r}), ev_{r}.memory_id = {a}.id,
+                    ev_{r}.from_id = {a}.id, ev_{r}.to_id = {b}.id
+    """
+
+
+# ---------- version-chain pointers ----------
+# Every version in an UPDATE chain carries root_id (the chain's first version),
+# and the root carries head_id (the latest version), so the head of any version
+# is two id lookups. Writes that add an UPDATE edge advance the pointers in the
+# same statement; merges can leave them stale, which fetch_head detects.
+def _advance_head(old: str, new: str) -> str:
+    return f"""
+    SET {old}.root_id = coalesce({old}.root_id, {old}.id),
+        {new}.root_id = coalesce({old}.root_id, {old}.id)
+    WITH *
+    OPTIONAL MATCH (chain_root:Memory {{id: {new}.root_id}})
+    FOREACH (_ IN CASE WHEN chain_root IS NULL THEN [] ELSE [1] END |
+      SET chain_root.head_id = {new}.id)
+    """
+
+
+@timed("neo4j")
+async def create_memory_node(mem_id: str, content: str, version: int = 1, status: str = "active"):
+    async with driver.session() as session:
+        await session.run(
+            f"""
+            MERGE (m:Memory {{id: $id}})
             SET m.content = $content,
                 m.version = $version,
                 m.status = $status,
-                m.created_at = datetime()
+                m.created_at = coalesce(m.created_at, datetime())
+            {_create_event("m")}
             """,
             id=mem_id,
             content=content,
             version=version,
             status=status,
         )
-    
-def create_relationship(source_id: str, target_id: str, rel_type: str):
+    subgraph_cache.touch([mem_id])
+
+
+@timed("neo4j")
+async def create_memory_nodes_bulk(rows: list[dict]):
+    """
+    rows: [{"id": ..., "content": ...}] -- one UNWIND write for the whole batch.
+    A null content keeps the node's current content (MERGE by id only).
+    """
+    async with driver.session() as session:
+        await session.run(
+            f"""
+            UNWIND $rows AS row
+            MERGE (m:Memory {{id: row.id}})
+              ON CREATE SET m.version = 1, m.status = 'active'
+            SET m.content = coalesce(row.content, m.content),
+                m.created_at = coalesce(m.created_at, datetime())
+            {_create_event("m")}
+            """,
+            rows=rows,
+        )
+    subgraph_cache.touch(r["id"] for r in rows)
+
+
+@timed("neo4j")
+async def create_links_batch(edges: list[dict]) -> List[Dict[str, Any]]:
+    """
+    edges: [{"from": id, "to": id, "type": "EXTEND" | "DERIVE" | "UPDATE"}]
+    Relationship types can't be parameters, so edges are grouped by type and
+    each group is written with one UNWIND statement, all in a single transaction.
+    Returns one result per edge, in input order; an edge whose endpoint doesn't
+    exist is reported as failed rather than dropped.
+    """
+    by_type: Dict[str, List[Dict[str, Any]]] = {}
+    for i, e in enumerate(edges):
+        by_type.setdefault(e["type"], []).append({"i": i, "from": e["from"], "to": e["to"]})
+
+    async def work(tx):
+        found = {}
+        for rel_type, group in by_type.items():
+            result = await tx.run(
+                f"""
+                UNWIND $edges AS e
+                OPTIONAL MATCH (a:Memory {{id: e.from}})
+                OPTIONAL MATCH (b:Memory {{id: e.to}})
+                FOREACH (_ IN CASE WHEN a IS NOT NULL AND b IS NOT NULL THEN [1] ELSE [] END |
+                  MERGE (a)-[r:{rel_type}]->(b)
+                    ON CREATE SET r.at = datetime()
+                  {_edge_event("a", "r", "b")})
+                RETURN e.i AS i, a IS NOT NULL AS from_found, b IS NOT NULL AS to_found
+                """,
+                edges=group,
+            )
+            async for r in result:
+                found[r["i"]] = (r["from_found"], r["to_found"])
+        return found
+
+    if not edges:
+        return []
+    async with driver.session() as session:
+        found = await session.execute_write(work)
+
+    results = []
+    for i, e in enumerate(edges):
+        out = {"from": e["from"], "to": e["to"], "type": e["type"], "ok": True}
+        from_found, to_found = found.get(i, (False, False))
+        if not (from_found and to_found):
+            missing = [id_ for id_, ok in ((e["from"], from_found), (e["to"], to_found)) if not ok]
+            out.update(ok=False, error=f"memory not found: {', '.join(missing)}")
+        results.append(out)
+    subgraph_cache.touch(id_ for r in results if r["ok"] for id_ in (r["from"], r["to"]))
+    return results
+
+@timed("neo4j")
+async def create_relationship(source_id: str, target_id: str, rel_type: str):
     """
     rel_type: "UPDATE" | "EXTEND" | "DERIVE"
     """
@@ -44,103 +184,243 @@ def create_relationship(source_id: str, target_id: str, rel_type: str):
     MATCH (a:Memory {{id: $source_id}}),
           (b:Memory {{id: $target_id}})
     MERGE (a)-[r:{rel_type}]->(b)
-    SET r.created_at = datetime()
+    SET r.at = coalesce(r.at, datetime())
+    {_edge_event("a", "r", "b")}
+    {_advance_head("a", "b") if rel_type == "UPDATE" else ""}
     """
     try:
-        with driver.session() as session:
-            session.run(
+        async with driver.session() as session:
+            await session.run(
                 cypher,
                 source_id=source_id,
                 target_id=target_id,
             )
-        print(f"[NEO4J] created {rel_type} between {source_id} -> {target_id}")
+        subgraph_cache.touch([source_id, target_id])
+        logger.debug("created %s %s -> %s", rel_type, source_id, target_id)
     except Exception as e:
-        print(f"[NEO4J ERROR create_relationship {rel_type}]", repr(e))
+        logger.error("create_relationship %s %s -> %s failed: %r", rel_type, source_id, target_id, e)
 
-def expand_memory_subgraph(memory_ids: list[str], depth: int = 2):
-    if not memory_ids:
-        print("[NEO4J expand] empty id list")
-        return {}
+def _node_projection(var: str, include_content: bool) -> str:
+    fields = ".id, .status, .version" + (", .content" if include_content else "")
+    return f"{var} {{{fields}}}"
 
-    # build the variable-length pattern
-    rel_pattern = f"[r:UPDATE|EXTEND|DERIVE*1..{depth}]"
 
-    query = f"""
-    MATCH (m:Memory)
-    WHERE m.id IN $ids
-    OPTIONAL MATCH p = (m)-{rel_pattern}-(n:Memory)
-    WITH collect(DISTINCT m) + collect(DISTINCT n) AS nodes,
-         [path IN collect(p) WHERE path IS NOT NULL] AS paths
-    WITH nodes,
-         reduce(allrels = [], path IN paths |
-                allrels + relationships(path)) AS rels
-    RETURN nodes, rels
+@timed("neo4j")
+async def _expand_bfs(memory_ids: list[str], depth: int, include_content: bool,
+                      max_nodes: int, max_edges: int) -> Dict[str, Any]:
     """
+    Bounded breadth-first expansion over UPDATE/EXTEND/DERIVE edges (either direction).
 
-    try:
-        print("[NEO4J expand] querying for ids:", memory_ids)
-        with driver.session() as session:
-            rec = session.run(query, ids=memory_ids).single()
-            if not rec:
-                print("[NEO4J expand] no record")
-                return {}
-
-            raw_nodes = rec["nodes"] or []
-            raw_rels = rec["rels"] or []
-            print(f"[NEO4J expand] got {len(raw_nodes)} raw nodes and {len(raw_rels)} rels")
-
-            
-            nodes = []
-            internal_to_uuid = {}
-            seen_node_uuids = set()  # Deduplicate nodes by UUID
-            for n in raw_nodes:
-                if not n:
-                    continue
-                uuid = n.get("id")
-                
-                # Skip if we've already processed this node
-                if uuid in seen_node_uuids:
-                    # Still map internal ID for relationship processing
-                    internal_to_uuid[n.id] = uuid
-                    continue
-                    
-                seen_node_uuids.add(uuid)
-                internal_to_uuid[n.id] = uuid
-                nodes.append({
-                    "id": uuid,
-                    "content": n.get("content"),
-                    "status": n.get("status"),
-                    "version": n.get("version"),
-                })
-
-            edges = []
-            seen_rel_ids = set()
-            for r in raw_rels:
-                if not r:
+    One query per BFS level, each touching only the edges incident to the current
+    frontier, so the cost is linear in the edges reached instead of the number of
+    paths. Returns distinct nodes and edges; `truncated` is set when max_nodes or
+    max_edges cut the expansion short.
+    """
+
+    seed_query = f"""
+    MATCH (m:Memory) WHERE m.id IN $ids
+    RETURN {_node_projection("m", include_content)} AS node
+    """
+    level_query = f"""
+    UNWIND $frontier AS fid
+    MATCH (a:Memory {{id: fid}})-[r:UPDATE|EXTEND|DERIVE]-(b:Memory)
+    RETURN elementId(r) AS rid, type(r) AS type,
+           startNode(r).id AS from_id, endNode(r).id AS to_id,
+           {_node_projection("b", include_content)} AS node
+    LIMIT $limit
+    """
+
+    async def work(tx):
+        nodes = {}
+        edges = {}
+        truncated = False
+
+        result = await tx.run(seed_query, ids=memory_ids)
+        async for rec in result:
+            nodes[rec["node"]["id"]] = rec["node"]
+        frontier = list(nodes)
+
+        for _ in range(depth):
+            if not frontier or truncated:
+                break
+            # one extra row tells us whether the edge cap cut this level short
+            limit = 2 * (max_edges - len(edges)) + 1
+            result = await tx.run(level_query, frontier=frontier, limit=limit)
+            rows = [rec async for rec in result]
+            if len(rows) >= limit:
+                truncated = True
+
+            next_frontier = []
+            for rec in rows:
+                node = rec["node"]
+                if node["id"] not in nodes:
+                    if len(nodes) >= max_nodes:
+                        truncated = True
+                        continue
+                    nodes[node["id"]] = node
+                    next_frontier.append(node["id"])
+                if rec["rid"] in edges:
                     continue
-                # Deduplicate by relationship ID (bidirectional match causes duplicates)
-                if r.id in seen_rel_ids:
+                if len(edges) >= max_edges:
+                    truncated = True
                     continue
-                seen_rel_ids.add(r.id)
-                
-                start_internal = r.start_node.id
-                end_internal = r.end_node.id
-                edges.append({
-                    "from": internal_to_uuid.get(start_internal, start_internal),
-                    "to": internal_to_uuid.get(end_internal, end_internal),
-                    "type": r.type,   # "EXTEND" / "UPDATE" / "DERIVE"
-                })
-
-            print(f"[NEO4J expand] returning {len(nodes)} unique nodes and {len(edges)} edges")
-            return {
-                "nodes": nodes or [],
-                "edges": edges or [],
-            }
+                edges[rec["rid"]] = {
+                    "from": rec["from_id"],
+                    "to": rec["to_id"],
+                    "type": rec["type"],   # "EXTEND" / "UPDATE" / "DERIVE"
+                }
+            frontier = next_frontier
+
+        return {
+            "nodes": list(nodes.values()),
+            "edges": list(edges.values()),
+            "truncated": truncated,
+        }
+
+    async with driver.session() as session:
+        return await session.execute_read(work)
+
+
+def merge_subgraphs(graphs: List[Dict[str, Any]], max_nodes: int | None = None,
+                    max_edges: int | None = None) -> Dict[str, Any]:
+    """
+    Union of expansion results; nodes by id, edges by (from, to, type).
+    Nodes are taken round-robin in each expansion's BFS order, so with a
+    `max_nodes` cap every seed keeps its nearest neighborhood, as a single
+    multi-seed BFS would. Edges are kept when both endpoints are.
+    """
+    nodes, edges = {}, {}
+    truncated = any(g.get("truncated", False) for g in graphs)
+    orders = [g.get("nodes", []) for g in graphs]
+    for i in range(max((len(order) for order in orders), default=0)):
+        for order in orders:
+            if i >= len(order) or order[i]["id"] in nodes:
+                continue
+            if max_nodes is not None and len(nodes) >= max_nodes:
+                truncated = True
+                continue
+            nodes[order[i]["id"]] = order[i]
+    for g in graphs:
+        for e in g.get("edges", []):
+            if e["from"] not in nodes or e["to"] not in nodes:
+                continue
+            key = (e["from"], e["to"], e["type"])
+            if key in edges:
+                continue
+            if max_edges is not None and len(edges) >= max_edges:
+                truncated = True
+                break
+            edges[key] = e
+    return {"nodes": list(nodes.values()), "edges": list(edges.values()), "truncated": truncated}
+
+
+async def expand_seed(seed_id: str, depth: int = 2, include_content: bool = True,
+                      max_nodes: int | None = None, max_edges: int | None = None) -> Dict[str, Any]:
+    """Expansion around one seed, served from subgraph_cache when still valid."""
+    # callers can only lower the configured caps
+    max_nodes = min(max_nodes or settings.graph_max_nodes, settings.graph_max_nodes)
+    max_edges = min(max_edges or settings.graph_max_edges, settings.graph_max_edges)
+    key = (seed_id, depth, include_content, max_nodes, max_edges)
+    g = subgraph_cache.get(key) if subgraph_cache.enabled else None
+    if g is None:
+        started_at = subgraph_cache.clock()
+        g = await _expand_bfs([seed_id], depth, include_content, max_nodes, max_edges)
+        subgraph_cache.put(key, g, seed_id, started_at)
+    return g
+
+
+async def expand_memory_subgraph(memory_ids: list[str], depth: int = 2, include_content: bool = True,
+                                 max_nodes: int | None = None, max_edges: int | None = None):
+    """
+    Distinct nodes and edges within `depth` hops of any of `memory_ids`.
+    With the subgraph cache on, each seed is expanded (or served) separately and
+    the neighborhoods are unioned, within the same max_nodes/max_edges as one
+    BFS; otherwise one BFS covers all seeds.
+    """
+    if not memory_ids:
+        logger.debug("expand: empty id list")
+        return {}
+    # callers can only lower the configured caps
+    max_nodes = min(max_nodes or settings.graph_max_nodes, settings.graph_max_nodes)
+    max_edges = min(max_edges or settings.graph_max_edges, settings.graph_max_edges)
+
+    try:
+        logger.debug("expand seeds=%d depth=%d", len(memory_ids), depth)
+        if subgraph_cache.enabled:
+            g = merge_subgraphs(await asyncio.gather(*(
+                expand_seed(seed, depth, include_content, max_nodes, max_edges)
+                for seed in dict.fromkeys(memory_ids)
+            )), max_nodes, max_edges)
+        else:
+            g = await _expand_bfs(memory_ids, depth, include_content, max_nodes, max_edges)
+        logger.debug("expand nodes=%d edges=%d truncated=%s", len(g["nodes"]), len(g["edges"]), g["truncated"])
+        return g
     except Exception as e:
-        print("[NEO4J expand ERROR]", repr(e))
+        logger.error("expand failed: %r", e)
         return {}
 
-def supersede_version(old_id: str, new_id: str, content: str) -> Dict[str, Any]:
+async def iter_seed_expansions(seeds: list[str], depth: int = 2, include_content: bool = True,
+                               max_nodes: int | None = None, max_edges: int | None = None,
+                               concurrency: int | None = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Per-seed expansions in seed (rank) order, as soon as each one and every
+    seed before it is ready. Seeds are expanded concurrently, at most
+    `concurrency` sessions at a time, through expand_seed (so the cache applies).
+
+    Yields one {"type": "seed"} message per seed: `nodes` are the nodes not sent
+    for an earlier seed, `refs` the ids of the ones that were, `edges` the seed's
+    whole neighborhood. A final {"type": "done"} message lists the nodes shared
+    by several seeds under `shared` (node id -> seeds).
+    """
+    seeds = list(dict.fromkeys(seeds))
+    sem = asyncio.Semaphore(concurrency or settings.expand_concurrency)
+
+    async def expand(seed_id: str) -> Dict[str, Any]:
+        async with sem:
+            return await expand_seed(seed_id, depth, include_content, max_nodes, max_edges)
+
+    tasks = [asyncio.create_task(expand(seed_id)) for seed_id in seeds]
+    sent: Dict[str, List[str]] = {}
+    try:
+        for rank, (seed_id, task) in enumerate(zip(seeds, tasks)):
+            try:
+                g = await task
+            except Exception as e:
+                logger.error("expand seed=%s failed: %r", seed_id, e)
+                yield {"type": "seed", "seed": seed_id, "rank": rank, "error": str(e)}
+                continue
+            nodes, refs = [], []
+            for node in g["nodes"]:
+                if node["id"] in sent:
+                    refs.append(node["id"])
+                    sent[node["id"]].append(seed_id)
+                else:
+                    nodes.append(node)
+                    sent[node["id"]] = [seed_id]
+            yield {
+                "type": "seed",
+                "seed": seed_id,
+                "rank": rank,
+                "found": any(n["id"] == seed_id for n in g["nodes"]),
+                "nodes": nodes,
+                "refs": refs,
+                "edges": g["edges"],
+                "truncated": g["truncated"],
+            }
+    finally:
+        # client gone (or done): don't keep expanding for nobody
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    yield {
+        "type": "done",
+        "seeds": len(seeds),
+        "nodes": len(sent),
+        "shared": {id_: ids for id_, ids in sent.items() if len(ids) > 1},
+    }
+
+@timed("neo4j")
+async def supersede_version(old_id: str, new_id: str, content: str) -> Dict[str, Any]:
     """
     - Marks old memory as 'outdated'
     - Creates (or updates) new memory with version = old.version + 1
@@ -148,12 +428,12 @@ def supersede_version(old_id: str, new_id: str, content: str) -> Dict[str, Any]:
     """
     now = datetime.utcnow().isoformat()
 
-    cypher = """
-    MATCH (old:Memory {id: $old_id})
+    cypher = f"""
+    MATCH (old:Memory {{id: $old_id}})
     SET   old.status = 'outdated'
     WITH old
 
-    MERGE (new:Memory {id: $new_id})
+    MERGE (new:Memory {{id: $new_id}})
       ON CREATE SET
         new.content    = $content,
         new.status     = 'active',
@@ -161,53 +441,63 @@ def supersede_version(old_id: str, new_id: str, content: str) -> Dict[str, Any]:
         new.created_at = datetime($now)
       ON MATCH SET
         new.content    = $content
+    {_create_event("new")}
 
     MERGE (old)-[r:UPDATE]->(new)
       ON CREATE SET r.at = datetime($now)
+    {_edge_event("old", "r", "new")}
+    {_advance_head("old", "new")}
 
     RETURN
-      old { .id, .status, .version } AS old,
-      new { .id, .status, .version, .content } AS new,
+      old {{ .id, .status, .version }} AS old,
+      new {{ .id, .status, .version, .content }} AS new,
       type(r) AS rel_type, r.at AS at
     """
-    with driver.session() as session:
-        rec = session.run(cypher, {
+    async with driver.session() as session:
+        result = await session.run(cypher, {
             "old_id": old_id,
             "new_id": new_id,
             "content": content,
             "now": now,
-        }).single()
+        })
+        rec = await result.single()
+    subgraph_cache.touch([old_id, new_id])
 
     return rec.data() if rec else {}
 
 
 # ---------- EXTEND (a -> b) ----------
-def create_extend(old_id: str, new_id: str) -> Dict[str, Any]:
+@timed("neo4j")
+async def create_extend(old_id: str, new_id: str) -> Dict[str, Any]:
     """
     Creates an :EXTEND edge old -> new (assumes nodes already exist).
     """
     now = datetime.utcnow().isoformat()
-    cypher = """
-    MATCH (a:Memory {id: $old_id}), (b:Memory {id: $new_id})
+    cypher = f"""
+    MATCH (a:Memory {{id: $old_id}}), (b:Memory {{id: $new_id}})
     MERGE (a)-[r:EXTEND]->(b)
       ON CREATE SET r.at = datetime($now)
+    {_edge_event("a", "r", "b")}
     RETURN type(r) AS rel_type, r.at AS at,
            startNode(r).id AS from_id, endNode(r).id AS to_id
     """
-    with driver.session() as session:
-        rec = session.run(cypher, {"old_id": old_id, "new_id": new_id, "now": now}).single()
+    async with driver.session() as session:
+        result = await session.run(cypher, {"old_id": old_id, "new_id": new_id, "now": now})
+        rec = await result.single()
+    subgraph_cache.touch([old_id, new_id])
     return rec.data() if rec else {}
 
 
 # ---------- DERIVE (base -> derived) ----------
-def create_derive(base_id: str, derived_id: str, content: str) -> Dict[str, Any]:
+@timed("neo4j")
+async def create_derive(base_id: str, derived_id: str, content: str) -> Dict[str, Any]:
     """
     Create a new derived node and connect with :DERIVE.
     """
     now = datetime.utcnow().isoformat()
-    cypher = """
-    MATCH (base:Memory {id: $base_id})
-    MERGE (d:Memory {id: $derived_id})
+    cypher = f"""
+    MATCH (base:Memory {{id: $base_id}})
+    MERGE (d:Memory {{id: $derived_id}})
       ON CREATE SET
         d.content    = $content,
         d.status     = 'active',
@@ -215,155 +505,355 @@ def create_derive(base_id: str, derived_id: str, content: str) -> Dict[str, Any]
         d.created_at = datetime($now)
       ON MATCH SET
         d.content    = $content
+    {_create_event("d")}
 
     MERGE (base)-[r:DERIVE]->(d)
       ON CREATE SET r.at = datetime($now)
+    {_edge_event("base", "r", "d")}
 
     RETURN
-      base { .id } AS base,
-      d    { .id, .status, .version, .content } AS derived,
+      base {{ .id }} AS base,
+      d    {{ .id, .status, .version, .content }} AS derived,
       type(r) AS rel_type, r.at AS at
     """
-    with driver.session() as session:
-        rec = session.run(cypher, {
+    async with driver.session() as session:
+        result = await session.run(cypher, {
             "base_id": base_id,
             "derived_id": derived_id,
             "content": content,
             "now": now
-        }).single()
+        })
+        rec = await result.single()
+    subgraph_cache.touch([base_id, derived_id])
     return rec.data() if rec else {}
 
 
 # ---------- LINEAGE (ordered edge hops from a root) ----------
-def fetch_lineage(root_id: str, max_hops: int = 8) -> List[Dict[str, Any]]:
+_LINEAGE_RELS = "UPDATE|EXTEND|DERIVE"
+
+
+def _lineage_branch(direction: str, max_hops: int) -> str:
+    # DISTINCT right after the variable-length match lets the planner expand
+    # each reachable node once (pruning BFS) instead of enumerating every path;
+    # the edges are then read off those nodes, so each one comes back once.
+    # Variable-length bounds can't be parameters.
+    hops = f"*0..{max(int(max_hops), 1) - 1}"
+    if direction == "descendants":
+        return f"""
+      WITH root
+      MATCH (root)-[:{_LINEAGE_RELS}{hops}]->(a:Memory)
+      WITH DISTINCT a
+      MATCH (a)-[rel:{_LINEAGE_RELS}]->(:Memory)
+      RETURN rel"""
+    return f"""
+      WITH root
+      MATCH (root)<-[:{_LINEAGE_RELS}{hops}]-(b:Memory)
+      WITH DISTINCT b
+      MATCH (:Memory)-[rel:{_LINEAGE_RELS}]->(b)
+      RETURN rel"""
+
+
+@timed("neo4j")
+async def fetch_lineage(root_id: str, max_hops: int = 8, direction: str = "descendants",
+                        limit: int = 100, after: Optional[str] = None) -> Dict[str, Any]:
     """
-    Returns chronologically ordered hops from `root_id`.
-    No APOC; flatten relationships with reduce(...).
+    One page of the edges within `max_hops` of `root_id`, oldest first.
+
+    direction: "descendants" follows edges out of the root, "ancestors" into it,
+    "both" does both. Each edge is returned once. Keyset pagination over
+    (at, op:from:to): `after` is the `next_cursor` of the previous page.
     """
+    directions = ["descendants", "ancestors"] if direction == "both" else [direction]
+    params: Dict[str, Any] = {"id": root_id, "limit": limit, "after_at": None, "after_key": None}
+    if after:
+        at, _, key = after.partition(",")
+        params.update(after_at=at, after_key=key)
+    branches = "\n      UNION".join(_lineage_branch(d, max_hops) for d in directions)
     cypher = f"""
     MATCH (root:Memory {{id: $id}})
-    OPTIONAL MATCH p = (root)-[r:UPDATE|EXTEND|DERIVE*1..{max_hops}]->(n:Memory)
-    WITH collect(p) AS paths
-    WITH reduce(all = [], p IN paths | all + relationships(p)) AS rels
-    UNWIND rels AS rel
+    CALL {{{branches}
+    }}
+    WITH rel,
+         coalesce(rel.at, datetime({{epochMillis: 0}})) AS sort_at,
+         type(rel) + ':' + startNode(rel).id + ':' + endNode(rel).id AS sort_key
+    WHERE $after_at IS NULL OR sort_at > datetime($after_at)
+       OR (sort_at = datetime($after_at) AND sort_key > $after_key)
+    WITH rel, sort_at, sort_key
+    ORDER BY sort_at, sort_key
+    LIMIT $limit
     RETURN
       type(rel)         AS op,
       rel.at            AS at,
       startNode(rel).id AS from_id,
-      endNode(rel).id   AS to_id
-    ORDER BY at
+      endNode(rel).id   AS to_id,
+      toString(sort_at) + ',' + sort_key AS cursor
     """
-    with driver.session() as session:
-        result = session.run(cypher, {"id": root_id})
-        return [r.data() for r in result]
+    async with driver.session() as session:
+        result = await session.run(cypher, params)
+        items = [r.data() async for r in result]
+    return {
+        "items": items,
+        "next_cursor": items[-1]["cursor"] if items and len(items) == limit else None,
+    }
+
+
+@timed("neo4j")
+async def fetch_head(mem_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Current head of the version chain `mem_id` belongs to (the memory itself when
+    it was never superseded). Reads the root_id/head_id pointers; when they are
+    missing or stale (the head was superseded by a plain UPDATE link into
+    another chain, or merged away) it walks the UPDATE chain instead.
+    Returns None when the memory isn't in the graph.
+    """
+    pointer_cypher = """
+    MATCH (m:Memory {id: $id})
+    OPTIONAL MATCH (root:Memory {id: coalesce(m.root_id, m.id)})
+    OPTIONAL MATCH (h:Memory {id: root.head_id})
+    WHERE NOT (h)-[:UPDATE]->()
+    // never superseded: its own head
+    WITH m, root, coalesce(h, CASE WHEN m.root_id IS NULL AND NOT (m)-[:UPDATE]->() THEN m END) AS h
+    RETURN m.id AS id, root.id AS root_id,
+           h { .id, .content, .status, .version, .created_at } AS head
+    """
+    walk_cypher = """
+    MATCH (m:Memory {id: $id})
+    MATCH p = (m)-[:UPDATE*0..]->(h:Memory)
+    WHERE NOT (h)-[:UPDATE]->()
+    RETURN h { .id, .content, .status, .version, .created_at } AS head
+    ORDER BY h.created_at DESC, length(p) DESC
+    LIMIT 1
+    """
+    async with driver.session() as session:
+        rec = await (await session.run(pointer_cypher, id=mem_id)).single()
+        if rec is None:
+            return None
+        out = {"id": rec["id"], "root_id": rec["root_id"], "head": rec["head"], "via": "pointer"}
+        if out["head"] is None:
+            walked = await (await session.run(walk_cypher, id=mem_id)).single()
+            out.update(head=walked["head"] if walked else None, via="walk")
+    return out
+
+
+@timed("neo4j")
+async def backfill_version_pointers(batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Set root_id/head_id on UPDATE chains written before the pointers existed
+    (or left stale by merges). A root is a memory with outgoing but no incoming
+    UPDATE edges; its head is the newest chain member with no outgoing UPDATE.
+    """
+    async with driver.session() as session:
+        result = await session.run(
+            """
+            MATCH (root:Memory)-[:UPDATE]->()
+            WHERE NOT ()-[:UPDATE]->(root)
+            WITH DISTINCT root
+            CALL {
+              WITH root
+              MATCH (root)-[:UPDATE*0..]->(v:Memory)
+              WITH root, collect(DISTINCT v) AS chain
+              UNWIND chain AS v
+              SET v.root_id = root.id
+              WITH root, v
+              WHERE NOT (v)-[:UPDATE]->()
+              WITH root, v ORDER BY v.created_at DESC
+              WITH root, collect(v)[0] AS head
+              SET root.head_id = head.id
+            } IN TRANSACTIONS OF $batch ROWS
+            RETURN count(root) AS n
+            """,
+            batch=batch_size,
+        )
+        chains = (await result.single())["n"]
+    return {"chains": chains}
 
 
 # ---------- GLOBAL TIMELINE (newest first) ----------
-def fetch_timeline(limit: int = 100, status: Optional[str] = None) -> List[Dict[str, Any]]:
+@timed("neo4j")
+async def fetch_timeline(limit: int = 100, status: Optional[str] = None, before: Optional[str] = None) -> Dict[str, Any]:
     """
-    Mixed feed of node creates and relationship events.
+    One page of the global event feed, newest first.
+
+    Keyset pagination over (Event.at, Event.id): `before` is the `next_cursor`
+    of the previous page ("<at>,<event id>"), so a page is an index range scan
+    of `limit` events rather than a sort of the whole graph. A status filter is
+    applied to the event's memory after the range scan; events whose memory is
+    gone are skipped.
     """
-    cypher = """
-    MATCH (m:Memory)
+    params: Dict[str, Any] = {"limit": limit, "status": status}
+    if before:
+        at, _, event_id = before.partition(",")
+        params.update(at=at, event_id=event_id)
+        where = "e.at <= datetime($at) AND (e.at < datetime($at) OR e.id < $event_id)"
+    else:
+        where = "e.at IS NOT NULL"
+    cypher = f"""
+    MATCH (e:Event)
+    WHERE {where}
+    MATCH (m:Memory {{id: e.memory_id}})
+    WITH e, m
     WHERE $status IS NULL OR m.status = $status
-    OPTIONAL MATCH (m)-[r:UPDATE|EXTEND|DERIVE]->(n)
-    WITH m, r, coalesce(r.at, m.created_at) AS t
-    ORDER BY t DESC
+    WITH e, m
+    ORDER BY e.at DESC, e.id DESC
     LIMIT $limit
     RETURN
-      m.id      AS id,
-      m.content AS content,
-      m.status  AS status,
-      m.version AS version,
-      t         AS at,
-      type(r)   AS op,
-      CASE WHEN r IS NULL THEN NULL ELSE startNode(r).id END AS from_id,
-      CASE WHEN r IS NULL THEN NULL ELSE endNode(r).id   END AS to_id
-    """
-    with driver.session() as session:
-        result = session.run(cypher, {"limit": limit, "status": status})
-        return [r.data() for r in result]
-
-def create_link(from_id: str, to_id: str, rel_type: str):
-    cypher = f"""
-    MATCH (a:Memory {{id:$from}}), (b:Memory {{id:$to}})
-    MERGE (a)-[r:{rel_type}]->(b)
-    SET r.created_at = datetime()
-    RETURN type(r) as type
+      e.memory_id AS id,
+      m.content   AS content,
+      m.status    AS status,
+      m.version   AS version,
+      e.at        AS at,
+      CASE e.op WHEN 'CREATE' THEN NULL ELSE e.op END AS op,
+      e.from_id   AS from_id,
+      e.to_id     AS to_id,
+      e.id        AS event_id,
+      toString(e.at) + ',' + e.id AS cursor
     """
-    with driver.session() as s:
-        s.run(cypher, {"from": from_id, "to": to_id})
+    async with driver.session() as session:
+        result = await session.run(cypher, params)
+        items = [r.data() async for r in result]
+    return {
+        "items": items,
+        "next_cursor": items[-1]["cursor"] if items and len(items) == limit else None,
+    }
+
 
-def merge_duplicate_nodes(source_id: str, target_id: str):
+@timed("neo4j")
+async def backfill_timeline_events(batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Create events for nodes and edges written before the event log existed and
+    move legacy r.created_at edge timestamps to r.at. Safe to re-run.
+    """
+    async with driver.session() as session:
+        result = await session.run(
+            """
+            MATCH (m:Memory)
+            CALL {
+              WITH m
+              MERGE (e:Event {id: 'CREATE:' + m.id})
+                ON CREATE SET e.at = coalesce(m.created_at, datetime()), e.op = 'CREATE', e.memory_id = m.id
+            } IN TRANSACTIONS OF $batch ROWS
+            RETURN count(m) AS n
+            """,
+            batch=batch_size,
+        )
+        nodes = (await result.single())["n"]
+        result = await session.run(
+            """
+            MATCH (a:Memory)-[r]->(b:Memory)
+            CALL {
+              WITH a, r, b
+              SET r.at = coalesce(r.at, r.created_at, b.created_at, datetime())
+              REMOVE r.created_at
+              MERGE (e:Event {id: type(r) + ':' + a.id + ':' + b.id})
+                ON CREATE SET e.at = r.at, e.op = type(r), e.memory_id = a.id, e.from_id = a.id, e.to_id = b.id
+            } IN TRANSACTIONS OF $batch ROWS
+            RETURN count(r) AS n
+            """,
+            batch=batch_size,
+        )
+        edges = (await result.single())["n"]
+    return {"nodes": nodes, "edges": edges}
+
+
+async def create_link(from_id: str, to_id: str, rel_type: str) -> Dict[str, Any]:
+    return (await create_links_batch([{"from": from_id, "to": to_id, "type": rel_type}]))[0]
+
+def _transfer(rel_type: str, a: str, b: str) -> str:
+    # MERGE needs a literal type; FOREACH over a 0/1-element list acts as a conditional.
+    # The re-created edge gets its own event, keyed like any edge event.
+    return f"""
+    FOREACH (_ IN CASE WHEN type(r) = '{rel_type}' THEN [1] ELSE [] END |
+      MERGE ({a})-[n:{rel_type}]->({b})
+      SET n += properties(r)
+      MERGE (ev_n:Event {{id: '{rel_type}:' + {a}.id + ':' + {b}.id}})
+        ON CREATE SET ev_n.at = n.at, ev_n.op = '{rel_type}', ev_n.memory_id = {a}.id,
+                      ev_n.from_id = {a}.id, ev_n.to_id = {b}.id)"""
+
+
+_MERGE_CYPHER = f"""
+UNWIND $pairs AS pair
+MATCH (s:Memory {{id: pair.src}}), (t:Memory {{id: pair.tgt}})
+CALL {{
+  WITH s, t
+  OPTIONAL MATCH (s)-[r:UPDATE|EXTEND|DERIVE]->(o:Memory)
+  WHERE o <> t
+  {"".join(_transfer(rt, "t", "o") for rt in ("UPDATE", "EXTEND", "DERIVE"))}
+  RETURN count(r) AS moved_out
+}}
+CALL {{
+  WITH s, t
+  OPTIONAL MATCH (o:Memory)-[r:UPDATE|EXTEND|DERIVE]->(s)
+  WHERE o <> t
+  {"".join(_transfer(rt, "o", "t") for rt in ("UPDATE", "EXTEND", "DERIVE"))}
+  RETURN count(r) AS moved_in
+}}
+CALL {{
+  // the source's own events (its CREATE, earlier merges into it, its edges)
+  // would point at a deleted node
+  WITH s
+  OPTIONAL MATCH (s)-[r:UPDATE|EXTEND|DERIVE]-(:Memory)
+  WITH s, collect(type(r) + ':' + startNode(r).id + ':' + endNode(r).id) AS edge_events
+  OPTIONAL MATCH (old:Event)
+  WHERE old.id IN edge_events + ['CREATE:' + s.id] OR old.memory_id = s.id
+  DETACH DELETE old
+  RETURN count(old) AS dropped_events
+}}
+MERGE (ev:Event {{id: 'MERGE:' + s.id + ':' + t.id}})
+  ON CREATE SET ev.at = datetime(), ev.op = 'MERGE', ev.memory_id = t.id, ev.from_id = s.id, ev.to_id = t.id
+DETACH DELETE s
+RETURN pair.src AS source_id, pair.tgt AS target_id, moved_out + moved_in AS moved_edges
+"""
+
+
+@timed("neo4j")
+async def merge_duplicate_nodes_batch(pairs: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Merges each source node into its target, keeping the target's ID.
+    Every relationship of the source (all types, both directions) is re-created on
+    the target with its properties (at/created_at) preserved and an event of its
+    own; the source's events are deleted with it, so the timeline never lists a
+    memory that no longer exists. All pairs run as one query in one transaction:
+    a failure leaves the graph untouched. Returns one result per pair, in input order.
+    """
+    results: Dict[int, Dict[str, Any]] = {}
+    valid = []
+    sources = [src for src, _ in pairs]
+    targets = {tgt for _, tgt in pairs}
+    for i, (src, tgt) in enumerate(pairs):
+        if src == tgt:
+            results[i] = {"source_id": src, "target_id": tgt, "ok": False, "error": "source and target must differ"}
+        elif sources.count(src) > 1:
+            results[i] = {"source_id": src, "target_id": tgt, "ok": False, "error": "source listed more than once"}
+        elif src in targets:
+            results[i] = {"source_id": src, "target_id": tgt, "ok": False, "error": "source is also a merge target; merge it in a separate call"}
+        else:
+            valid.append((i, src, tgt))
+
+    async def work(tx):
+        result = await tx.run(_MERGE_CYPHER, pairs=[{"src": src, "tgt": tgt} for _, src, tgt in valid])
+        return {r["source_id"]: r["moved_edges"] async for r in result}
+
+    merged = {}
+    if valid:
+        async with driver.session() as session:
+            merged = await session.execute_write(work)
+        subgraph_cache.touch(id_ for _, src, tgt in valid for id_ in (src, tgt))
+
+    for i, src, tgt in valid:
+        if src in merged:
+            results[i] = {"source_id": src, "target_id": tgt, "ok": True, "kept": tgt, "moved_edges": merged[src]}
+        else:
+            results[i] = {"source_id": src, "target_id": tgt, "ok": False, "error": "One or both nodes not found"}
+    return [results[i] for i in range(len(pairs))]
+
+
+async def merge_duplicate_nodes(source_id: str, target_id: str):
     """
     Merges source node into target node, keeping target's ID.
-    Transfers all relationships from source to target, then deletes source.
-    Uses multiple queries for clarity and reliability.
-    """
-    with driver.session() as session:
-        # First, verify both nodes exist
-        verify = session.run("""
-            MATCH (s:Memory {id:$src})
-            MATCH (t:Memory {id:$tgt})
-            RETURN s.id AS s_id, t.id AS t_id
-        """, {"src": source_id, "tgt": target_id}).single()
-        
-        if not verify:
-            return {"ok": False, "error": "One or both nodes not found"}
-        
-        # Transfer outgoing UPDATE relationships
-        session.run("""
-            MATCH (s:Memory {id:$src})-[r:UPDATE]->(other)
-            MATCH (t:Memory {id:$tgt})
-            WHERE other <> t
-            MERGE (t)-[:UPDATE]->(other)
-        """, {"src": source_id, "tgt": target_id})
-        
-        # Transfer outgoing EXTEND relationships  
-        session.run("""
-            MATCH (s:Memory {id:$src})-[r:EXTEND]->(other)
-            MATCH (t:Memory {id:$tgt})
-            WHERE other <> t
-            MERGE (t)-[:EXTEND]->(other)
-        """, {"src": source_id, "tgt": target_id})
-        
-        # Transfer outgoing DERIVE relationships
-        session.run("""
-            MATCH (s:Memory {id:$src})-[r:DERIVE]->(other)
-            MATCH (t:Memory {id:$tgt})
-            WHERE other <> t
-            MERGE (t)-[:DERIVE]->(other)
-        """, {"src": source_id, "tgt": target_id})
-        
-        # Transfer incoming UPDATE relationships
-        session.run("""
-            MATCH (other)-[r:UPDATE]->(s:Memory {id:$src})
-            MATCH (t:Memory {id:$tgt})
-            WHERE other <> t
-            MERGE (other)-[:UPDATE]->(t)
-        """, {"src": source_id, "tgt": target_id})
-        
-        # Transfer incoming EXTEND relationships
-        session.run("""
-            MATCH (other)-[r:EXTEND]->(s:Memory {id:$src})
-            MATCH (t:Memory {id:$tgt})
-            WHERE other <> t
-            MERGE (other)-[:EXTEND]->(t)
-        """, {"src": source_id, "tgt": target_id})
-        
-        # Transfer incoming DERIVE relationships
-        session.run("""
-            MATCH (other)-[r:DERIVE]->(s:Memory {id:$src})
-            MATCH (t:Memory {id:$tgt})
-            WHERE other <> t
-            MERGE (other)-[:DERIVE]->(t)
-        """, {"src": source_id, "tgt": target_id})
-        
-        # Finally, delete source node
-        session.run("""
-            MATCH (s:Memory {id:$src})
-            DETACH DELETE s
-        """, {"src": source_id})
-        
-        return {"ok": True, "kept": target_id}
-
+    Transfers all relationships from source to target, then deletes source,
+    in a single transaction.
+    """
+    res = (await merge_duplicate_nodes_batch([(source_id, target_id)]))[0]
+    if not res["ok"]:
+        return {"ok": False, "error": res["error"]}
+    return {"ok": True, "kept": target_id, "moved_edges": res["moved_edges"]}
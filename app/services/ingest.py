@@ -0,0 +1,203 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from pydantic import ValidationError
+from app.config import settings
+from app.schemas import BulkMemoryItem, BulkRelationship
+from app.services.db import delete_memories, insert_memories, insert_memories_with_outbox
+from app.services.embeddings import get_embedding
+from app.services.graph import create_memory_nodes_bulk, create_links_batch
+from app.services.outbox import worker as outbox_worker
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+# (position in the upload, decoded record or the error that prevented decoding it)
+Record = Tuple[int, Any]
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """Decode an NDJSON byte stream line by line without buffering the whole body."""
+    buf = b""
+    line_no = 0
+    async for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line_no, _decode(line)
+            line_no += 1
+    if buf.strip():
+        yield line_no, _decode(buf)
+
+
+def _decode(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"invalid JSON: {e}")
+
+
+async def iter_request(items: List[BulkMemoryItem], relationships: List[BulkRelationship]) -> AsyncIterator[Record]:
+    for i, item in enumerate(items):
+        yield i, item.model_dump()
+    for rel in relationships:
+        yield -1, rel.model_dump()
+
+
+async def bulk_ingest(records: AsyncIterator[Record], batch_size: int | None = None, queue_size: int | None = None) -> Dict[str, Any]:
+    """
+    Streaming ingest pipeline: read -> embed (batched) -> write (multi-row insert + UNWIND).
+
+    Stages are connected by bounded queues, so at most ~queue_size batches are held
+    in memory no matter how large the upload is. Relationship records reference
+    items by client-side key and are written in one transaction once all items are in.
+
+    A batch is written to Postgres first. In sync mode its graph nodes follow, and
+    if that fails the rows are deleted again, so a failed item leaves nothing
+    behind and can be retried. In outbox mode the rows and their create_node
+    outbox rows are one transaction.
+    """
+    batch_size = batch_size or settings.bulk_batch_size
+    queue_size = queue_size or settings.bulk_queue_size
+    embed_q: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    write_q: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    results: List[Dict[str, Any]] = []
+    rels: List[BulkRelationship] = []
+    rel_errors: List[Dict[str, Any]] = []
+    key_to_id: Dict[str, str] = {}
+
+    def fail(batch, error: str):
+        for pos, item, _ in batch:
+            results.append({"index": pos, "key": item.key, "ok": False, "error": error})
+
+    async def read():
+        batch = []
+        async for pos, rec in records:
+            if isinstance(rec, Exception):
+                results.append({"index": pos, "ok": False, "error": str(rec)})
+                continue
+            if isinstance(rec, dict) and "from_key" in rec:
+                try:
+                    rels.append(BulkRelationship(**rec))
+                except (TypeError, ValidationError) as e:
+                    rel_errors.append({"index": pos, "from_key": rec.get("from_key"), "to_key": rec.get("to_key"),
+                                       "type": rec.get("type"), "ok": False, "error": str(e)})
+                continue
+            try:
+                item = BulkMemoryItem(**rec)
+            except (TypeError, ValidationError) as e:
+                results.append({"index": pos, "ok": False, "error": str(e)})
+                continue
+            if not item.content.strip():
+                results.append({"index": pos, "key": item.key, "ok": False, "error": "content cannot be empty"})
+                continue
+
+            batch.append((pos, item, str(uuid.uuid4())))
+            if len(batch) >= batch_size:
+                await embed_q.put(batch)
+                batch = []
+        if batch:
+            await embed_q.put(batch)
+        await embed_q.put(_DONE)
+
+    async def embed():
+        while (batch := await embed_q.get()) is not _DONE:
+            # per item, so one rejected text fails only itself
+            outcomes = await asyncio.gather(*(get_embedding(item.content) for _, item, _ in batch),
+                                            return_exceptions=True)
+            embedded, embeddings = [], []
+            for entry, outcome in zip(batch, outcomes):
+                if isinstance(outcome, BaseException):
+                    fail([entry], f"embedding failed: {outcome}")
+                else:
+                    embedded.append(entry)
+                    embeddings.append(outcome)
+            if embedded:
+                await write_q.put((embedded, embeddings))
+        await write_q.put(_DONE)
+
+    async def write():
+        while (job := await write_q.get()) is not _DONE:
+            batch, embeddings = job
+            rows = [
+                {"id": mem_id, "content": item.content, "embedding": emb, "metadata": item.metadata}
+                for (_, item, mem_id), emb in zip(batch, embeddings)
+            ]
+            if settings.graph_write_mode == "outbox":
+                try:
+                    await insert_memories_with_outbox(rows)
+                except Exception as e:
+                    fail(batch, f"postgres insert failed: {e}")
+                    continue
+                outbox_worker.notify()
+            else:
+                try:
+                    await insert_memories(rows)
+                except Exception as e:
+                    fail(batch, f"postgres insert failed: {e}")
+                    continue
+                try:
+                    await create_memory_nodes_bulk([{"id": r["id"], "content": r["content"]} for r in rows])
+                except Exception as e:
+                    error = f"graph write failed: {e}"
+                    try:
+                        await delete_memories([r["id"] for r in rows])
+                    except Exception as cleanup:
+                        logger.error("bulk ingest: removing %d rows after a failed graph write failed: %r",
+                                     len(rows), cleanup)
+                        error += " (the Postgres rows could not be removed)"
+                    fail(batch, error)
+                    continue
+            for pos, item, mem_id in batch:
+                results.append({"index": pos, "key": item.key, "id": mem_id, "ok": True})
+                if item.key is not None:
+                    key_to_id[item.key] = mem_id
+
+    tasks = [asyncio.create_task(c) for c in (read(), embed(), write())]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        raise
+
+    # relationships by client-side key
+    rel_results = list(rel_errors)
+    edges = []
+    for rel in rels:
+        out = {"from_key": rel.from_key, "to_key": rel.to_key, "type": rel.type}
+        a, b = key_to_id.get(rel.from_key), key_to_id.get(rel.to_key)
+        if a is None or b is None:
+            missing = rel.from_key if a is None else rel.to_key
+            rel_results.append({**out, "ok": False, "error": f"unknown or failed key: {missing}"})
+            continue
+        edges.append({"from": a, "to": b, "type": rel.type})
+        rel_results.append({**out, "from": a, "to": b, "ok": True})
+
+    if edges:
+        pending = [r for r in rel_results if r["ok"]]
+        try:
+            if settings.graph_write_mode == "outbox":
+                # the worker may not have created the endpoints yet; MERGE them by
+                # id (its later create_node fills in the content)
+                ids = {id_ for e in edges for id_ in (e["from"], e["to"])}
+                await create_memory_nodes_bulk([{"id": id_, "content": None} for id_ in ids])
+            for r, res in zip(pending, await create_links_batch(edges)):
+                if not res["ok"]:
+                    r.update(ok=False, error=res["error"])
+        except Exception as e:
+            for r in pending:
+                r.update(ok=False, error=f"graph write failed: {e}")
+
+    results.sort(key=lambda r: r["index"])
+    return {
+        "created": sum(1 for r in results if r["ok"]),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "items": results,
+        "relationships": rel_results,
+    }
@@ -0,0 +1,72 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    # no stemming or stop words: ids, names and years must match exactly
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring; the lexical side of
+    hybrid search when search_backend="local".
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._docs: Dict[str, Counter] = {}
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, id_: str, text: str):
+        if id_ in self._docs:
+            self.remove(id_)
+        terms = Counter(tokenize(text))
+        self._docs[id_] = terms
+        self._lengths[id_] = sum(terms.values())
+        self._total_length += self._lengths[id_]
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[id_] = tf
+
+    def remove(self, id_: str):
+        terms = self._docs.pop(id_, None)
+        if terms is None:
+            return
+        self._total_length -= self._lengths.pop(id_)
+        for term in terms:
+            posting = self._postings[term]
+            del posting[id_]
+            if not posting:
+                del self._postings[term]
+
+    def search(self, query: str, k: int = 10,
+               pred: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """Top-k (id, score); pred filters candidate ids before ranking."""
+        n = len(self._docs)
+        if n == 0 or k <= 0:
+            return []
+        avg_len = self._total_length / n
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for id_, tf in posting.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self._lengths[id_] / avg_len)
+                scores[id_] = scores.get(id_, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        if pred is not None:
+            scores = {i: s for i, s in scores.items() if pred(i)}
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
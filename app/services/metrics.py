@@ -0,0 +1,173 @@
+import contextvars
+import functools
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# seconds; covers a cached lookup through a slow OpenAI batch
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Registry:
+    """
+    Process-wide counters and latency histograms, rendered in the Prometheus
+    text format. Updated from the event loop only, so no locking.
+    """
+
+    def __init__(self):
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def counter(self, name: str, help_: str):
+        self._help[name] = ("counter", help_)
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help_: str):
+        self._help[name] = ("histogram", help_)
+        self._histograms.setdefault(name, {})
+
+    def inc(self, metric: str, value: float = 1.0, **labels: str):
+        series = self._counters[metric]
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0.0) + value
+
+    def observe(self, metric: str, value: float, **labels: str):
+        series = self._histograms[metric]
+        key = tuple(sorted(labels.items()))
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = Histogram()
+        hist.observe(value)
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_) in self._help.items():
+            lines.append(f"# HELP {name} {help_}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for labels, value in self._counters[name].items():
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            for labels, hist in self._histograms[name].items():
+                cumulative = 0
+                for bound, n in zip(BUCKETS, hist.counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(labels, le=_number(bound))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {hist.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(hist.sum)}")
+                lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Labels, **extra: str) -> str:
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+registry = Registry()
+registry.histogram("external_call_duration_seconds", "Latency of calls to Supabase, Neo4j and the embedding API.")
+registry.counter("external_calls_total", "Calls to Supabase, Neo4j and the embedding API, by outcome.")
+registry.histogram("http_request_duration_seconds", "Latency of HTTP requests, by route.")
+registry.counter("http_requests_total", "HTTP requests, by route and status code.")
+
+
+# ---------- request-scoped timings (Server-Timing) ----------
+# The middleware puts a fresh dict here for every request. Tasks created while
+# handling it (asyncio.gather) copy the context and so share the same dict.
+_timings: contextvars.ContextVar[Optional[Dict[str, list]]] = contextvars.ContextVar("timings", default=None)
+
+
+def start_request() -> contextvars.Token:
+    return _timings.set({})
+
+
+def end_request(token: contextvars.Token) -> Dict[str, list]:
+    timings = _timings.get() or {}
+    _timings.reset(token)
+    return timings
+
+
+def server_timing(timings: Dict[str, list], total_s: float) -> str:
+    """Server-Timing header value: summed duration (ms) and call count per span name."""
+    parts = [
+        f'{name};dur={dur * 1000.0:.1f};desc="{n}x"'
+        for name, (dur, n) in sorted(timings.items(), key=lambda item: -item[1][0])
+    ]
+    parts.append(f"total;dur={total_s * 1000.0:.1f}")
+    return ", ".join(parts)
+
+
+@contextmanager
+def span(kind: str, name: str) -> Iterator[None]:
+    """
+    Time one external call: feeds the latency histogram and call counter, and
+    the current request's Server-Timing entry `<kind>.<name>`.
+    """
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("external_call_duration_seconds", elapsed, kind=kind, name=name)
+        registry.inc("external_calls_total", kind=kind, name=name, outcome=outcome)
+        timings = _timings.get()
+        if timings is not None:
+            entry = timings.setdefault(f"{kind}.{name}", [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += 1
+
+
+def timed(kind: str, name: Optional[str] = None):
+    """Decorator: run an async function inside span(kind, name or its own name)."""
+    def decorate(fn):
+        label = name or fn.__name__.lstrip("_")
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(kind, label):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe_request(method: str, route: str, status: int, elapsed: float):
+    registry.observe("http_request_duration_seconds", elapsed, method=method, route=route)
+    registry.inc("http_requests_total", method=method, route=route, status=str(status))
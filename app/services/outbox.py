@@ -0,0 +1,244 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.config import Lazy, settings
+from app.services.db import ack_outbox, canonical_id, claim_outbox, get_memories_by_ids, iter_memories, retry_outbox
+from app.services.graph import create_derive, create_memory_nodes_bulk, driver, subgraph_cache, supersede_version
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- applying outbox rows to Neo4j ----------
+
+async def _apply_one(row: Dict[str, Any]) -> Optional[str]:
+    """Apply a single supersede/derive row; returns an error message or None."""
+    p = row["payload"]
+    if row["op"] == "supersede":
+        res = await supersede_version(old_id=p["old_id"], new_id=p["new_id"], content=p["content"])
+        return None if res else f"memory {p['old_id']} not in graph yet"
+    if row["op"] == "derive":
+        res = await create_derive(p["base_id"], p["derived_id"], p["content"])
+        return None if res else f"memory {p['base_id']} not in graph yet"
+    return f"unknown op: {row['op']}"
+
+
+async def apply_rows(rows: List[Dict[str, Any]]) -> Dict[int, Optional[str]]:
+    """
+    Apply claimed rows in id order. Runs of create_node rows go out as one
+    UNWIND write; supersede/derive depend on earlier nodes and run one by one.
+    Returns row id -> error (None when applied).
+    """
+    errors: Dict[int, Optional[str]] = {}
+    i = 0
+    while i < len(rows):
+        if rows[i]["op"] == "create_node":
+            j = i
+            while j < len(rows) and rows[j]["op"] == "create_node":
+                j += 1
+            run = rows[i:j]
+            try:
+                await create_memory_nodes_bulk([r["payload"] for r in run])
+                errors.update({r["id"]: None for r in run})
+            except Exception as e:
+                errors.update({r["id"]: repr(e) for r in run})
+            i = j
+            continue
+        try:
+            errors[rows[i]["id"]] = await _apply_one(rows[i])
+        except Exception as e:
+            errors[rows[i]["id"]] = repr(e)
+        i += 1
+    return errors
+
+
+class OutboxWorker:
+    """
+    Background drain of graph_outbox: claims a batch under a lease, applies it,
+    acks what succeeded and reschedules failures with exponential backoff until
+    outbox_max_attempts, after which a row is parked as 'dead'.
+    """
+
+    def __init__(self, batch_size: int = 100, poll_interval_s: float = 1.0,
+                 lease_s: int = 60, max_attempts: int = 10, max_backoff_s: float = 300.0):
+        self.batch_size = batch_size
+        self.poll_interval_s = poll_interval_s
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.max_backoff_s = max_backoff_s
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.applied = 0
+        self.failed = 0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """Called after an enqueue so the row is picked up without waiting for the next poll."""
+        self._wake.set()
+
+    async def drain_once(self) -> int:
+        rows = await claim_outbox(self.batch_size, self.lease_s)
+        if not rows:
+            return 0
+        errors = await apply_rows(rows)
+        await ack_outbox([id_ for id_, err in errors.items() if err is None])
+        for row in rows:
+            err = errors.get(row["id"])
+            if err is None:
+                continue
+            self.failed += 1
+            self.last_error = err
+            delay = min(self.max_backoff_s, 2.0 ** row["attempts"])
+            await retry_outbox(row["id"], err, delay, dead=row["attempts"] >= self.max_attempts)
+        self.applied += sum(1 for err in errors.values() if err is None)
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                n = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("outbox drain failed: %r", e)
+                self.last_error = repr(e)
+                n = 0
+            if n < self.batch_size:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval_s)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "applied": self.applied,
+            "failed_attempts": self.failed,
+            "last_error": self.last_error,
+        }
+
+
+worker = Lazy(lambda: OutboxWorker(
+    batch_size=settings.outbox_batch_size,
+    poll_interval_s=settings.outbox_poll_interval_s,
+    lease_s=settings.outbox_lease_s,
+    max_attempts=settings.outbox_max_attempts,
+))
+
+
+# ---------- drift between Postgres and Neo4j ----------
+
+async def reconcile(repair: bool = False, page_size: int = 1000, sample: int = 20,
+                    orphan_grace_s: float = 60.0) -> Dict[str, Any]:
+    """
+    Walk the memories table (authoritative) and check every row against the
+    graph: nodes that are missing and nodes whose status differs. Then walk the
+    graph's Memory nodes and check them against the table: nodes without a row
+    are orphans (e.g. left by a sync-mode create whose insert failed). With
+    repair=True missing nodes are created, statuses copied from Postgres and
+    orphan nodes deleted. Merged rows are skipped (their nodes were deleted on
+    purpose); nodes younger than `orphan_grace_s` are skipped too, since their
+    row may still be on its way.
+    """
+    checked = 0
+    missing: List[str] = []
+    drifted: List[str] = []
+    repaired = 0
+
+    async for rows in iter_memories("id, content, status", page_size):
+        rows = [r for r in rows if r.get("status") != "merged"]
+        checked += len(rows)
+        async with driver.session() as session:
+            result = await session.run(
+                """
+                UNWIND $ids AS id
+                OPTIONAL MATCH (m:Memory {id: id})
+                RETURN id, m IS NOT NULL AS found, m.status AS status
+                """,
+                ids=[r["id"] for r in rows],
+            )
+            graph = {r["id"]: (r["found"], r["status"]) async for r in result}
+
+        page_missing = [r for r in rows if not graph[r["id"]][0]]
+        page_drifted = [r for r in rows if graph[r["id"]][0] and graph[r["id"]][1] != (r.get("status") or "active")]
+        missing += [r["id"] for r in page_missing]
+        drifted += [r["id"] for r in page_drifted]
+
+        if repair and (page_missing or page_drifted):
+            await create_memory_nodes_bulk([{"id": r["id"], "content": r["content"]} for r in page_missing])
+            fix = [{"id": r["id"], "status": r.get("status") or "active"} for r in page_missing + page_drifted]
+            async with driver.session() as session:
+                await session.run(
+                    "UNWIND $rows AS row MATCH (m:Memory {id: row.id}) SET m.status = row.status",
+                    rows=fix,
+                )
+            subgraph_cache.touch(r["id"] for r in fix)
+            repaired += len(fix)
+
+    checked_nodes = 0
+    orphans: List[str] = []
+    after = ""
+    while True:
+        async with driver.session() as session:
+            result = await session.run(
+                """
+                MATCH (m:Memory)
+                WHERE m.id > $after
+                RETURN m.id AS id,
+                       m.created_at IS NULL OR m.created_at < datetime() - duration({seconds: $grace}) AS settled
+                ORDER BY m.id
+                LIMIT $limit
+                """,
+                after=after, grace=orphan_grace_s, limit=page_size,
+            )
+            nodes = [(r["id"], r["settled"]) async for r in result]
+        if not nodes:
+            break
+        after = nodes[-1][0]
+        checked_nodes += len(nodes)
+        ids = [id_ for id_, settled in nodes if settled]
+        found = await get_memories_by_ids(ids, fields=["id"]) if ids else {}
+        page_orphans = [id_ for id_ in ids if canonical_id(id_) not in found]
+        orphans += page_orphans
+
+        if repair and page_orphans:
+            async with driver.session() as session:
+                await session.run(
+                    """
+                    UNWIND $ids AS id
+                    MATCH (m:Memory {id: id})
+                    OPTIONAL MATCH (e:Event {memory_id: id})
+                    DETACH DELETE m, e
+                    """,
+                    ids=page_orphans,
+                )
+            subgraph_cache.touch(page_orphans)
+            repaired += len(page_orphans)
+        if len(nodes) < page_size:
+            break
+
+    return {
+        "checked": checked,
+        "checked_nodes": checked_nodes,
+        "missing_nodes": len(missing),
+        "status_drift": len(drifted),
+        "orphan_nodes": len(orphans),
+        "repaired": repaired,
+        "missing_sample": missing[:sample],
+        "drift_sample": drifted[:sample],
+        "orphan_sample": orphans[:sample],
+    }
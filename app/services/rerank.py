@@ -0,0 +1,109 @@
+from typing import Any, Dict, List
+
+from app.services.graph import driver
+from app.services.metrics import timed
+
+
+def _context_cypher(max_hops: int) -> str:
+    # variable-length bounds can't be parameters
+    return f"""
+    UNWIND $ids AS id
+    MATCH (m:Memory {{id: id}})
+    OPTIONAL MATCH p = (m)-[:UPDATE*1..{int(max_hops)}]->(h:Memory)
+    WHERE NOT (h)-[:UPDATE]->()
+    WITH m, h ORDER BY length(p) DESC
+    WITH m, collect(h)[0] AS head
+    OPTIONAL MATCH (m)-[:EXTEND|DERIVE]-(n:Memory)
+    WHERE n.id IN $ids AND n.id <> m.id
+    RETURN
+      m.id         AS id,
+      m.status     AS status,
+      head.id      AS head_id,
+      head.status  AS head_status,
+      head.content AS head_content,
+      head.version AS head_version,
+      toString(head.created_at) AS head_created_at,
+      collect(DISTINCT n.id) AS neighbors
+    """
+
+
+@timed("neo4j", "rerank_context")
+async def fetch_rerank_context(ids: List[str], max_hops: int = 8) -> Dict[str, Dict[str, Any]]:
+    """Status, UPDATE-chain head and in-set EXTEND/DERIVE neighbors of every candidate, in one query."""
+    async with driver.session() as session:
+        result = await session.run(_context_cypher(max_hops), ids=ids)
+        return {r["id"]: r.data() async for r in result}
+
+
+def _base_score(row: Dict[str, Any]) -> float:
+    for key in ("score", "similarity", "rank"):
+        if row.get(key) is not None:
+            return float(row[key])
+    return 0.0
+
+
+def rerank(rows: List[Dict[str, Any]], context: Dict[str, Dict[str, Any]], k: int,
+           outdated_penalty: float = 0.5, neighbor_weight: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    Re-score search candidates with the graph:
+    1. base = the row's own score, scaled to [0, 1] over the candidates' range
+       (so vector, lexical and fused scores are treated alike, negative ones too)
+    2. + neighbor_weight * mean base of its EXTEND/DERIVE neighbors in the set
+    3. * outdated_penalty when the row is outdated; merged rows go
+    4. an outdated row whose UPDATE chain ends in an active head is replaced by
+       that head (keeping the better score when the head is a candidate too)
+    A row counts as outdated when either store says so or when the graph shows
+    an UPDATE successor (status is only kept in sync in Postgres for updates).
+    Returns the top k with "rerank_score"; collapsed rows list their ids in "collapsed".
+    A head that wasn't a candidate carries the similarity of the row it replaced
+    and metadata None (the graph doesn't hold it; the search endpoint fills it in).
+    """
+    if not rows:
+        return []
+    raw = {r["id"]: _base_score(r) for r in rows}
+    low, high = min(raw.values()), max(raw.values())
+    span = high - low
+    base = {id_: (s - low) / span if span > 0 else 1.0 for id_, s in raw.items()}
+
+    scored: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        ctx = context.get(row["id"], {})
+        statuses = {ctx.get("status"), row.get("status")}
+        head = ctx.get("head_id")
+        if "merged" in statuses:
+            continue
+        if "outdated" in statuses or (head is not None and head != row["id"]):
+            status = "outdated"
+        else:
+            status = row.get("status") or ctx.get("status")
+        neighbors = [base[n] for n in ctx.get("neighbors") or [] if n in base]
+        score = base[row["id"]]
+        if neighbors:
+            score += neighbor_weight * sum(neighbors) / len(neighbors)
+
+        out = {**row, "status": status}
+        if status == "outdated" and head and ctx.get("head_status") in (None, "active"):
+            existing = next((r for r in rows if r["id"] == head), None)
+            out = {**existing} if existing is not None else {
+                "id": head,
+                "content": ctx.get("head_content"),
+                "status": "active",
+                "version": ctx.get("head_version"),
+                "similarity": row.get("similarity"),
+                "metadata": None,
+                "created_at": ctx.get("head_created_at"),
+            }
+            out["collapsed"] = [row["id"]]
+        elif status == "outdated":
+            score *= outdated_penalty
+
+        prev = scored.get(out["id"])
+        if prev is not None:
+            out["collapsed"] = prev.get("collapsed", []) + out.get("collapsed", [])
+            score = max(score, prev["rerank_score"])
+            if not out["collapsed"]:
+                del out["collapsed"]
+        out["rerank_score"] = score
+        scored[out["id"]] = out
+
+    return sorted(scored.values(), key=lambda r: r["rerank_score"], reverse=True)[:k]
@@ -0,0 +1,53 @@
+from typing import Any, Dict, List
+
+# name -> idempotent DDL. Every graph read/write looks memories up by id, so the
+# uniqueness constraint (which is also the id index) is the important one: it
+# turns MATCH/MERGE on id into an index seek and stops concurrent MERGEs from
+# creating duplicate nodes.
+CONSTRAINTS = {
+    "memory_id_unique": "CREATE CONSTRAINT memory_id_unique IF NOT EXISTS FOR (m:Memory) REQUIRE m.id IS UNIQUE",
+    "event_id_unique": "CREATE CONSTRAINT event_id_unique IF NOT EXISTS FOR (e:Event) REQUIRE e.id IS UNIQUE",
+}
+
+INDEXES = {
+    "memory_status": "CREATE INDEX memory_status IF NOT EXISTS FOR (m:Memory) ON (m.status)",
+    "memory_created_at": "CREATE INDEX memory_created_at IF NOT EXISTS FOR (m:Memory) ON (m.created_at)",
+    "event_at": "CREATE INDEX event_at IF NOT EXISTS FOR (e:Event) ON (e.at)",
+    # a merge deletes the merged-away memory's events
+    "event_memory_id": "CREATE INDEX event_memory_id IF NOT EXISTS FOR (e:Event) ON (e.memory_id)",
+    **{
+        f"{rel.lower()}_at": f"CREATE INDEX {rel.lower()}_at IF NOT EXISTS FOR ()-[r:{rel}]-() ON (r.at)"
+        for rel in ("UPDATE", "EXTEND", "DERIVE")
+    },
+}
+
+
+async def ensure_schema(driver) -> Dict[str, Any]:
+    """
+    Create any missing constraints and indexes. Safe to run on every startup.
+    A failing statement (e.g. the id constraint while duplicate ids exist) is
+    reported and doesn't stop the rest.
+    """
+    errors = {}
+    async with driver.session() as session:
+        for name, ddl in {**CONSTRAINTS, **INDEXES}.items():
+            try:
+                # consume inside the try: a DDL can fail after run() returns, and the
+                # error would otherwise surface on the next statement (or on close)
+                await (await session.run(ddl)).consume()
+            except Exception as e:
+                errors[name] = str(e)
+    return {"errors": errors, **(await check_schema(driver))}
+
+
+async def check_schema(driver) -> Dict[str, List[str]]:
+    """Names from CONSTRAINTS/INDEXES that don't exist, and indexes not yet ONLINE."""
+    async with driver.session() as session:
+        result = await session.run("SHOW CONSTRAINTS YIELD name")
+        constraints = {r["name"] async for r in result}
+        result = await session.run("SHOW INDEXES YIELD name, state")
+        indexes = {r["name"]: r["state"] async for r in result}
+    missing = [n for n in CONSTRAINTS if n not in constraints]
+    missing += [n for n in INDEXES if n not in indexes]
+    populating = [n for n in INDEXES if n in indexes and indexes[n] != "ONLINE"]
+    return {"missing": missing, "not_online": populating}
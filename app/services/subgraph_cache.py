@@ -0,0 +1,124 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+
+
+class SubgraphCache:
+    """
+    Cache of per-seed expansion results keyed by (seed id, depth, ...).
+
+    Every graph write bumps a generation counter on the nodes it touches. An entry
+    remembers the generation of each node it contains when it was filled and is
+    dropped as soon as one of them is touched, so only neighborhoods that actually
+    contain a written node are invalidated. Size is bounded by a cost budget
+    (nodes + edges held) with LRU eviction.
+
+    Invalidation only sees writes made through this process, so entries also
+    expire after `ttl_s`: that bounds how stale a neighborhood can be when other
+    workers or processes write to the graph.
+    """
+
+    def __init__(self, max_cost: int = 200_000, ttl_s: float = 30.0):
+        self.max_cost = max_cost
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._by_node: Dict[str, Set[Hashable]] = {}
+        self._gen: Dict[str, int] = {}
+        self._clock = 0
+        self.cost = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.stale_fills = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_cost > 0
+
+    def clock(self) -> int:
+        """Take before expanding; pass to put() so a concurrent write isn't cached over."""
+        return self._clock
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        graph, snapshot, _, filled_at = entry
+        if self.ttl_s > 0 and time.monotonic() - filled_at > self.ttl_s:
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        if any(self._gen.get(n, 0) != g for n, g in snapshot.items()):
+            self._drop(key)
+            self.invalidations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return graph
+
+    def put(self, key: Hashable, graph: Dict[str, Any], seed: str, started_at: int):
+        if not self.enabled or not graph:
+            return
+        node_ids = {n["id"] for n in graph.get("nodes", [])} | {seed}
+        # a node written while this expansion ran may be missing from the result
+        if any(self._gen.get(n, 0) > started_at for n in node_ids):
+            self.stale_fills += 1
+            return
+        cost = len(graph.get("nodes", [])) + len(graph.get("edges", [])) + 1
+        if cost > self.max_cost:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (graph, {n: self._gen.get(n, 0) for n in node_ids}, cost, time.monotonic())
+        for n in node_ids:
+            self._by_node.setdefault(n, set()).add(key)
+        self.cost += cost
+        while self.cost > self.max_cost:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def touch(self, node_ids: Iterable[str]):
+        """Record a write to these nodes and drop every entry that contains one of them."""
+        for n in node_ids:
+            if n is None:
+                continue
+            self._clock += 1
+            self._gen[n] = self._clock
+            for key in list(self._by_node.get(n, ())):
+                self._drop(key)
+                self.invalidations += 1
+
+    def _drop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        _, snapshot, cost, _ = entry
+        self.cost -= cost
+        for n in snapshot:
+            keys = self._by_node.get(n)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_node[n]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "stale_fills": self.stale_fills,
+            "expirations": self.expirations,
+            "entries": len(self._entries),
+            "cost": self.cost,
+            "max_cost": self.max_cost,
+            "ttl_s": self.ttl_s,
+        }
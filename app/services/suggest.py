@@ -1,31 +1,49 @@
-from typing import List, Dict
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Dict, Optional
 from app.services.db import *
 from app.config import settings
 
-def suggest_links_for(id: str) -> List[Dict]:
-    row = get_memory_by_id(id) 
-    if not row: return []
+logger = logging.getLogger(__name__)
 
-    hits = search_memories(row["embedding"], k=20, exclude_id=id)
+
+def _thresholds():
+    return (
+        float(settings.auto_dup_thresh),
+        float(settings.auto_ext_thresh),
+        float(settings.auto_der_thresh),
+        int(settings.auto_max_suggestions),
+    )
+
+
+def classify(s: float, dup: float, ext: float, der: float):
+    """(type, reason) for a similarity score, or None below the DERIVE threshold."""
+    if s >= dup:
+        return "DUPLICATE", f"sim={s:.3f} ≥ {dup}"
+    if s >= ext:
+        return "EXTEND", f"sim={s:.3f} ≥ {ext}"
+    if s >= der:
+        return "DERIVE", f"sim={s:.3f} ≥ {der}"
+    return None
+
+
+async def suggest_links_for(id: str) -> List[Dict]:
+    emb = await get_memory_embedding(id)
+    if emb is None: return []
+
+    hits = await search_memories(emb, k=20, exclude_id=id)
     out = []
-    dup = float(settings.auto_dup_thresh)
-    ext = float(settings.auto_ext_thresh)
-    der = float(settings.auto_der_thresh)
-    cap = int(settings.auto_max_suggestions)
+    dup, ext, der, cap = _thresholds()
 
     for h in hits:
         s = h["similarity"]
-        if s >= dup:
-            t = "DUPLICATE"
-            reason = f"sim={s:.3f} ≥ {dup}"
-        elif s >= ext:
-            t = "EXTEND"
-            reason = f"sim={s:.3f} ≥ {ext}"
-        elif s >= der:
-            t = "DERIVE"
-            reason = f"sim={s:.3f} ≥ {der}"
-        else:
+        c = classify(s, dup, ext, der)
+        if c is None:
             continue
+        t, reason = c
 
         out.append({
             "from": id,
@@ -35,4 +53,149 @@ def suggest_links_for(id: str) -> List[Dict]:
             "reason": reason
         })
         if len(out) >= cap: break
-    return out
\ No newline at end of file
+    return out
+
+
+# ---------- batch suggestions: thresholded similarity join over the corpus ----------
+
+def similarity_join(ids, matrix, query_pos, dup, ext, der, cap, block_size=256) -> List[Dict]:
+    """
+    All pairs (i, j) with cos(i, j) >= der where i is a query row, computed with
+    blocked matrix products (block_size x N at a time). Rows must be L2-normalized.
+    A pair between two query rows is reported once; each query row keeps at most
+    `cap` best matches. Returns candidates ranked by similarity.
+    """
+    import numpy as np
+
+    n = len(ids)
+    query_pos = np.asarray(query_pos, dtype=np.int64)
+    if n == 0 or len(query_pos) == 0:
+        return []
+    is_query = np.zeros(n, dtype=bool)
+    is_query[query_pos] = True
+    cols = np.arange(n)
+
+    found = []
+    for start in range(0, len(query_pos), block_size):
+        rows = query_pos[start:start + block_size]
+        sims = matrix[rows] @ matrix.T
+        # drop self-pairs and the mirrored half of query-query pairs
+        sims[is_query[None, :] & (cols[None, :] <= rows[:, None])] = -np.inf
+        for r, i in enumerate(rows):
+            hit = np.flatnonzero(sims[r] >= der)
+            if len(hit) > cap:
+                hit = hit[np.argpartition(-sims[r, hit], cap - 1)[:cap]]
+            for j in hit:
+                found.append((float(sims[r, j]), int(i), int(j)))
+
+    found.sort(reverse=True)
+    out = []
+    for s, i, j in found:
+        t, reason = classify(s, dup, ext, der)
+        out.append({"from": ids[i], "to": ids[j], "type": t, "similarity": s, "reason": reason})
+    return out
+
+
+async def _load_corpus():
+    """(ids, normalized matrix, created_at) of active memories, from the local index if loaded."""
+    import numpy as np
+    from app.services.vector_index import as_datetime, to_vector
+
+    index = get_local_index()
+    if index is not None:
+        return index.export(status="active")
+
+    ids, vectors, created = [], [], []
+    async for rows in iter_memories("id, embedding, created_at", status="active"):
+        for r in rows:
+            if r.get("embedding") is None:
+                continue
+            ids.append(r["id"])
+            vectors.append(to_vector(r["embedding"]))
+            created.append(as_datetime(r.get("created_at")))
+    matrix = np.vstack(vectors) if vectors else np.empty((0, settings.embedding_dim), dtype=np.float32)
+    return ids, matrix, created
+
+
+_jobs: "OrderedDict[str, Dict]" = OrderedDict()
+_MAX_JOBS = 20
+_watermark: Optional[datetime] = None  # newest created_at covered by a finished job
+
+
+async def start_suggestion_job(delta: bool = False, since: Optional[datetime] = None) -> Dict:
+    """
+    Start a background suggestion scan. With delta=True (or an explicit `since`)
+    only memories created after the watermark are matched against the corpus.
+    """
+    if since is None and delta:
+        since = _watermark
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    job = {
+        "id": str(uuid.uuid4()),
+        "status": "running",
+        "since": since,
+        "started_at": datetime.now(timezone.utc),
+        "finished_at": None,
+        "corpus": 0,
+        "scanned": 0,
+        "error": None,
+        "candidates": [],
+    }
+    _jobs[job["id"]] = job
+    while len(_jobs) > _MAX_JOBS:
+        _jobs.popitem(last=False)
+    job["task"] = asyncio.create_task(_run_job(job))
+    return _summary(job)
+
+
+async def _run_job(job: Dict):
+    global _watermark
+    try:
+        ids, matrix, created = await _load_corpus()
+        since = job["since"]
+        query_pos = [i for i, c in enumerate(created) if since is None or (c is not None and c > since)]
+        job["corpus"], job["scanned"] = len(ids), len(query_pos)
+
+        dup, ext, der, cap = _thresholds()
+        job["candidates"] = await asyncio.to_thread(
+            similarity_join, ids, matrix, query_pos, dup, ext, der, cap, settings.suggest_block_size,
+        )
+        newest = max((c for c in created if c is not None), default=None)
+        if newest is not None and (_watermark is None or newest > _watermark):
+            _watermark = newest
+        job["status"] = "done"
+    except Exception as e:
+        logger.error("suggestion job %s failed: %r", job["id"], e)
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = datetime.now(timezone.utc)
+
+
+def _summary(job: Dict) -> Dict:
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "since": job["since"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "corpus": job["corpus"],
+        "scanned": job["scanned"],
+        "total": len(job["candidates"]),
+        "error": job["error"],
+    }
+
+
+def get_suggestion_job(job_id: str, offset: int = 0, limit: int = 50) -> Optional[Dict]:
+    """Job status plus one page of the ranked candidate list."""
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    page = job["candidates"][offset:offset + limit]
+    next_offset = offset + len(page)
+    return {
+        **_summary(job),
+        "items": page,
+        "next_offset": next_offset if next_offset < len(job["candidates"]) else None,
+    }
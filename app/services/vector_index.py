@@ -0,0 +1,445 @@
+import json
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.services.lexical_index import BM25Index
+
+try:
+    import hnswlib
+except ImportError:  # optional, only needed for vector_index="hnsw"
+    hnswlib = None
+
+
+def to_vector(embedding) -> np.ndarray:
+    """pgvector columns come back from PostgREST as '[0.1,0.2,...]' strings."""
+    if isinstance(embedding, str):
+        embedding = json.loads(embedding)
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def as_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        dt = value
+    else:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if dt is not None and dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def jsonb_contains(value, pattern) -> bool:
+    """
+    Postgres jsonb `value @> pattern`: objects match key by key (recursively),
+    every element of an array pattern must be contained in some element of the
+    array, and scalars must be equal (true is not 1).
+    """
+    if isinstance(pattern, dict):
+        return isinstance(value, dict) and all(
+            key in value and jsonb_contains(value[key], sub) for key, sub in pattern.items()
+        )
+    if isinstance(pattern, list):
+        return isinstance(value, list) and all(
+            any(jsonb_contains(item, sub) for item in value) for sub in pattern
+        )
+    if isinstance(value, (dict, list)):
+        return False
+    if isinstance(value, bool) or isinstance(pattern, bool):
+        return type(value) is type(pattern) and value == pattern
+    return value == pattern
+
+
+def make_predicate(filters) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    """Row predicate for a SearchFilters, or None when nothing is filtered."""
+    if filters is None or filters.is_empty():
+        return None
+    exclude = set(filters.exclude_ids)
+    status = filters.status
+    metadata = filters.metadata or {}
+    after = as_datetime(filters.created_after)
+    before = as_datetime(filters.created_before)
+
+    def pred(row):
+        if row["id"] in exclude:
+            return False
+        if status is not None and row["status"] != status:
+            return False
+        if metadata and not jsonb_contains(row["metadata"] or {}, metadata):
+            return False
+        if after is not None and (row["created_at"] is None or row["created_at"] < after):
+            return False
+        if before is not None and (row["created_at"] is None or row["created_at"] >= before):
+            return False
+        return True
+
+    return pred
+
+
+class VectorIndex(ABC):
+    """
+    In-process cosine-similarity index over the `memories` table.
+    Search results have the same shape as the match_memories RPC rows.
+    Content is also kept in a BM25 index for lexical and hybrid search.
+    """
+
+    # filtered ANN search starts by fetching k * overfetch candidates and grows
+    # the fetch until k pass; past exact_fraction of the corpus it scans exactly
+    overfetch = 4
+    exact_fraction = 0.1
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.lexical = BM25Index()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, id_: str, embedding, content: str = None, metadata: dict = None,
+            status: str = "active", created_at: str = None):
+        self._add_vector(id_, to_vector(embedding))
+        self.rows[id_] = {
+            "id": id_,
+            "content": content,
+            "metadata": metadata,
+            "status": status,
+            "created_at": as_datetime(created_at) or datetime.now(timezone.utc),
+        }
+        self.lexical.add(id_, content)
+
+    def set_status(self, id_: str, status: str):
+        if id_ in self.rows:
+            self.rows[id_]["status"] = status
+
+    def remove(self, id_: str):
+        if self.rows.pop(id_, None) is not None:
+            self._remove_vector(id_)
+            self.lexical.remove(id_)
+
+    def vector(self, id_: str) -> Optional[np.ndarray]:
+        return self._vectors([id_])[0] if id_ in self.rows else None
+
+    def export(self, status: str = None, created_after=None):
+        """(ids, normalized float32 matrix, created_at list) for bulk similarity work."""
+        after = as_datetime(created_after)
+        ids = [
+            i for i, row in self.rows.items()
+            if (status is None or row["status"] == status)
+            and (after is None or row["created_at"] > after)
+        ]
+        matrix = self._vectors(ids) if ids else np.empty((0, self.dim), dtype=np.float32)
+        return ids, matrix, [self.rows[i]["created_at"] for i in ids]
+
+    def search(self, query_embedding, k: int = 5, similarity_threshold: float = 0.0, filters=None) -> List[Dict[str, Any]]:
+        if not self.rows or k <= 0:
+            return []
+        query = to_vector(query_embedding)
+        pred = make_predicate(filters)
+        hits = self._top_k(query, k) if pred is None else self._filtered_top_k(query, k, pred)
+
+        out = []
+        for id_, sim in hits:
+            if sim < similarity_threshold:
+                break
+            out.append({**self._result(id_), "similarity": sim})
+        return out
+
+    def lexical_search(self, query: str, k: int = 5, filters=None) -> List[Dict[str, Any]]:
+        """BM25 top-k, same row shape as match_memories_lexical (score in "rank")."""
+        pred = make_predicate(filters)
+        hits = self.lexical.search(query, k, None if pred is None else lambda i: pred(self.rows[i]))
+        return [{**self._result(id_), "rank": score} for id_, score in hits]
+
+    def _result(self, id_: str) -> Dict[str, Any]:
+        row = self.rows[id_]
+        return {
+            "id": id_,
+            "content": row["content"],
+            "metadata": row["metadata"],
+            "status": row["status"],
+            "created_at": row["created_at"].isoformat(),
+        }
+
+    def _filtered_top_k(self, query: np.ndarray, k: int, pred) -> List[tuple]:
+        """Adaptive over-fetch for approximate indexes; exact fallback for selective filters."""
+        n = len(self.rows)
+        fetch = k * self.overfetch
+        while fetch < n * self.exact_fraction:
+            passed = [(i, s) for i, s in self._top_k(query, fetch) if pred(self.rows[i])]
+            if len(passed) >= k:
+                return passed[:k]
+            fetch *= self.overfetch
+        return self._exact_top_k(query, k, [i for i, row in self.rows.items() if pred(row)])
+
+    def _exact_top_k(self, query: np.ndarray, k: int, ids: List[str]) -> List[tuple]:
+        if not ids:
+            return []
+        scores = self._vectors(ids) @ query
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], float(scores[i])) for i in top]
+
+    @abstractmethod
+    def _vectors(self, ids: List[str]) -> np.ndarray:
+        ...
+
+    @abstractmethod
+    def _add_vector(self, id_: str, vec: np.ndarray):
+        ...
+
+    @abstractmethod
+    def _remove_vector(self, id_: str):
+        ...
+
+    @abstractmethod
+    def _top_k(self, query: np.ndarray, k: int) -> List[tuple]:
+        ...
+
+
+PRECISIONS = ("float32", "float16", "int8", "binary")
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class VectorStore:
+    """
+    Full-precision float32 rows in a memory-mapped file, for exact re-scoring of
+    a few candidates without keeping every vector resident. The file is scratch
+    space (the index is rebuilt from Postgres at startup); a temp file is used
+    when no path is given.
+    """
+
+    def __init__(self, dim: int, capacity: int, path: Optional[str] = None):
+        self.dim = dim
+        self._temp = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="vectors-", suffix=".f32")
+            os.close(fd)
+        self.path = path
+        with open(self.path, "wb"):
+            pass
+        self._open(capacity)
+
+    def _open(self, capacity: int):
+        with open(self.path, "r+b") as f:
+            f.truncate(capacity * self.dim * 4)
+        self.data = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def grow(self, capacity: int):
+        self.data.flush()
+        del self.data
+        self._open(capacity)
+
+    def __del__(self):
+        if self._temp:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class FlatIndex(VectorIndex):
+    """
+    Exact search: one matrix of normalized rows, scored with a single mat-vec.
+
+    With precision float16 / int8 (per-row scale) / binary (sign bits, Hamming
+    distance) the scanned matrix is 2x / 4x / 32x smaller. The best
+    k * rescore_factor rows by approximate score are then re-scored exactly
+    against float32 copies in a memory-mapped VectorStore.
+    """
+
+    block = 65_536  # rows decoded to float32 at a time when scanning compact codes
+
+    def __init__(self, dim: int, capacity: int = 1024, precision: str = "float32",
+                 rescore_factor: int = 4, store_path: Optional[str] = None):
+        if precision not in PRECISIONS:
+            raise ValueError(f"unknown vector precision: {precision}")
+        super().__init__(dim)
+        self.precision = precision
+        self.rescore_factor = rescore_factor
+        self._matrix = self._alloc(capacity)
+        self._scale = np.empty(capacity, dtype=np.float32) if precision == "int8" else None
+        self._store = VectorStore(dim, capacity, store_path) if precision != "float32" else None
+        self._ids: List[str] = []
+        self._pos: Dict[str, int] = {}
+
+    def _alloc(self, capacity: int) -> np.ndarray:
+        if self.precision == "binary":
+            return np.empty((capacity, (self.dim + 7) // 8), dtype=np.uint8)
+        return np.empty((capacity, self.dim), dtype=np.dtype(self.precision))
+
+    def _encode(self, pos: int, vec: np.ndarray):
+        if self.precision == "int8":
+            scale = float(np.abs(vec).max()) / 127.0 or 1.0
+            self._matrix[pos] = np.round(vec / scale).astype(np.int8)
+            self._scale[pos] = scale
+        elif self.precision == "binary":
+            self._matrix[pos] = np.packbits(vec > 0)
+        else:
+            self._matrix[pos] = vec
+        if self._store is not None:
+            self._store.data[pos] = vec
+
+    def _add_vector(self, id_, vec):
+        pos = self._pos.get(id_)
+        if pos is None:
+            pos = len(self._ids)
+            if pos == len(self._matrix):
+                capacity = 2 * len(self._matrix)
+                grown = self._alloc(capacity)
+                grown[:pos] = self._matrix[:pos]
+                self._matrix = grown
+                if self._scale is not None:
+                    self._scale = np.resize(self._scale, capacity)
+                if self._store is not None:
+                    self._store.grow(capacity)
+            self._ids.append(id_)
+            self._pos[id_] = pos
+        self._encode(pos, vec)
+
+    def _remove_vector(self, id_):
+        # move the last row into the hole to keep the matrix dense
+        pos = self._pos.pop(id_)
+        last = len(self._ids) - 1
+        if pos != last:
+            moved = self._ids[last]
+            self._matrix[pos] = self._matrix[last]
+            if self._scale is not None:
+                self._scale[pos] = self._scale[last]
+            if self._store is not None:
+                self._store.data[pos] = self._store.data[last]
+            self._ids[pos] = moved
+            self._pos[moved] = pos
+        self._ids.pop()
+
+    def _scores(self, query):
+        """Scores of every row against the query; approximate unless precision is float32."""
+        n = len(self._ids)
+        if self.precision == "float32":
+            return self._matrix[:n] @ query
+        out = np.empty(n, dtype=np.float32)
+        if self.precision == "binary":
+            bits = np.packbits(query > 0)
+            for start in range(0, n, self.block):
+                codes = self._matrix[start:min(n, start + self.block)]
+                hamming = _POPCOUNT[np.bitwise_xor(codes, bits)].sum(axis=1, dtype=np.int32)
+                # sign-random-projection estimate: angle ~ pi * hamming / dim
+                out[start:start + len(codes)] = np.cos(np.pi * hamming / self.dim)
+            return out
+        for start in range(0, n, self.block):
+            codes = self._matrix[start:min(n, start + self.block)]
+            out[start:start + len(codes)] = codes.astype(np.float32) @ query
+        if self._scale is not None:
+            out *= self._scale[:n]
+        return out
+
+    def _rescore(self, query, positions, k):
+        """Exact float32 scores for candidate positions; best k as (id, score)."""
+        positions = np.asarray(positions, dtype=np.int64)
+        if self._store is None:
+            exact = self._matrix[positions] @ query
+        else:
+            exact = np.asarray(self._store.data[positions]) @ query
+        top = np.argsort(-exact)[:k]
+        return [(self._ids[positions[i]], float(exact[i])) for i in top]
+
+    def _top_k(self, query, k):
+        n = len(self._ids)
+        scores = self._scores(query)
+        m = min(n, k if self._store is None else k * self.rescore_factor)
+        cand = np.argpartition(-scores, m - 1)[:m]
+        return self._rescore(query, cand, k)
+
+    def _filtered_top_k(self, query, k, pred):
+        # walk the full ranking in score order until enough rows pass
+        scores = self._scores(query)
+        want = k if self._store is None else k * self.rescore_factor
+        passed = []
+        for i in np.argsort(-scores):
+            if pred(self.rows[self._ids[i]]):
+                passed.append(i)
+                if len(passed) == want:
+                    break
+        return self._rescore(query, passed, k) if passed else []
+
+    def _vectors(self, ids):
+        positions = [self._pos[i] for i in ids]
+        if self._store is not None:
+            return np.asarray(self._store.data[positions])
+        return self._matrix[positions]
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Resident bytes of the scanned codes, and bytes of full vectors kept on disk."""
+        n = len(self._ids)
+        resident = self._matrix[:n].nbytes + (self._scale[:n].nbytes if self._scale is not None else 0)
+        return {"resident": resident, "on_disk": n * self.dim * 4 if self._store is not None else 0}
+
+
+class HNSWIndex(VectorIndex):
+    """Approximate search with hnswlib; for corpora where a flat scan gets too slow."""
+
+    def __init__(self, dim: int, capacity: int = 10_000, m: int = 16, ef_construction: int = 200, ef_search: int = 64):
+        if hnswlib is None:
+            raise RuntimeError("vector_index='hnsw' requires the hnswlib package")
+        super().__init__(dim)
+        self.ef_search = ef_search
+        self._index = hnswlib.Index(space="cosine", dim=dim)
+        self._index.init_index(max_elements=capacity, M=m, ef_construction=ef_construction, allow_replace_deleted=True)
+        self._labels: Dict[str, int] = {}
+        self._label_ids: Dict[int, str] = {}
+        self._next_label = 0
+
+    def _add_vector(self, id_, vec):
+        if id_ in self._labels:
+            self._remove_vector(id_)
+        if self._index.get_current_count() >= self._index.get_max_elements():
+            self._index.resize_index(2 * self._index.get_max_elements())
+        label = self._next_label
+        self._next_label += 1
+        self._index.add_items(vec[None, :], [label], replace_deleted=True)
+        self._labels[id_] = label
+        self._label_ids[label] = id_
+
+    def _remove_vector(self, id_):
+        label = self._labels.pop(id_)
+        del self._label_ids[label]
+        self._index.mark_deleted(label)
+
+    def _top_k(self, query, k):
+        k = min(k, len(self._labels))
+        self._index.set_ef(max(self.ef_search, k))
+        labels, distances = self._index.knn_query(query[None, :], k=k)
+        return [(self._label_ids[int(l)], 1.0 - float(d)) for l, d in zip(labels[0], distances[0])]
+
+    def _vectors(self, ids):
+        vecs = np.asarray(self._index.get_items([self._labels[i] for i in ids]), dtype=np.float32)
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def make_index(kind: str, dim: int, precision: str = "float32", rescore_factor: int = 4,
+               store_path: Optional[str] = None) -> VectorIndex:
+    if kind == "flat":
+        return FlatIndex(dim, precision=precision, rescore_factor=rescore_factor, store_path=store_path)
+    if kind == "hnsw":
+        if precision != "float32":
+            raise ValueError("quantized vector_precision needs vector_index='flat' (hnswlib stores float32)")
+        return HNSWIndex(dim)
+    raise ValueError(f"unknown vector index: {kind}")
+
+
+_index: Optional[VectorIndex] = None
+
+
+def get_index() -> Optional[VectorIndex]:
+    return _index
+
+
+def set_index(index: Optional[VectorIndex]):
+    global _index
+    _index = index
@@ -0,0 +1,146 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import the app and to
+get through lifespan startup, with `--procs` processes starting at once (as
+with uvicorn/gunicorn workers).
+
+Imports run with a bare environment (no credentials) to check that importing
+app.main validates no settings and loads none of the database clients; the
+run exits non-zero when that is violated or when the median import exceeds
+--budget-ms, so it can gate CI.
+
+Startup uses the offline settings (fake embeddings, local index, no
+Supabase); Neo4j is tried at NEO4J_URI and its warmup step fails fast when
+nothing listens there.
+
+    python -m benchmarks.bench_cold_start --runs 10 --procs 4 --budget-ms 1500
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must stay out of a plain import of the app
+DEFERRED = ("neo4j", "supabase", "numpy")
+
+IMPORT_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+import_ms = (time.perf_counter() - start) * 1000.0
+from app.config import settings
+print(json.dumps({
+    "import_ms": import_ms,
+    "loaded": [m for m in %r if m in sys.modules],
+    "settings_resolved": settings.resolved,
+}))
+""" % (DEFERRED,)
+
+STARTUP_CHILD = """
+import asyncio, json, time
+start = time.perf_counter()
+import app.main
+import_ms = (time.perf_counter() - start) * 1000.0
+
+async def run():
+    async with app.main.lifespan(app.main.app):
+        return dict(app.main.startup)
+
+startup = asyncio.run(run())
+print(json.dumps({"import_ms": import_ms, **startup}))
+"""
+
+
+def bare_env() -> dict:
+    env = {k: os.environ[k] for k in ("PATH", "HOME", "LANG", "VIRTUAL_ENV") if k in os.environ}
+    env["PYTHONPATH"] = ROOT
+    return env
+
+
+def offline_env() -> dict:
+    env = bare_env()
+    env.update({
+        "OPENAI_API_KEY": "offline",
+        "NEO4J_URI": os.environ.get("NEO4J_URI", "bolt://localhost:7687"),
+        "NEO4J_USER": os.environ.get("NEO4J_USER", "neo4j"),
+        "NEO4J_PASSWORD": os.environ.get("NEO4J_PASSWORD", "offline"),
+        "EMBEDDING_BACKEND": "fake",
+        "SEARCH_BACKEND": "local",
+        "LOG_LEVEL": "WARNING",
+    })
+    return env
+
+
+def run_child(code: str, env: dict) -> dict:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                          capture_output=True, text=True, timeout=120)
+    wall_ms = (time.perf_counter() - start) * 1000.0
+    if proc.returncode != 0:
+        raise RuntimeError(f"child exited {proc.returncode}:\n{proc.stderr[-2000:]}")
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    out["wall_ms"] = wall_ms
+    return out
+
+
+def run_batches(code: str, env: dict, runs: int, procs: int) -> list:
+    results = []
+    with ThreadPoolExecutor(procs) as pool:
+        for _ in range(runs):
+            results += pool.map(lambda _: run_child(code, env), range(procs))
+    return results
+
+
+def summary(values) -> str:
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return f"median {statistics.median(values):7.1f}  p95 {p95:7.1f}  max {values[-1]:7.1f}"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--procs", type=int, default=1, help="processes started at once per run")
+    ap.add_argument("--budget-ms", type=float, default=1500.0, help="median import time allowed")
+    ap.add_argument("--skip-startup", action="store_true")
+    args = ap.parse_args()
+
+    # one untimed import compiles the bytecode
+    run_child(IMPORT_CHILD, bare_env())
+
+    imports = run_batches(IMPORT_CHILD, bare_env(), args.runs, args.procs)
+    print(f"{len(imports)} imports, {args.procs} at a time (ms)")
+    print(f"  import app.main   {summary(r['import_ms'] for r in imports)}")
+    print(f"  process wall      {summary(r['wall_ms'] for r in imports)}")
+
+    failures = []
+    loaded = sorted({m for r in imports for m in r["loaded"]})
+    if loaded:
+        failures.append(f"importing app.main loaded {', '.join(loaded)}")
+    if any(r["settings_resolved"] for r in imports):
+        failures.append("importing app.main validated the settings")
+    median_ms = statistics.median(r["import_ms"] for r in imports)
+    if median_ms > args.budget_ms:
+        failures.append(f"median import {median_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+
+    if not args.skip_startup:
+        startups = run_batches(STARTUP_CHILD, offline_env(), args.runs, args.procs)
+        print(f"{len(startups)} startups, {args.procs} at a time (ms)")
+        print(f"  import + ready    {summary(r['import_ms'] + r['ready_ms'] for r in startups)}")
+        print(f"  lifespan ready    {summary(r['ready_ms'] for r in startups)}")
+        for step in sorted({s for r in startups for s in r["warmup_ms"]}):
+            print(f"    {step:<15} {summary(r['warmup_ms'].get(step, 0.0) for r in startups)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
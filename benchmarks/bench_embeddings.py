@@ -0,0 +1,89 @@
+"""
+Offline throughput benchmark for the embedding micro-batcher.
+
+Uses the fake embedding backend with a simulated per-call round trip, so it
+needs no OpenAI key or network. Compares one call per text against the
+coalescing batcher under the same number of concurrent callers and the same
+cap on in-flight backend calls (the connection pool size).
+
+    python -m benchmarks.bench_embeddings --texts 1000 --concurrency 200 --latency-ms 80
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+os.environ.setdefault("NEO4J_URI", "bolt://localhost:7687")
+os.environ.setdefault("NEO4J_USER", "neo4j")
+os.environ.setdefault("NEO4J_PASSWORD", "offline")
+
+from app.services.embeddings import EmbeddingBatcher, FakeEmbeddingBackend  # noqa: E402
+
+
+def make_texts(n: int) -> list[str]:
+    return [f"memory {i} about topic {i % 37} recorded in year {2000 + i % 25}" for i in range(n)]
+
+
+async def run_unbatched(texts, latency_s, dim, max_inflight):
+    backend = FakeEmbeddingBackend(dim, latency_s)
+    sem = asyncio.Semaphore(max_inflight)
+
+    async def one(t):
+        async with sem:
+            return (await backend.embed([t]))[0]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(t) for t in texts))
+    return time.perf_counter() - start, backend.calls
+
+
+async def run_batched(texts, concurrency, latency_s, dim, batch_size, window_ms, max_inflight):
+    backend = FakeEmbeddingBackend(dim, latency_s)
+    batcher = EmbeddingBatcher(
+        backend,
+        max_batch_size=batch_size,
+        window_s=window_ms / 1000.0,
+        max_concurrency=max_inflight,
+    )
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(t):
+        async with sem:
+            return await batcher.embed(t)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(t) for t in texts))
+    elapsed = time.perf_counter() - start
+    await batcher.aclose()
+    return elapsed, backend.calls
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--texts", type=int, default=1000)
+    ap.add_argument("--concurrency", type=int, default=200)
+    ap.add_argument("--latency-ms", type=float, default=80.0)
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--batch-size", type=int, default=64)
+    ap.add_argument("--window-ms", type=float, default=10.0)
+    ap.add_argument("--max-inflight", type=int, default=4)
+    args = ap.parse_args()
+
+    texts = make_texts(args.texts)
+    latency_s = args.latency_ms / 1000.0
+
+    t_single, calls_single = await run_unbatched(texts, latency_s, args.dim, args.max_inflight)
+    t_batch, calls_batch = await run_batched(
+        texts, args.concurrency, latency_s, args.dim,
+        args.batch_size, args.window_ms, args.max_inflight,
+    )
+
+    print(f"texts={args.texts} concurrency={args.concurrency} latency={args.latency_ms}ms")
+    print(f"unbatched: {t_single:.2f}s  {args.texts / t_single:8.1f} texts/s  backend calls={calls_single}")
+    print(f"batched:   {t_batch:.2f}s  {args.texts / t_batch:8.1f} texts/s  backend calls={calls_batch}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
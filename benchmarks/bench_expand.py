@@ -0,0 +1,107 @@
+"""
+Subgraph expansion benchmark on a synthetic hub-heavy graph.
+
+Writes `--hubs` hub memories, each linked to `--fanout` spokes, with spokes
+cross-linked between hubs, into the configured Neo4j (ids are prefixed with
+"bench-expand-" and deleted afterwards). Then it times the old path-enumerating
+query against the bounded BFS in expand_memory_subgraph, seeded at the hubs.
+
+    python -m benchmarks.bench_expand --hubs 5 --fanout 200 --depth 3
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from app.services.graph import driver, expand_memory_subgraph
+
+PREFIX = "bench-expand-"
+
+# the pre-BFS implementation: enumerate every path, then flatten with reduce()
+PATH_QUERY = """
+MATCH (m:Memory)
+WHERE m.id IN $ids
+OPTIONAL MATCH p = (m)-[r:UPDATE|EXTEND|DERIVE*1..{depth}]-(n:Memory)
+WITH collect(DISTINCT m) + collect(DISTINCT n) AS nodes,
+     [path IN collect(p) WHERE path IS NOT NULL] AS paths
+WITH nodes,
+     reduce(allrels = [], path IN paths |
+            allrels + relationships(path)) AS rels
+RETURN size(nodes) AS nodes, size(rels) AS rels
+"""
+
+
+async def seed(hubs: int, fanout: int, cross: int, rng: random.Random):
+    hub_ids = [f"{PREFIX}hub-{h}" for h in range(hubs)]
+    spoke_ids = [f"{PREFIX}spoke-{h}-{i}" for h in range(hubs) for i in range(fanout)]
+    edges = [
+        {"from": f"{PREFIX}hub-{h}", "to": f"{PREFIX}spoke-{h}-{i}"}
+        for h in range(hubs) for i in range(fanout)
+    ]
+    edges += [{"from": rng.choice(spoke_ids), "to": rng.choice(hub_ids)} for _ in range(cross)]
+    async with driver.session() as session:
+        await session.run(
+            "UNWIND $ids AS id MERGE (m:Memory {id: id}) SET m.content = id, m.status = 'active', m.version = 1",
+            ids=hub_ids + spoke_ids,
+        )
+        await session.run(
+            """
+            UNWIND $edges AS e
+            MATCH (a:Memory {id: e.from}), (b:Memory {id: e.to})
+            MERGE (a)-[:EXTEND]->(b)
+            """,
+            edges=edges,
+        )
+    return hub_ids
+
+
+async def cleanup():
+    async with driver.session() as session:
+        await session.run("MATCH (m:Memory) WHERE m.id STARTS WITH $p DETACH DELETE m", p=PREFIX)
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    out = await coro
+    return (time.perf_counter() - start) * 1000.0, out
+
+
+async def run_path_query(ids, depth):
+    async with driver.session() as session:
+        result = await session.run(PATH_QUERY.replace("{depth}", str(depth)), ids=ids)
+        rec = await result.single()
+        return rec.data()
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hubs", type=int, default=5)
+    ap.add_argument("--fanout", type=int, default=200)
+    ap.add_argument("--cross", type=int, default=500)
+    ap.add_argument("--depth", type=int, default=3)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--timeout-s", type=float, default=120.0)
+    args = ap.parse_args()
+
+    try:
+        hub_ids = await seed(args.hubs, args.fanout, args.cross, random.Random(0))
+        seeds = hub_ids[:1]
+
+        for _ in range(args.repeat):
+            ms, g = await timed(expand_memory_subgraph(seeds, depth=args.depth, include_content=False))
+            print(f"bfs:   {ms:9.1f} ms  nodes={len(g['nodes'])} edges={len(g['edges'])} truncated={g['truncated']}")
+        for _ in range(args.repeat):
+            try:
+                ms, r = await asyncio.wait_for(timed(run_path_query(seeds, args.depth)), args.timeout_s)
+                print(f"paths: {ms:9.1f} ms  nodes={r['nodes']} rels(with duplicates)={r['rels']}")
+            except asyncio.TimeoutError:
+                print(f"paths: timed out after {args.timeout_s}s")
+                break
+    finally:
+        await cleanup()
+        await driver.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
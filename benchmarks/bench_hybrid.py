@@ -0,0 +1,109 @@
+"""
+Quality and latency of vector, lexical and hybrid (RRF) search on a synthetic
+corpus, using the in-process index (flat vectors + BM25).
+
+Every memory belongs to a topic: its vector is the topic center plus noise and
+its text is a few of the topic's words plus a unique ticket id ("TCK-123456").
+Two query sets:
+  - id lookups: the text is one ticket id, the vector is an unrelated embedding
+    (what an embedding model makes of an opaque id); relevant = that memory
+  - topic queries: the vector is near the topic center, the text uses synonyms
+    that never appear in memories; relevant = the topic's memories
+Reported per mode: hit@k for id lookups, precision@k for topic queries, and
+search latency with `--embed-ms` added for the modes that embed the query.
+
+    python -m benchmarks.bench_hybrid --n 20000 --topics 200 --k 10 --embed-ms 150
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+os.environ.setdefault("NEO4J_URI", "bolt://localhost:7687")
+os.environ.setdefault("NEO4J_USER", "neo4j")
+os.environ.setdefault("NEO4J_PASSWORD", "offline")
+
+from app.services.db import reciprocal_rank_fusion  # noqa: E402
+from app.services.vector_index import FlatIndex  # noqa: E402
+
+
+def build(n, dim, topics, rng):
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    vocab = [[f"t{t}w{j}" for j in range(8)] for t in range(topics)]
+    synonyms = [[f"t{t}syn{j}" for j in range(8)] for t in range(topics)]
+    index = FlatIndex(dim, capacity=n)
+    topic_of, tickets = [], []
+    for i in range(n):
+        t = int(rng.integers(topics))
+        ticket = f"TCK-{i:06d}"
+        words = " ".join(rng.choice(vocab[t], size=4, replace=False))
+        vec = centers[t] + 0.8 * rng.standard_normal(dim).astype(np.float32)
+        index.add(f"m{i}", vec, f"{words} {ticket}")
+        topic_of.append(t)
+        tickets.append(ticket)
+    return index, centers, synonyms, np.array(topic_of), tickets
+
+
+def run(index, queries, k, mode, embed_ms, candidates, rrf_k):
+    results, times = [], []
+    for text, vec in queries:
+        start = time.perf_counter()
+        if mode == "lexical":
+            hits = index.lexical_search(text, k=k)
+        elif mode == "vector":
+            hits = index.search(vec, k=k, similarity_threshold=-1.0)
+        else:
+            n = max(k, candidates)
+            hits = reciprocal_rank_fusion(
+                [index.search(vec, k=n, similarity_threshold=-1.0), index.lexical_search(text, k=n)], k, rrf_k,
+            )
+        ms = (time.perf_counter() - start) * 1000.0
+        times.append(ms + (embed_ms if mode != "lexical" else 0.0))
+        results.append([h["id"] for h in hits])
+    return results, np.array(times)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20_000)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--topics", type=int, default=200)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--embed-ms", type=float, default=150.0, help="simulated query-embedding round trip")
+    ap.add_argument("--candidates", type=int, default=50)
+    ap.add_argument("--rrf-k", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    index, centers, synonyms, topic_of, tickets = build(args.n, args.dim, args.topics, rng)
+
+    id_targets = rng.integers(args.n, size=args.queries)
+    id_queries = [(tickets[i], rng.standard_normal(args.dim).astype(np.float32)) for i in id_targets]
+    topic_targets = rng.integers(args.topics, size=args.queries)
+    topic_queries = [
+        (" ".join(rng.choice(synonyms[t], size=3, replace=False)),
+         centers[t] + 0.8 * rng.standard_normal(args.dim).astype(np.float32))
+        for t in topic_targets
+    ]
+
+    print(f"n={args.n} topics={args.topics} k={args.k} queries={args.queries}x2 embed_ms={args.embed_ms}")
+    print(f"{'mode':<9}{'id hit@k':>10}{'topic p@k':>11}{'p50 ms':>9}{'p95 ms':>9}")
+    for mode in ("vector", "lexical", "hybrid"):
+        id_res, t1 = run(index, id_queries, args.k, mode, args.embed_ms, args.candidates, args.rrf_k)
+        topic_res, t2 = run(index, topic_queries, args.k, mode, args.embed_ms, args.candidates, args.rrf_k)
+        hit = np.mean([f"m{i}" in res for i, res in zip(id_targets, id_res)])
+        prec = np.mean([
+            sum(topic_of[int(r[1:])] == t for r in res) / args.k
+            for t, res in zip(topic_targets, topic_res)
+        ])
+        times = np.concatenate([t1, t2])
+        print(f"{mode:<9}{hit:>10.3f}{prec:>11.3f}{np.percentile(times, 50):>9.2f}{np.percentile(times, 95):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
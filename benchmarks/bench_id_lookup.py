@@ -0,0 +1,87 @@
+"""
+Memory id lookups with and without the id index, at 100k+ nodes.
+
+Writes `--n` nodes under a separate label (:BenchMemory, so the real Memory
+constraint is left alone) into the configured Neo4j, times `--lookups` point
+lookups shaped like the ones in graph.py, then creates the same uniqueness
+constraint schema.py puts on :Memory and times them again. Nodes and the
+constraint are dropped afterwards.
+
+    python -m benchmarks.bench_id_lookup --n 100000 --lookups 500
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from app.services.graph import driver
+
+LABEL = "BenchMemory"
+CONSTRAINT = "bench_memory_id_unique"
+
+
+async def seed(n: int, batch: int = 10_000):
+    async with driver.session() as session:
+        for start in range(0, n, batch):
+            await session.run(
+                f"UNWIND range($start, $end - 1) AS i "
+                f"CREATE (:{LABEL} {{id: 'bench-' + toString(i), status: 'active', created_at: datetime()}})",
+                start=start, end=min(n, start + batch),
+            )
+
+
+async def cleanup():
+    async with driver.session() as session:
+        await session.run(f"DROP CONSTRAINT {CONSTRAINT} IF EXISTS")
+        await session.run(
+            f"MATCH (m:{LABEL}) CALL {{ WITH m DETACH DELETE m }} IN TRANSACTIONS OF 10000 ROWS"
+        )
+
+
+async def time_lookups(ids):
+    times = []
+    async with driver.session() as session:
+        for id_ in ids:
+            start = time.perf_counter()
+            result = await session.run(f"MATCH (m:{LABEL} {{id: $id}}) RETURN m.status AS status", id=id_)
+            await result.single()
+            times.append((time.perf_counter() - start) * 1000.0)
+    return np.array(times)
+
+
+def report(name, times):
+    print(f"{name:<12}{np.percentile(times, 50):>10.2f}{np.percentile(times, 95):>10.2f}{np.percentile(times, 99):>10.2f}")
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=100_000)
+    ap.add_argument("--lookups", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    ids = [f"bench-{rng.randrange(args.n)}" for _ in range(args.lookups)]
+    try:
+        await cleanup()
+        await seed(args.n)
+        print(f"n={args.n} lookups={args.lookups}")
+        print(f"{'':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        report("label scan", await time_lookups(ids))
+
+        async with driver.session() as session:
+            await session.run(
+                f"CREATE CONSTRAINT {CONSTRAINT} IF NOT EXISTS FOR (m:{LABEL}) REQUIRE m.id IS UNIQUE"
+            )
+            await session.run("CALL db.awaitIndexes(300)")
+        report("id index", await time_lookups(ids))
+    finally:
+        await cleanup()
+        await driver.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
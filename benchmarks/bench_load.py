@@ -0,0 +1,86 @@
+"""
+Concurrent load benchmark against a running API server.
+
+Seeds a handful of memories, then fires `--requests` calls with `--concurrency`
+in flight, mixing POST /memories, POST /search and GET /memories/{id}.
+Prints per-endpoint p50/p95/p99 latencies. Run it once against the commit
+before the async data-access layer and once after to compare p99.
+
+    uvicorn app.main:app --port 8000 &
+    python -m benchmarks.bench_load --base http://localhost:8000 --requests 500 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+WORDS = "tariff climate rover vaccine market orbit carbon neural trade policy galaxy banking".split()
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[idx]
+
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(8))
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base", default="http://localhost:8000")
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=50)
+    ap.add_argument("--seed-memories", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base, timeout=60.0, limits=limits) as client:
+        ids = []
+        for _ in range(args.seed_memories):
+            r = await client.post("/memories", json={"content": sentence(rng)})
+            r.raise_for_status()
+            ids.append(r.json()["id"])
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def one(i: int):
+            kind = ("create", "search", "get")[i % 3]
+            async with sem:
+                start = time.perf_counter()
+                if kind == "create":
+                    r = await client.post("/memories", json={"content": sentence(rng)})
+                elif kind == "search":
+                    r = await client.post("/search", json={"query": sentence(rng), "k": 5})
+                else:
+                    r = await client.get(f"/memories/{rng.choice(ids)}")
+                latencies[kind].append((time.perf_counter() - start) * 1000.0)
+                if r.status_code >= 400:
+                    errors[kind] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    print(f"{args.requests} requests, concurrency={args.concurrency}, {args.requests / elapsed:.1f} req/s")
+    print(f"{'endpoint':<10}{'n':>6}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for kind, values in sorted(latencies.items()):
+        print(
+            f"{kind:<10}{len(values):>6}{errors[kind]:>6}"
+            f"{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}{percentile(values, 99):>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Memory and recall of the flat index at each vector precision.
+
+Same synthetic clustered corpus as bench_vector_index. float32 is exact and is
+the ground truth; float16 / int8 / binary scan compact codes and re-score the
+best k * rescore_factor candidates against float32 vectors memory-mapped on
+disk. Memory is reported per million vectors at the chosen dimension, for the
+resident scan matrix and for the on-disk re-scoring copy, along with the bytes
+per embedding sent to Postgres as JSON floats vs the compact pgvector text.
+
+    python -m benchmarks.bench_quantization --n 50000 --dim 1536 --k 10 --rescore 4
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+os.environ.setdefault("NEO4J_URI", "bolt://localhost:7687")
+os.environ.setdefault("NEO4J_USER", "neo4j")
+os.environ.setdefault("NEO4J_PASSWORD", "offline")
+
+from app.services.db import encode_vector  # noqa: E402
+from app.services.vector_index import PRECISIONS, FlatIndex  # noqa: E402
+from benchmarks.bench_vector_index import run_queries, synthetic  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=50_000)
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--clusters", type=int, default=100)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--rescore", type=int, default=4, help="re-scored candidates = k * rescore")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = synthetic(args.n, args.dim, args.clusters, rng)
+    queries = synthetic(args.queries, args.dim, args.clusters, rng)
+
+    sample = [float(x) for x in vectors[0] / np.linalg.norm(vectors[0])]
+    print(f"n={args.n} dim={args.dim} k={args.k} rescore={args.k * args.rescore} candidates")
+    print(f"wire bytes per embedding: json {len(json.dumps(sample))}, pgvector text {len(encode_vector(sample))}")
+    print(f"{'precision':<10}{'GB/1M resident':>16}{'GB/1M on disk':>15}{'p50 ms':>9}{'p99 ms':>9}{'recall@k':>10}")
+
+    truth = None
+    for precision in PRECISIONS:
+        index = FlatIndex(args.dim, capacity=args.n, precision=precision, rescore_factor=args.rescore)
+        for i, v in enumerate(vectors):
+            index.add(f"m{i}", v)
+        results, times = run_queries(index, queries, args.k)
+        if truth is None:
+            truth = results
+        recall = np.mean([len(set(a) & set(t)) / len(t) for a, t in zip(results, truth)])
+        mem = index.memory_bytes()
+        per_million = 1e6 / args.n / 1e9
+        print(f"{precision:<10}{mem['resident'] * per_million:>16.2f}{mem['on_disk'] * per_million:>15.2f}"
+              f"{np.percentile(times, 50):>9.3f}{np.percentile(times, 99):>9.3f}{recall:>10.3f}")
+        del index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Recall and latency of the in-process vector indexes on a synthetic corpus.
+
+Vectors are drawn around random cluster centers (like topic clusters of real
+memories). The flat index is exact, so its results are the ground truth for
+recall@k of the HNSW index.
+
+    python -m benchmarks.bench_vector_index --n 50000 --dim 384 --queries 200 --k 10
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+os.environ.setdefault("NEO4J_URI", "bolt://localhost:7687")
+os.environ.setdefault("NEO4J_USER", "neo4j")
+os.environ.setdefault("NEO4J_PASSWORD", "offline")
+
+from app.services.vector_index import FlatIndex, HNSWIndex, hnswlib  # noqa: E402
+
+
+def synthetic(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assign = rng.integers(0, clusters, size=n)
+    return centers[assign] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def build(index, vectors):
+    start = time.perf_counter()
+    for i, v in enumerate(vectors):
+        index.add(f"m{i}", v)
+    return time.perf_counter() - start
+
+
+def run_queries(index, queries, k):
+    results, times = [], []
+    for q in queries:
+        start = time.perf_counter()
+        hits = index.search(q, k=k, similarity_threshold=-1.0)
+        times.append((time.perf_counter() - start) * 1000.0)
+        results.append([h["id"] for h in hits])
+    return results, np.array(times)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=50_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--clusters", type=int, default=100)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--ef", type=int, default=64)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = synthetic(args.n, args.dim, args.clusters, rng)
+    queries = synthetic(args.queries, args.dim, args.clusters, rng)
+
+    flat = FlatIndex(args.dim)
+    t_build = build(flat, vectors)
+    truth, t_flat = run_queries(flat, queries, args.k)
+    print(f"n={args.n} dim={args.dim} k={args.k} queries={args.queries}")
+    print(f"{'index':<8}{'build s':>10}{'p50 ms':>10}{'p99 ms':>10}{'recall@k':>10}")
+    print(f"{'flat':<8}{t_build:>10.2f}{np.percentile(t_flat, 50):>10.3f}{np.percentile(t_flat, 99):>10.3f}{1.0:>10.3f}")
+
+    if hnswlib is None:
+        print("hnsw: skipped (pip install hnswlib)")
+        return
+    hnsw = HNSWIndex(args.dim, capacity=args.n, ef_search=args.ef)
+    t_build = build(hnsw, vectors)
+    approx, t_hnsw = run_queries(hnsw, queries, args.k)
+    recall = np.mean([len(set(a) & set(t)) / len(t) for a, t in zip(approx, truth)])
+    print(f"{'hnsw':<8}{t_build:>10.2f}{np.percentile(t_hnsw, 50):>10.3f}{np.percentile(t_hnsw, 99):>10.3f}{recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
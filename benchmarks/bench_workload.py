@@ -0,0 +1,368 @@
+"""
+Offline end-to-end benchmark: the real app against local stand-ins.
+
+  - OpenAI:   benchmarks/fake_openai.py (deterministic vectors, fixed latency)
+  - Supabase: Postgres + pgvector + PostgREST (benchmarks/offline/docker-compose.yml)
+  - Neo4j:    Neo4j community in the same compose file
+
+The harness starts the fake OpenAI server and the app (uvicorn) as
+subprocesses, wipes both stores, seeds a synthetic corpus (benchmarks/corpus.py)
+through the bulk and supersede endpoints, then drives a mixed read/write
+workload and reports throughput and p50/p95/p99 per endpoint. Results are
+written to benchmarks/results/<git sha>.json with the full configuration, so
+runs on different commits can be compared with --compare.
+
+    docker compose -f benchmarks/offline/docker-compose.yml up -d
+    python -m benchmarks.bench_workload --corpus 5000 --shape tree --requests 3000 --concurrency 32
+    python -m benchmarks.bench_workload ... --app-env SEARCH_BACKEND=local --compare benchmarks/results/<sha>.json
+
+With --base the corpus is seeded into, and the workload run against, an app
+that is already up; nothing is started or wiped.
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from benchmarks.bench_load import percentile
+from benchmarks.corpus import SHAPES, generate
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# must match benchmarks/offline/docker-compose.yml
+SUPABASE_URL = "http://localhost:54321"
+JWT_SECRET = "memory-bench-jwt-secret-at-least-32-chars"
+NEO4J_URI = "bolt://localhost:7687"
+NEO4J_AUTH = ("neo4j", "benchpassword")
+
+DEFAULT_MIX = "search=40,get=15,batch_get=10,create=10,supersede=5,lineage=10,expand=5,timeline=5"
+
+
+def service_role_jwt(secret: str = JWT_SECRET) -> str:
+    """HS256 token with role=service_role, the key PostgREST expects from supabase-py."""
+    def b64(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+    header = b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    payload = b64(json.dumps({"role": "service_role", "iss": "memory-bench"}).encode())
+    signature = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{b64(signature)}"
+
+
+def git_revision() -> tuple[str, bool]:
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--", "app", "sql"],
+                                             cwd=ROOT, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", True
+    return sha, dirty
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(OPS)
+    if unknown:
+        raise SystemExit(f"unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+# ---------- stand-ins and the app ----------
+
+def app_env(args) -> dict[str, str]:
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "offline",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.openai_port}/v1",
+        "EMBEDDING_BACKEND": "openai",
+        "SUPABASE_URL": SUPABASE_URL,
+        "SUPABASE_SERVICE_ROLE_KEY": service_role_jwt(),
+        "NEO4J_URI": NEO4J_URI,
+        "NEO4J_USER": NEO4J_AUTH[0],
+        "NEO4J_PASSWORD": NEO4J_AUTH[1],
+        "LOG_LEVEL": "WARNING",
+    }
+    for kv in args.app_env:
+        key, _, value = kv.partition("=")
+        env[key] = value
+    return env
+
+
+def start_processes(args) -> list[subprocess.Popen]:
+    env = app_env(args)
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_openai", "--port", str(args.openai_port),
+         "--latency-ms", str(args.openai_latency_ms)],
+        cwd=ROOT, env=env,
+    )
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, env=env,
+    )
+    return [fake, app]
+
+
+async def wait_ready(base: str, timeout_s: float = 60.0):
+    deadline = time.monotonic() + timeout_s
+    async with httpx.AsyncClient(base_url=base, timeout=5.0) as client:
+        while time.monotonic() < deadline:
+            try:
+                r = await client.get("/health")
+                if r.status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise SystemExit(f"app at {base} not healthy after {timeout_s:.0f}s (are the compose services up?)")
+
+
+async def wipe_stores():
+    """Empty the memories/outbox tables and the graph, so every run seeds the same data."""
+    headers = {"apikey": service_role_jwt(), "Authorization": f"Bearer {service_role_jwt()}"}
+    async with httpx.AsyncClient(base_url=f"{SUPABASE_URL}/rest/v1", headers=headers, timeout=120.0) as client:
+        for table, column in (("graph_outbox", "id"), ("memories", "id")):
+            r = await client.delete(f"/{table}", params={column: "not.is.null"})
+            r.raise_for_status()
+
+    from neo4j import AsyncGraphDatabase
+    async with AsyncGraphDatabase.driver(NEO4J_URI, auth=NEO4J_AUTH) as driver:
+        async with driver.session() as session:
+            result = await session.run("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS")
+            await result.consume()
+
+
+# ---------- seeding ----------
+
+async def seed(client: httpx.AsyncClient, corpus, batch_size: int, concurrency: int) -> dict:
+    """Bulk-load the corpus, then build its UPDATE chains. Returns key -> current head id."""
+    ids: dict[str, str] = {}
+    start = time.perf_counter()
+    for body in corpus.batches(batch_size):
+        r = await client.post("/memories/bulk", json=body)
+        r.raise_for_status()
+        for item in r.json()["items"]:
+            if item["ok"]:
+                ids[item["key"]] = item["id"]
+    loaded = time.perf_counter() - start
+
+    rng = random.Random(1)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def chain(key: str):
+        async with sem:
+            for _ in range(corpus.versions):
+                r = await client.post(f"/memories/{ids[key]}/supersede", json={"content": corpus.sentence(rng)})
+                if r.status_code >= 400:
+                    return
+                ids[key] = r.json()["new_id"]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(chain(k) for k in corpus.supersede_keys if k in ids))
+    print(f"seeded {len(ids)} memories in {loaded:.1f}s, "
+          f"{len(corpus.supersede_keys)} chains x {corpus.versions} versions in {time.perf_counter() - start:.1f}s")
+    return ids
+
+
+# ---------- workload ----------
+
+async def op_search(client, ctx, rng):
+    return await client.post("/search", json={"query": ctx["corpus"].query(rng), "k": 5, "mode": ctx["search_mode"]})
+
+
+async def op_get(client, ctx, rng):
+    return await client.get(f"/memories/{rng.choice(ctx['ids'])}")
+
+
+async def op_batch_get(client, ctx, rng):
+    return await client.post("/memories/batch-get", json={"ids": rng.sample(ctx["ids"], k=min(20, len(ctx["ids"])))})
+
+
+async def op_create(client, ctx, rng):
+    r = await client.post("/memories", json={"content": ctx["corpus"].sentence(rng)})
+    if r.status_code < 400:
+        ctx["ids"].append(r.json()["id"])
+    return r
+
+
+async def op_supersede(client, ctx, rng):
+    i = rng.randrange(len(ctx["heads"]))
+    r = await client.post(f"/memories/{ctx['heads'][i]}/supersede", json={"content": ctx["corpus"].sentence(rng)})
+    if r.status_code < 400:
+        ctx["heads"][i] = r.json()["new_id"]
+    return r
+
+
+async def op_lineage(client, ctx, rng):
+    return await client.get(f"/memories/{rng.choice(ctx['ids'])}/lineage", params={"direction": "both", "limit": 100})
+
+
+async def op_expand(client, ctx, rng):
+    seeds = rng.sample(ctx["ids"], k=min(5, len(ctx["ids"])))
+    async with client.stream("POST", "/graph/expand", json={"seeds": seeds}) as r:
+        async for _ in r.aiter_lines():
+            pass
+    return r
+
+
+async def op_timeline(client, ctx, rng):
+    return await client.get("/timeline", params={"limit": 50})
+
+
+OPS = {
+    "search": op_search,
+    "get": op_get,
+    "batch_get": op_batch_get,
+    "create": op_create,
+    "supersede": op_supersede,
+    "lineage": op_lineage,
+    "expand": op_expand,
+    "timeline": op_timeline,
+}
+
+
+async def run_workload(client, ctx, mix: dict[str, float], requests: int, concurrency: int, seed_: int):
+    rng = random.Random(seed_)
+    names = list(mix)
+    plan = rng.choices(names, weights=[mix[n] for n in names], k=requests)
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    queue = iter(enumerate(plan))
+
+    async def worker(w: int):
+        wrng = random.Random(seed_ * 1000 + w)
+        for _, name in queue:
+            start = time.perf_counter()
+            try:
+                r = await OPS[name](client, ctx, wrng)
+                failed = r.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies[name].append((time.perf_counter() - start) * 1000.0)
+            if failed:
+                errors[name] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def summarize(latencies, errors, elapsed: float) -> dict:
+    def stats(values, errs):
+        return {
+            "count": len(values),
+            "errors": errs,
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+        }
+
+    endpoints = {name: stats(values, errors[name]) for name, values in sorted(latencies.items())}
+    every = [v for values in latencies.values() for v in values]
+    return {"elapsed_s": round(elapsed, 2), "total": stats(every, sum(errors.values())), "endpoints": endpoints}
+
+
+def print_report(summary: dict, baseline: dict | None = None):
+    print(f"{'endpoint':<11}{'n':>7}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          + (f"{'Δp50':>9}{'Δp99':>9}" if baseline else ""))
+    rows = list(summary["endpoints"].items()) + [("total", summary["total"])]
+    for name, s in rows:
+        line = (f"{name:<11}{s['count']:>7}{s['errors']:>6}{s['rps']:>9.1f}"
+                f"{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}")
+        if baseline:
+            b = baseline["total"] if name == "total" else baseline["endpoints"].get(name)
+            if b and b["p50_ms"] and b["p99_ms"]:
+                line += f"{(s['p50_ms'] / b['p50_ms'] - 1) * 100:>+8.0f}%{(s['p99_ms'] / b['p99_ms'] - 1) * 100:>+8.0f}%"
+        print(line)
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base", default=None, help="use an app that is already running; nothing is started or wiped")
+    ap.add_argument("--port", type=int, default=8800)
+    ap.add_argument("--openai-port", type=int, default=8100)
+    ap.add_argument("--openai-latency-ms", type=float, default=80.0)
+    ap.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                    help="extra app settings, e.g. SEARCH_BACKEND=local, GRAPH_WRITE_MODE=outbox")
+    ap.add_argument("--corpus", type=int, default=5000)
+    ap.add_argument("--topics", type=int, default=50)
+    ap.add_argument("--shape", choices=SHAPES, default="tree")
+    ap.add_argument("--supersede-frac", type=float, default=0.1)
+    ap.add_argument("--versions", type=int, default=3)
+    ap.add_argument("--bulk-batch", type=int, default=500)
+    ap.add_argument("--requests", type=int, default=3000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--mix", default=DEFAULT_MIX)
+    ap.add_argument("--search-mode", choices=("vector", "hybrid", "lexical"), default="vector")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=str(ROOT / "benchmarks" / "results"))
+    ap.add_argument("--compare", default=None, help="results JSON of an earlier run to diff against")
+    args = ap.parse_args()
+
+    mix = parse_mix(args.mix)
+    corpus = generate(args.corpus, args.topics, args.shape, args.supersede_frac, args.versions, seed=args.seed)
+    base = args.base or f"http://127.0.0.1:{args.port}"
+    procs = [] if args.base else start_processes(args)
+    try:
+        await wait_ready(base)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base, timeout=120.0, limits=limits) as client:
+            if not args.base:
+                await wipe_stores()
+            ids = await seed(client, corpus, args.bulk_batch, args.concurrency)
+            if not ids:
+                raise SystemExit("no memories to run the workload against")
+            ctx = {
+                "corpus": corpus,
+                "ids": list(ids.values()),
+                "heads": list(ids.values()),
+                "search_mode": args.search_mode,
+            }
+            latencies, errors, elapsed = await run_workload(client, ctx, mix, args.requests, args.concurrency, args.seed)
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait(timeout=10)
+
+    summary = summarize(latencies, errors, elapsed)
+    sha, dirty = git_revision()
+    result = {
+        "git_sha": sha,
+        "dirty": dirty,
+        "at": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        **summary,
+    }
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+
+    print(f"{args.requests} requests, concurrency={args.concurrency}, corpus={args.corpus} ({args.shape}), "
+          f"{summary['total']['rps']:.1f} req/s" + (f", vs {baseline['git_sha']}" if baseline else ""))
+    print_report(summary, baseline)
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    path = out / f"{sha}{'-dirty' if dirty else ''}.json"
+    path.write_text(json.dumps(result, indent=2))
+    print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
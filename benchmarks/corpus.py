@@ -0,0 +1,93 @@
+"""
+Synthetic memory corpora for the offline benchmarks.
+
+Memories are grouped into topics: each one is a few of its topic's words plus a
+unique ticket id, so vector, lexical and hybrid search all have something to
+find. Relationships stay inside a topic and follow one of a few shapes:
+
+  - chain: every memory EXTENDs the previous one (long lineage paths)
+  - tree:  every memory links to a random earlier one (random recursive tree)
+  - hub:   every memory DERIVEs from the topic's first memory (one hot node)
+  - none:  no relationships
+
+`supersede_frac` of the memories are later superseded `versions` times,
+building UPDATE chains.
+"""
+
+import random
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List
+
+SHAPES = ("chain", "tree", "hub", "none")
+
+
+@dataclass
+class Topic:
+    name: str
+    words: List[str]
+    items: List[Dict] = field(default_factory=list)          # BulkMemoryItem dicts
+    relationships: List[Dict] = field(default_factory=list)  # BulkRelationship dicts
+
+
+@dataclass
+class Corpus:
+    topics: List[Topic]
+    supersede_keys: List[str]
+    versions: int
+
+    def __len__(self):
+        return sum(len(t.items) for t in self.topics)
+
+    def batches(self, size: int) -> Iterator[Dict]:
+        """BulkIngestRequest bodies of whole topics, about `size` items each."""
+        items, rels = [], []
+        for topic in self.topics:
+            items += topic.items
+            rels += topic.relationships
+            if len(items) >= size:
+                yield {"items": items, "relationships": rels}
+                items, rels = [], []
+        if items:
+            yield {"items": items, "relationships": rels}
+
+    def query(self, rng: random.Random) -> str:
+        """A search query: a few words of a random topic."""
+        topic = rng.choice(self.topics)
+        return " ".join(rng.sample(topic.words, k=min(3, len(topic.words))))
+
+    def sentence(self, rng: random.Random) -> str:
+        """Fresh content in the style of the corpus, for write requests."""
+        topic = rng.choice(self.topics)
+        return " ".join(rng.choices(topic.words, k=6)) + f" NEW-{rng.randrange(10**9):09d}"
+
+
+def generate(n: int, topics: int = 50, shape: str = "tree", supersede_frac: float = 0.1,
+             versions: int = 3, words_per_topic: int = 12, seed: int = 0) -> Corpus:
+    if shape not in SHAPES:
+        raise ValueError(f"unknown shape: {shape} (expected one of {', '.join(SHAPES)})")
+    rng = random.Random(seed)
+    out = [
+        Topic(f"t{t}", [f"t{t}w{j}" for j in range(words_per_topic)])
+        for t in range(topics)
+    ]
+    for i in range(n):
+        topic = out[i % topics]
+        key = f"m{i}"
+        words = " ".join(rng.sample(topic.words, k=min(5, words_per_topic)))
+        topic.items.append({"key": key, "content": f"{words} TCK-{i:07d}", "metadata": {"topic": topic.name}})
+
+        pos = len(topic.items) - 1
+        if pos == 0 or shape == "none":
+            continue
+        if shape == "chain":
+            parent = topic.items[pos - 1]["key"]
+        elif shape == "hub":
+            parent = topic.items[0]["key"]
+        else:
+            parent = topic.items[rng.randrange(pos)]["key"]
+        rel_type = "DERIVE" if shape == "hub" or rng.random() < 0.3 else "EXTEND"
+        topic.relationships.append({"from_key": parent, "to_key": key, "type": rel_type})
+
+    keys = [item["key"] for t in out for item in t.items]
+    supersede_keys = rng.sample(keys, k=int(len(keys) * supersede_frac))
+    return Corpus(out, supersede_keys, versions)
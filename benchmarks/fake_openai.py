@@ -0,0 +1,76 @@
+"""
+Stand-in for the OpenAI embeddings API, for offline benchmarks.
+
+Serves POST /v1/embeddings with deterministic bag-of-words vectors (the same
+ones as embedding_backend="fake"), after a configurable latency per request,
+so the app's real HTTP path (batching, pooling, rate limiting, retries) is
+exercised. Point the app at it with OPENAI_BASE_URL=http://localhost:8100/v1.
+
+    python -m benchmarks.fake_openai --port 8100 --latency-ms 80 --dim 1536
+"""
+
+import argparse
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+os.environ.setdefault("NEO4J_URI", "bolt://localhost:7687")
+os.environ.setdefault("NEO4J_USER", "neo4j")
+os.environ.setdefault("NEO4J_PASSWORD", "offline")
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.services.embeddings import estimate_tokens, fake_embedding  # noqa: E402
+
+
+def make_app(dim: int, latency_ms: float, rate_limit_every: int = 0) -> FastAPI:
+    """`rate_limit_every` > 0 answers every n-th request with a 429 (Retry-After: 0.1)."""
+    app = FastAPI(title="fake-openai")
+    state = {"requests": 0, "inputs": 0}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        state["requests"] += 1
+        if rate_limit_every and state["requests"] % rate_limit_every == 0:
+            return JSONResponse({"error": {"message": "rate limited"}}, status_code=429,
+                                headers={"retry-after": "0.1"})
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000.0)
+        state["inputs"] += len(texts)
+        return {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(t, dim)}
+                for i, t in enumerate(texts)
+            ],
+            "usage": {"prompt_tokens": sum(estimate_tokens(t) for t in texts),
+                      "total_tokens": sum(estimate_tokens(t) for t in texts)},
+        }
+
+    @app.get("/stats")
+    def stats():
+        return state
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8100)
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--latency-ms", type=float, default=80.0)
+    ap.add_argument("--rate-limit-every", type=int, default=0)
+    args = ap.parse_args()
+    uvicorn.run(make_app(args.dim, args.latency_ms, args.rate_limit_every),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+-- The roles Supabase provides out of the box, for PostgREST: it logs in as
+-- `authenticator` and switches to the role named in the request's JWT.
+create role anon nologin;
+create role service_role nologin bypassrls;
+create role authenticator noinherit login password 'bench';
+grant anon, service_role to authenticator;
+
+grant usage on schema public to anon, service_role;
+grant all on all tables in schema public to service_role;
+grant all on all sequences in schema public to service_role;
+grant execute on all functions in schema public to service_role;
@@ -0,0 +1 @@
+# marks the repository root for pytest, so tests import app and benchmarks
@@ -28,4 +28,60 @@ export async function searchMemories(query: string, withGraph = true) {
     throw new Error(`searchMemories failed: ${res.status} ${text}`);
   }
   return res.json();
-}
\ No newline at end of file
+}
+export async function batchGetMemories(
+  ids: string[],
+  fields?: string[],
+  withGraph = false,
+) {
+  const res = await fetch(`${API_BASE}/memories/batch-get`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      ids,
+      fields,
+      with_graph: withGraph,
+    }),
+  });
+  if (!res.ok) {
+    const text = await res.text();
+    throw new Error(`batchGetMemories failed: ${res.status} ${text}`);
+  }
+  return res.json();
+}
+
+// Streams POST /graph/expand: calls onSeed for each seed's neighborhood in rank
+// order as it arrives, and resolves with the final "done" message.
+export async function expandSeeds(
+  seeds: string[],
+  onSeed: (msg: any) => void,
+  depth = 2,
+) {
+  const res = await fetch(`${API_BASE}/graph/expand`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ seeds, depth }),
+  });
+  if (!res.ok || !res.body) {
+    const text = await res.text();
+    throw new Error(`expandSeeds failed: ${res.status} ${text}`);
+  }
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let done: any = null;
+  while (true) {
+    const { value, done: finished } = await reader.read();
+    buffer += decoder.decode(value, { stream: !finished });
+    const lines = buffer.split("\n");
+    buffer = lines.pop() ?? "";
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const msg = JSON.parse(line);
+      if (msg.type === "done") done = msg;
+      else onSeed(msg);
+    }
+    if (finished) break;
+  }
+  return done;
+}
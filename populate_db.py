@@ -4,7 +4,6 @@ This creates multiple disconnected subgraphs across different topics.
 """
 
 import requests
-import time
 
 API_BASE = "http://localhost:8000"
 
@@ -94,95 +93,61 @@ cluster_relationships = {
     ]
 }
 
-def create_memory(content):
-    """Create a new memory and return its ID."""
-    try:
-        response = requests.post(
-            f"{API_BASE}/memories",
-            json={"content": content}
-        )
-        if response.status_code == 200:
-            data = response.json()
-            print(f"✓ Created: {content[:60]}... [ID: {data['id'][:8]}...]")
-            return data['id']
-        else:
-            print(f"✗ Failed to create: {content[:60]}...")
-            return None
-    except Exception as e:
-        print(f"✗ Error creating memory: {e}")
-        return None
-
-def create_relationship(source_id, target_id, rel_type):
-    """Create a relationship between two memories."""
-    try:
-        endpoint_map = {
-            "EXTEND": f"{API_BASE}/memories/{source_id}/extend",
-            "DERIVE": f"{API_BASE}/memories/{source_id}/derive",
-        }
-        
-        response = requests.post(
-            endpoint_map[rel_type],
-            json={"target_id": target_id}
-        )
-        
-        if response.status_code == 200:
-            print(f"  → Created {rel_type} relationship")
-            return True
-        else:
-            print(f"  ✗ Failed to create relationship")
-            return False
-    except Exception as e:
-        print(f"  ✗ Error creating relationship: {e}")
-        return False
+def build_bulk_request():
+    """Build one /memories/bulk payload; items are keyed by "topic:index"."""
+    items = []
+    relationships = []
+    for topic, memories in memory_clusters.items():
+        keys = {}
+        for i, content in enumerate(memories):
+            key = f"{topic}:{i}"
+            keys[content] = key
+            items.append({"key": key, "content": content, "metadata": {"topic": topic}})
+        for source_content, target_content, rel_type in cluster_relationships.get(topic, []):
+            relationships.append({
+                "from_key": keys[source_content],
+                "to_key": keys[target_content],
+                "type": rel_type,
+            })
+    return {"items": items, "relationships": relationships}
 
 def populate_database():
-    """Populate the database with all memory clusters."""
+    """Populate the database with all memory clusters in a single bulk request."""
     print("=" * 80)
     print("POPULATING MEMORY GRAPH DATABASE")
     print("=" * 80)
-    
-    all_memory_ids = {}
-    
-    # Create all memories first
-    for topic, memories in memory_clusters.items():
-        print(f"\n📁 Topic: {topic.upper()}")
-        print("-" * 80)
-        
-        topic_ids = {}
-        for memory_content in memories:
-            memory_id = create_memory(memory_content)
-            if memory_id:
-                topic_ids[memory_content] = memory_id
-                time.sleep(0.5)  # Rate limiting
-        
-        all_memory_ids[topic] = topic_ids
-    
-    # Create relationships within clusters
+
+    payload = build_bulk_request()
+    response = requests.post(f"{API_BASE}/memories/bulk", json=payload, timeout=300)
+    if response.status_code != 200:
+        print(f"✗ Bulk ingest failed: {response.status_code} {response.text}")
+        return
+    data = response.json()
+
+    results_by_key = {r.get("key"): r for r in data["items"]}
+    all_memory_ids = {topic: {} for topic in memory_clusters}
+    for item in payload["items"]:
+        topic = item["metadata"]["topic"]
+        result = results_by_key.get(item["key"], {"ok": False, "error": "no result"})
+        if result["ok"]:
+            all_memory_ids[topic][item["content"]] = result["id"]
+            print(f"✓ Created: {item['content'][:60]}... [ID: {result['id'][:8]}...]")
+        else:
+            print(f"✗ Failed to create: {item['content'][:60]}... ({result.get('error')})")
+
     print("\n" + "=" * 80)
-    print("CREATING RELATIONSHIPS")
+    print("RELATIONSHIPS")
     print("=" * 80)
-    
-    for topic, relationships in cluster_relationships.items():
-        print(f"\n🔗 Linking: {topic.upper()}")
-        print("-" * 80)
-        
-        topic_ids = all_memory_ids[topic]
-        for source_content, target_content, rel_type in relationships:
-            source_id = topic_ids.get(source_content)
-            target_id = topic_ids.get(target_content)
-            
-            if source_id and target_id:
-                print(f"  {source_content[:50]}...")
-                print(f"  → {target_content[:50]}...")
-                create_relationship(source_id, target_id, rel_type)
-                time.sleep(0.3)
-    
+    for rel in data["relationships"]:
+        mark = "→" if rel["ok"] else "✗"
+        print(f"  {mark} {rel['type']} {rel['from_key']} -> {rel['to_key']}" + ("" if rel["ok"] else f" ({rel.get('error')})"))
+
     # Print summary
     print("\n" + "=" * 80)
     print("SUMMARY")
     print("=" * 80)
     total_memories = sum(len(ids) for ids in all_memory_ids.values())
-    total_relationships = sum(len(rels) for rels in cluster_relationships.values())
+    total_relationships = sum(1 for rel in data["relationships"] if rel["ok"])
     
     print(f"✓ Created {total_memories} memories across {len(memory_clusters)} topics")
     print(f"✓ Created {total_relationships} relationships")
@@ -0,0 +1,45 @@
+-- Base schema: the memories table and match_memories, as they exist in the
+-- Supabase project. Run before 001..; a fresh Postgres with pgvector
+-- (benchmarks/docker-compose.yml) is set up from these files in order.
+
+create extension if not exists vector;
+
+create table if not exists memories (
+  id         uuid primary key default gen_random_uuid(),
+  content    text not null,
+  embedding  vector(1536) not null,
+  metadata   jsonb,
+  status     text not null default 'active',   -- active | outdated | merged
+  created_at timestamptz not null default now()
+);
+
+create index if not exists memories_embedding_hnsw on memories using hnsw (embedding vector_cosine_ops);
+create index if not exists memories_created_at on memories (created_at);
+
+create or replace function match_memories(
+  query_embedding      vector(1536),
+  match_count          int,
+  similarity_threshold float default 0.0
+)
+returns table (
+  id         uuid,
+  content    text,
+  metadata   jsonb,
+  status     text,
+  created_at timestamptz,
+  similarity float
+)
+language sql stable
+as $$
+  select
+    m.id,
+    m.content,
+    m.metadata,
+    m.status,
+    m.created_at,
+    1 - (m.embedding <=> query_embedding) as similarity
+  from memories m
+  where 1 - (m.embedding <=> query_embedding) >= similarity_threshold
+  order by m.embedding <=> query_embedding
+  limit match_count;
+$$;
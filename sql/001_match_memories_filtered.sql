@@ -0,0 +1,55 @@
+-- match_memories with filters applied inside the scan, so top-k stays exact
+-- after filtering (no client-side post-filtering / over-fetching).
+--
+-- hnsw.iterative_scan (pgvector >= 0.8) lets an HNSW index scan keep going
+-- until match_count rows pass the WHERE clause. pgvector reserves the hnsw.
+-- prefix, so on older versions setting it is an error: it is only set (for the
+-- current transaction) when the server knows it. Without it the planner falls
+-- back to an exact scan for selective filters.
+
+create or replace function match_memories_filtered(
+  query_embedding      vector(1536),
+  match_count          int,
+  similarity_threshold float default 0.0,
+  exclude_ids          uuid[] default null,
+  filter_status        text default null,
+  filter_metadata      jsonb default null,
+  created_after        timestamptz default null,
+  created_before       timestamptz default null
+)
+returns table (
+  id         uuid,
+  content    text,
+  metadata   jsonb,
+  status     text,
+  created_at timestamptz,
+  similarity float
+)
+language plpgsql
+as $$
+#variable_conflict use_column
+begin
+  if current_setting('hnsw.iterative_scan', true) is not null then
+    perform set_config('hnsw.iterative_scan', 'strict_order', true);
+  end if;
+
+  return query
+  select
+    m.id,
+    m.content,
+    m.metadata,
+    m.status,
+    m.created_at,
+    1 - (m.embedding <=> query_embedding) as similarity
+  from memories m
+  where m.embedding is not null
+    and (exclude_ids is null or m.id <> all (exclude_ids))
+    and (filter_status is null or m.status = filter_status)
+    and (filter_metadata is null or m.metadata @> filter_metadata)
+    and (created_after is null or m.created_at >= created_after)
+    and (created_before is null or m.created_at < created_before)
+    and 1 - (m.embedding <=> query_embedding) >= similarity_threshold
+  order by m.embedding <=> query_embedding
+  limit match_count;
+end;
+$$;
@@ -0,0 +1,86 @@
+-- Outbox of pending Neo4j mutations (graph_write_mode = "outbox").
+--
+-- Postgres is the authoritative store: write_memory_with_outbox inserts the
+-- memory row and the graph mutation that mirrors it in one transaction, and a
+-- background worker (app/services/outbox.py) applies the mutations to Neo4j.
+-- idempotency_key is "<op>:<memory id>", so a retried request can't enqueue the
+-- same mutation twice; the Cypher behind each op is MERGE-based, so applying a
+-- row more than once (after a lost ack or an expired lease) is harmless.
+
+create table if not exists graph_outbox (
+  id              bigserial primary key,
+  idempotency_key text not null unique,
+  op              text not null,                    -- create_node | supersede | derive
+  payload         jsonb not null,
+  status          text not null default 'pending',  -- pending | inflight | applied | dead
+  attempts        int not null default 0,
+  last_error      text,
+  available_at    timestamptz not null default now(),
+  created_at      timestamptz not null default now(),
+  applied_at      timestamptz
+);
+
+create index if not exists graph_outbox_ready
+  on graph_outbox (available_at, id)
+  where status in ('pending', 'inflight');
+
+-- Insert a memory and its outbox row atomically. With p_from_id the referenced
+-- memory must exist (returns false and writes nothing otherwise); with
+-- p_mark_outdated it is also marked outdated (supersede).
+create or replace function write_memory_with_outbox(
+  p_id            uuid,
+  p_content       text,
+  p_embedding     vector(1536),
+  p_metadata      jsonb,
+  p_op            text,
+  p_payload       jsonb,
+  p_from_id       uuid default null,
+  p_mark_outdated boolean default false
+)
+returns boolean
+language plpgsql
+as $$
+begin
+  if p_from_id is not null then
+    if p_mark_outdated then
+      update memories set status = 'outdated' where id = p_from_id;
+    else
+      perform 1 from memories where id = p_from_id;
+    end if;
+    if not found then
+      return false;
+    end if;
+  end if;
+
+  insert into memories (id, content, embedding, metadata)
+  values (p_id, p_content, p_embedding, p_metadata);
+
+  insert into graph_outbox (idempotency_key, op, payload)
+  values (p_op || ':' || p_id, p_op, p_payload)
+  on conflict (idempotency_key) do nothing;
+
+  return true;
+end;
+$$;
+
+-- Lease up to batch_size ready rows to one worker. Rows stay 'inflight' until
+-- acknowledged; if the worker dies the lease runs out and they are claimed again.
+create or replace function claim_graph_outbox(batch_size int, lease_seconds int)
+returns setof graph_outbox
+language sql
+as $$
+  update graph_outbox o
+     set status = 'inflight',
+         attempts = o.attempts + 1,
+         available_at = now() + make_interval(secs => lease_seconds)
+   where o.id in (
+     select id
+       from graph_outbox
+      where status in ('pending', 'inflight')
+        and available_at <= now()
+      order by id
+      limit batch_size
+      for update skip locked
+   )
+  returning o.*;
+$$;
@@ -0,0 +1,107 @@
+-- Deferred embedding (embedding_mode = "deferred").
+--
+-- Rows can be inserted without an embedding; they get embedding_status
+-- 'pending' and a background worker (app/services/embed_queue.py) fills them in
+-- batches. Rows without an embedding never match match_memories /
+-- match_memories_filtered (their similarity is null), and
+-- match_pending_memories gives search a lexical fallback over them.
+
+alter table memories alter column embedding drop not null;
+alter table memories add column if not exists embedding_status text not null default 'ready';  -- ready | pending | failed
+alter table memories add column if not exists embedding_attempts int not null default 0;
+alter table memories add column if not exists embedding_error text;
+alter table memories add column if not exists embedding_available_at timestamptz not null default now();
+
+create index if not exists memories_embedding_pending
+  on memories (embedding_available_at, created_at)
+  where embedding_status = 'pending';
+
+-- every insert path (insert_memory, bulk insert, write_memory_with_outbox)
+-- gets the right status without passing it explicitly
+create or replace function memories_set_embedding_status()
+returns trigger
+language plpgsql
+as $$
+begin
+  new.embedding_status := case when new.embedding is null then 'pending' else 'ready' end;
+  return new;
+end;
+$$;
+
+drop trigger if exists memories_embedding_status on memories;
+create trigger memories_embedding_status
+  before insert on memories
+  for each row execute function memories_set_embedding_status();
+
+-- Lease up to batch_size pending rows (oldest first) to one worker.
+create or replace function claim_pending_embeddings(batch_size int, lease_seconds int)
+returns table (
+  id                 uuid,
+  content            text,
+  metadata           jsonb,
+  status             text,
+  created_at         timestamptz,
+  embedding_attempts int
+)
+language sql
+as $$
+  update memories m
+     set embedding_available_at = now() + make_interval(secs => lease_seconds),
+         embedding_attempts = m.embedding_attempts + 1
+   where m.id in (
+     select p.id
+       from memories p
+      where p.embedding_status = 'pending'
+        and p.embedding_available_at <= now()
+      order by p.created_at
+      limit batch_size
+      for update skip locked
+   )
+  returning m.id, m.content, m.metadata, m.status, m.created_at, m.embedding_attempts;
+$$;
+
+-- items: [{"id": uuid, "embedding": [...]}]; one UPDATE for the whole batch.
+create or replace function set_embeddings(items jsonb)
+returns int
+language sql
+as $$
+  with updated as (
+    update memories m
+       set embedding = (i.value->>'embedding')::vector,
+           embedding_status = 'ready',
+           embedding_error = null
+      from jsonb_array_elements(items) i
+     where m.id = (i.value->>'id')::uuid
+    returning 1
+  )
+  select count(*)::int from updated;
+$$;
+
+-- Full-text match over rows still waiting for an embedding. The pending set is
+-- small (recent writes), so this scans it without an index.
+create or replace function match_pending_memories(
+  query_text    text,
+  match_count   int,
+  exclude_ids   uuid[] default null,
+  filter_status text default null
+)
+returns table (
+  id         uuid,
+  content    text,
+  metadata   jsonb,
+  status     text,
+  created_at timestamptz,
+  rank       float
+)
+language sql stable
+as $$
+  select m.id, m.content, m.metadata, m.status, m.created_at,
+         ts_rank(to_tsvector('english', m.content), q)::float as rank
+    from memories m, websearch_to_tsquery('english', query_text) q
+   where m.embedding_status = 'pending'
+     and to_tsvector('english', m.content) @@ q
+     and (exclude_ids is null or m.id <> all(exclude_ids))
+     and (filter_status is null or m.status = filter_status)
+   order by rank desc
+   limit match_count;
+$$;
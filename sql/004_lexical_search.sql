@@ -0,0 +1,49 @@
+-- Full-text side of hybrid search (SearchRequest.mode = "lexical" | "hybrid").
+--
+-- 'simple' text search config: no stemming and no stop words, so ids, names
+-- and years match exactly (same tokenization as the in-process BM25 index).
+-- Query terms are OR-ed like in BM25; rows matching more of them rank higher.
+
+alter table memories
+  add column if not exists content_tsv tsvector
+  generated always as (to_tsvector('simple', coalesce(content, ''))) stored;
+
+create index if not exists memories_content_tsv on memories using gin (content_tsv);
+
+create or replace function match_memories_lexical(
+  query_text      text,
+  match_count     int,
+  exclude_ids     uuid[] default null,
+  filter_status   text default null,
+  filter_metadata jsonb default null,
+  created_after   timestamptz default null,
+  created_before  timestamptz default null
+)
+returns table (
+  id         uuid,
+  content    text,
+  metadata   jsonb,
+  status     text,
+  created_at timestamptz,
+  rank       float
+)
+language sql stable
+as $$
+  select
+    m.id,
+    m.content,
+    m.metadata,
+    m.status,
+    m.created_at,
+    ts_rank_cd(m.content_tsv, q)::float as rank
+  from memories m,
+       to_tsquery('simple', replace(plainto_tsquery('simple', query_text)::text, ' & ', ' | ')) q
+  where m.content_tsv @@ q
+    and (exclude_ids is null or m.id <> all (exclude_ids))
+    and (filter_status is null or m.status = filter_status)
+    and (filter_metadata is null or m.metadata @> filter_metadata)
+    and (created_after is null or m.created_at >= created_after)
+    and (created_before is null or m.created_at < created_before)
+  order by rank desc
+  limit match_count;
+$$;
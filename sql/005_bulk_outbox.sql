@@ -0,0 +1,28 @@
+-- Bulk ingest in outbox mode (graph_write_mode = "outbox").
+--
+-- Inserts a batch of memories and one create_node outbox row per memory in a
+-- single transaction, so a failed batch leaves nothing behind in either store
+-- and the worker creates the graph nodes. p_rows is a JSON array of
+-- {id, content, embedding, metadata}; embedding is a pgvector text literal.
+
+create or replace function insert_memories_with_outbox(p_rows jsonb)
+returns int
+language plpgsql
+as $$
+declare
+  n int;
+begin
+  insert into memories (id, content, embedding, metadata)
+  select (r->>'id')::uuid, r->>'content', (r->>'embedding')::vector, r->'metadata'
+    from jsonb_array_elements(p_rows) r;
+  get diagnostics n = row_count;
+
+  insert into graph_outbox (idempotency_key, op, payload)
+  select 'create_node:' || (r->>'id'), 'create_node',
+         jsonb_build_object('id', r->>'id', 'content', r->>'content')
+    from jsonb_array_elements(p_rows) r
+  on conflict (idempotency_key) do nothing;
+
+  return n;
+end;
+$$;
@@ -0,0 +1,199 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.db import reciprocal_rank_fusion
+from app.services.events import Broadcaster
+from app.services.subgraph_cache import SubgraphCache
+from app.services.suggest import similarity_join
+from app.services.vector_index import jsonb_contains
+from benchmarks.bench_cold_start import DEFERRED, IMPORT_CHILD, bare_env, run_child
+
+
+# ---------- cold start ----------
+
+def test_import_loads_no_clients_and_reads_no_settings():
+    # bare environment: no credentials, so resolving settings would fail the import
+    out = run_child(IMPORT_CHILD, bare_env())
+    assert out["loaded"] == [], f"importing app.main loaded {out['loaded']} (must stay out: {DEFERRED})"
+    assert out["settings_resolved"] is False
+
+
+# ---------- change feed replay ----------
+
+def test_replay_from_current_id_is_empty():
+    b = Broadcaster(buffer_size=10)
+    assert b._replay(None) == []
+    assert b._replay(b.last_id) == []
+
+
+def test_replay_returns_events_after_last_id():
+    b = Broadcaster(buffer_size=10)
+    events = [b.publish("memory.created", {"n": i}) for i in range(3)]
+    assert b._replay(events[0]["id"]) == events[1:]
+    assert b._replay(events[0]["id"] - 1) == events
+
+
+def test_replay_resets_when_gap_fell_out_of_buffer():
+    b = Broadcaster(buffer_size=2)
+    start = b.last_id
+    for i in range(5):
+        b.publish("memory.created", {"n": i})
+    assert b._replay(start) is None
+
+
+def test_replay_resets_on_id_never_issued():
+    # e.g. an id from before a restart of a process whose clock went back
+    b = Broadcaster(buffer_size=10)
+    assert b._replay(b.last_id + 1) is None
+
+
+def test_ids_start_above_earlier_process():
+    assert Broadcaster().last_id > 1_000_000_000_000_000
+
+
+def test_slow_subscriber_is_cut_off_with_reset():
+    async def run():
+        b = Broadcaster(buffer_size=10, queue_size=2)
+        stream = b.subscribe()
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        for i in range(4):
+            b.publish("memory.created", {"n": i})
+        got = [await first] + [event async for event in stream]
+        return got, b.dropped_subscribers
+
+    got, dropped = asyncio.run(run())
+    assert got[-1]["type"] == "reset" and dropped == 1
+
+
+# ---------- subgraph cache ----------
+
+def _graph(*ids):
+    return {"nodes": [{"id": i} for i in ids], "edges": [], "truncated": False}
+
+
+def test_cache_hit_and_precise_invalidation():
+    c = SubgraphCache(max_cost=100, ttl_s=0)
+    c.put(("a", 2), _graph("a", "b"), "a", c.clock())
+    c.put(("x", 2), _graph("x", "y"), "x", c.clock())
+    assert c.get(("a", 2)) == _graph("a", "b")
+    c.touch(["b"])
+    assert c.get(("a", 2)) is None
+    assert c.get(("x", 2)) == _graph("x", "y")
+    assert c.stats()["invalidations"] == 1
+
+
+def test_cache_skips_fill_raced_by_a_write():
+    c = SubgraphCache(max_cost=100, ttl_s=0)
+    started_at = c.clock()
+    c.touch(["b"])
+    c.put(("a", 2), _graph("a", "b"), "a", started_at)
+    assert c.get(("a", 2)) is None
+    assert c.stats()["stale_fills"] == 1
+
+
+def test_cache_evicts_lru_over_budget():
+    c = SubgraphCache(max_cost=6, ttl_s=0)
+    c.put("a", _graph("a", "b"), "a", c.clock())   # cost 3
+    c.put("x", _graph("x", "y"), "x", c.clock())   # cost 3
+    assert c.get("a") is not None                  # x is now least recently used
+    c.put("p", _graph("p", "q"), "p", c.clock())
+    assert c.get("x") is None and c.get("a") is not None
+    assert c.cost <= 6 and c.stats()["evictions"] == 1
+
+
+def test_cache_entries_expire(monkeypatch):
+    import app.services.subgraph_cache as module
+
+    now = [1000.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: now[0])
+    c = SubgraphCache(max_cost=100, ttl_s=30)
+    c.put("a", _graph("a"), "a", c.clock())
+    now[0] += 29
+    assert c.get("a") is not None
+    now[0] += 2
+    assert c.get("a") is None
+    assert c.stats()["expirations"] == 1
+
+
+def test_cache_disabled_stores_nothing():
+    c = SubgraphCache(max_cost=0)
+    assert not c.enabled
+    c.put("a", _graph("a"), "a", c.clock())
+    assert c.get("a") is None
+
+
+# ---------- metadata containment ----------
+
+@pytest.mark.parametrize("value, pattern, expected", [
+    ({"a": 1, "b": 2}, {"a": 1}, True),
+    ({"a": 1}, {"a": 2}, False),
+    ({"a": 1}, {"b": 1}, False),
+    ({"a": {"b": {"c": 1, "d": 2}}}, {"a": {"b": {"c": 1}}}, True),
+    ({"tags": ["x", "y", "z"]}, {"tags": ["z", "x"]}, True),
+    ({"tags": ["x"]}, {"tags": ["x", "w"]}, False),
+    ({"tags": [{"k": 1, "v": 2}]}, {"tags": [{"k": 1}]}, True),
+    ({"tags": "x"}, {"tags": ["x"]}, False),
+    ({"flag": True}, {"flag": 1}, False),
+    ({"n": 1}, {"n": True}, False),
+    ({"n": 1}, {"n": 1.0}, True),
+    ({"a": None}, {"a": None}, True),
+    ({"a": {"b": 1}}, {"a": 1}, False),
+    ({}, {}, True),
+])
+def test_jsonb_contains(value, pattern, expected):
+    assert jsonb_contains(value, pattern) is expected
+
+
+# ---------- hybrid fusion ----------
+
+def test_rrf_sums_reciprocal_ranks_and_keeps_both_scores():
+    vector = [{"id": "a", "similarity": 0.9}, {"id": "b", "similarity": 0.8}]
+    lexical = [{"id": "b", "rank": 3.0}, {"id": "c", "rank": 1.0}]
+    out = reciprocal_rank_fusion([vector, lexical], k=3, rrf_k=60)
+    assert [r["id"] for r in out] == ["b", "a", "c"]
+    assert out[0]["score"] == pytest.approx(1 / 62 + 1 / 61)
+    assert out[0]["similarity"] == 0.8 and out[0]["rank"] == 3.0
+    assert out[1]["rank"] is None and out[2]["similarity"] is None
+
+
+def test_rrf_truncates_to_k():
+    rows = [{"id": str(i)} for i in range(10)]
+    assert [r["id"] for r in reciprocal_rank_fusion([rows], k=2)] == ["0", "1"]
+
+
+# ---------- batch suggestions ----------
+
+def _unit(rows):
+    m = np.asarray(rows, dtype=np.float32)
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+def test_similarity_join_reports_each_pair_once():
+    ids = ["a", "b", "c"]
+    matrix = _unit([[1, 0], [1, 0.05], [0, 1]])
+    out = similarity_join(ids, matrix, [0, 1, 2], dup=0.99, ext=0.9, der=0.5, cap=5, block_size=1)
+    assert [(r["from"], r["to"], r["type"]) for r in out] == [("a", "b", "DUPLICATE")]
+
+
+def test_similarity_join_matches_brute_force_and_caps_per_row():
+    rng = np.random.default_rng(0)
+    matrix = _unit(rng.normal(size=(40, 8)))
+    ids = [str(i) for i in range(40)]
+    query = [3, 7, 11]
+    out = similarity_join(ids, matrix, query, dup=0.95, ext=0.8, der=0.3, cap=2, block_size=2)
+
+    sims = matrix @ matrix.T
+    for i in query:
+        mine = [r for r in out if r["from"] == ids[i]]
+        assert len(mine) <= 2
+        best = sorted((j for j in range(40) if j != i and sims[i, j] >= 0.3
+                       and not (j in query and j <= i)), key=lambda j: -sims[i, j])[:2]
+        assert {r["to"] for r in mine} == {ids[j] for j in best}
+    assert [r["similarity"] for r in out] == sorted((r["similarity"] for r in out), reverse=True)
+
+
+def test_similarity_join_empty():
+    assert similarity_join([], np.zeros((0, 2), dtype=np.float32), [], 0.9, 0.8, 0.7, 5) == []
@@ -0,0 +1,77 @@
+from app.services.rerank import rerank
+
+
+def _row(id_, similarity, status="active", **extra):
+    return {"id": id_, "content": id_, "status": status, "similarity": similarity, **extra}
+
+
+def test_scores_scale_over_candidate_range():
+    rows = [_row("a", -0.2), _row("b", -0.6), _row("c", -1.0)]
+    out = rerank(rows, {}, k=3)
+    assert [r["id"] for r in out] == ["a", "b", "c"]
+    assert [round(r["rerank_score"], 6) for r in out] == [1.0, 0.5, 0.0]
+
+
+def test_equal_scores_all_count_as_best():
+    out = rerank([_row("a", 0.3), _row("b", 0.3)], {}, k=2)
+    assert {r["rerank_score"] for r in out} == {1.0}
+
+
+def test_neighbors_add_weighted_mean():
+    rows = [_row("a", 1.0), _row("b", 0.5), _row("c", 0.0)]
+    context = {"c": {"neighbors": ["a", "b"]}}
+    out = {r["id"]: r for r in rerank(rows, context, k=3, neighbor_weight=0.2)}
+    assert round(out["c"]["rerank_score"], 6) == 0.15
+
+
+def test_merged_rows_are_dropped():
+    rows = [_row("a", 1.0), _row("b", 0.5, status="merged")]
+    assert [r["id"] for r in rerank(rows, {}, k=3)] == ["a"]
+    assert [r["id"] for r in rerank(rows[:1] + [_row("b", 0.5)], {"b": {"status": "merged"}}, k=3)] == ["a"]
+
+
+def test_outdated_in_postgres_only_is_penalized():
+    # the graph has no status for it and no active head to collapse into
+    rows = [_row("a", 1.0, status="outdated"), _row("b", 0.0)]
+    context = {"a": {"status": "active", "head_id": None}}
+    out = {r["id"]: r for r in rerank(rows, context, k=2, outdated_penalty=0.5)}
+    assert out["a"]["status"] == "outdated"
+    assert out["a"]["rerank_score"] == 0.5
+
+
+def test_update_successor_collapses_into_head():
+    # POST /memories/{id}/update leaves the graph status active; the chain still has a head
+    rows = [_row("old", 0.9), _row("other", 0.1)]
+    context = {"old": {"status": "active", "head_id": "new", "head_status": "active",
+                       "head_content": "new text", "head_version": 2,
+                       "head_created_at": "2024-01-01T00:00:00Z"}}
+    out = rerank(rows, context, k=2)
+    assert out[0]["id"] == "new"
+    assert out[0]["status"] == "active"
+    assert out[0]["collapsed"] == ["old"]
+    assert out[0]["similarity"] == 0.9
+    assert out[0]["metadata"] is None
+    assert out[0]["created_at"] == "2024-01-01T00:00:00Z"
+
+
+def test_head_already_a_candidate_keeps_better_score():
+    rows = [_row("old", 1.0, status="outdated"), _row("new", 0.5), _row("x", 0.0)]
+    context = {"old": {"head_id": "new", "head_status": "active"},
+               "new": {"head_id": "new", "head_status": "active"}}
+    out = rerank(rows, context, k=3)
+    assert [r["id"] for r in out] == ["new", "x"]
+    assert out[0]["rerank_score"] == 1.0
+    assert out[0]["collapsed"] == ["old"]
+
+
+def test_head_row_is_not_outdated_by_its_own_id():
+    rows = [_row("h", 1.0), _row("x", 0.0)]
+    context = {"h": {"status": "active", "head_id": "h", "head_status": "active"}}
+    out = rerank(rows, context, k=2)
+    assert out[0]["id"] == "h" and out[0]["status"] == "active" and "collapsed" not in out[0]
+
+
+def test_returns_top_k():
+    rows = [_row(str(i), i / 10) for i in range(10)]
+    assert [r["id"] for r in rerank(rows, {}, k=3)] == ["9", "8", "7"]
+    assert rerank([], {}, k=3) == []